@@ -4,97 +4,185 @@
 # pyright: reportUnknownVariableType=false
 # pyright: reportMissingTypeStubs=false
 
+"""
+Downloads data from the Octopus and myenergi APIs, e.g.
+
+    poetry run download octo --start 2024-01-02 --end 2024-01-03
+    poetry run download export --full
+    poetry run download status
+
+Only the standard library is imported at startup: each subcommand imports the (heavy) modules it needs when it runs, so
+that short invocations such as `status`, e.g. from cron, start quickly.
+"""
+
+import argparse
 import datetime
-from pathlib import Path
-from typing import Any
-
-import dotenv
-import fastparquet
-import pandas as pd
-import pendulum
-from octopus_stats import (
-    ConsumptionRecord,
-    OctoAPIConfig,
-    OctoAPIReader,
-)
-from zappi_stats.zappi_api_reader import MyenergiApiConfig, ZappiApiReader
-
-
-def get_consumption_data(cr: ConsumptionRecord) -> dict[str, Any]:
-    cd: dict[str, Any] = {}
-    cd["start_utc"] = cr.interval_start.astimezone(datetime.UTC)
-    cd["end_utc"] = cr.interval_end.astimezone(datetime.UTC)
-    cd["total_consumed_kwh"] = cr.consumption
-    cd["start_local"] = cr.interval_start.replace(tzinfo=None)
-    cd["end_local"] = cr.interval_end.replace(tzinfo=None)
-    cd["start_utc_offset"] = cr.interval_start.utcoffset()
-    cd["end_utc_offset"] = cr.interval_end.utcoffset()
-    return cd
-
-
-def write_batch(batch: list[ConsumptionRecord]) -> None:
-    if not batch:
-        return
-    df_consumption = pd.DataFrame([get_consumption_data(cr) for cr in batch])
-    df_consumption["duration"] = df_consumption["end_utc"] - df_consumption["start_utc"]
-    df_consumption["date_local"] = df_consumption["start_local"].dt.normalize()
-    df_consumption["dayofyear_local"] = df_consumption["start_local"].dt.dayofyear
-    df_consumption["dayofweek_local"] = df_consumption["start_local"].dt.dayofweek
-    df_consumption["hourofday_local"] = [r.hour for r in df_consumption["start_local"]]
-
-    opts: dict[str, Any] = {
-        "partition_on": "date_local",
-        "compression": "GZIP",
-        "file_scheme": "hive",
-    }
-    parquet_file = Path("test.parquet").resolve()
-    if parquet_file.exists():
-        opts["append"] = True
-    fastparquet.write("test.parquet", df_consumption, **opts)
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, Optional
 
+if TYPE_CHECKING:
+    import pendulum
+    from octopus_stats.file_storage_manager import FileStorageManager
 
-def octo():
-    dotenv.load_dotenv()
+_DATASET_PATH = "consumption.parquet"
+_DEFAULT_TZ = "Europe/London"
+
+
+def octo(args: argparse.Namespace) -> None:
+    """Downloads the consumption of [start, end) into the dataset."""
+    from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+    from octopus_stats.parquet_writer import (
+        ParquetWriterSettings,
+        PartitionedParquetWriter,
+    )
+
+    _load_dotenv()
     config = OctoAPIConfig.from_env()
     api_reader = OctoAPIReader(config)
-    my_tz = "Europe/London"
     params: dict[str, Any] = {
-        "start": pendulum.datetime(2024, 1, 2, 0, 0, tz=my_tz),
-        "end": pendulum.datetime(2024, 1, 3, 0, 0, tz=my_tz),
+        "start": _start_of(args.start, args.tz),
+        "end": _start_of(args.end, args.tz),
     }
     if config.mpan is None or config.serial_number is None:
         params["account_number"] = config.account_number
     else:
         params["mpan"] = config.mpan
         params["serial_number"] = config.serial_number
-    consumption = api_reader.get_consumption(**params)
-    current_date = pendulum.Date.min
-    current_batch: list[ConsumptionRecord] = []
-    for r in consumption:
-        local_start_date = r.interval_start.date()
-        if local_start_date != current_date:
-            write_batch(current_batch)
-            current_date = local_start_date
-        current_batch.append(r)
-    write_batch(current_batch)
-
-
-def zappi() -> None:
-    dotenv.load_dotenv()
+    df_consumption = api_reader.get_consumption_frame(**params)
+    settings = ParquetWriterSettings(dataset_path=_DATASET_PATH)
+    with PartitionedParquetWriter(_create_storage(args.base_dir), settings) as writer:
+        writer.write(df_consumption)
+
+
+def zappi(args: argparse.Namespace) -> None:
+    """Prints the Zappi's 1-minute records for [start, end)."""
+    from zappi_stats.zappi_api_reader import MyenergiApiConfig, ZappiApiReader
+
+    _load_dotenv()
     config = MyenergiApiConfig.from_env()
-    my_tz = "Europe/London"
     api = ZappiApiReader(config)
     api.connect()
-    print(api.connected_host)
-    for x in api.get_data(
-        pendulum.datetime(2024, 1, 2, 0, 0, tz=my_tz),
-        pendulum.datetime(2024, 1, 28, 0, 0, tz=my_tz),
-    ):
-        print(x)
+    print(api.connected_host)  # noqa: T201
+    for x in api.get_data(_start_of(args.start, args.tz), _start_of(args.end, args.tz)):
+        print(x)  # noqa: T201
+
+
+def export(args: argparse.Namespace) -> None:
+    """Exports new data incrementally into the store, resuming from where the previous export finished."""
+    _load_dotenv()
+    storage = _create_storage(args.base_dir)
+    if args.source == "octo":
+        from zoneinfo import ZoneInfo
+
+        from octopus_stats.octo_api_reader import OctoAPIConfig
+        from octopus_stats.octo_exporter import OctoExporter, OctoExporterSettings
+
+        settings = OctoExporterSettings(storage=storage, tz=ZoneInfo(args.tz))
+        stats = OctoExporter(OctoAPIConfig.from_env(), settings).export(full=args.full)
+        for stage in stats:
+            print(f"{stage.name}: {stage.items} items")  # noqa: T201
+    else:
+        from zappi_stats.zappi_api_reader import MyenergiApiConfig
+        from zappi_stats.zappi_exporter import ZappiExporter, ZappiExporterSettings
+
+        if args.start is None:
+            raise SystemExit("--start is required to export Zappi data")
+        settings = ZappiExporterSettings(storage=storage, start_date=args.start)
+        days = ZappiExporter(MyenergiApiConfig.from_env(), settings).export(args.end)
+        print(f"Fetched {len(days)} days")  # noqa: T201
+
+
+def status(args: argparse.Namespace) -> None:
+    """Prints the state of the Octopus export: where the next one starts, and the partitions written."""
+    from octopus_stats.export_manifest import MANIFEST_PATH, ExportManifest
+
+    storage = _create_storage(args.base_dir)
+    try:
+        manifest = ExportManifest.from_json(storage.read_file_contents(MANIFEST_PATH))
+    except FileNotFoundError:
+        print("No export manifest found")  # noqa: T201
+        return
+    watermark = manifest.watermark.isoformat() if manifest.watermark else "none"
+    print(f"Watermark: {watermark}")  # noqa: T201
+    print(f"Partitions: {len(manifest.partitions)}")  # noqa: T201
+    if manifest.partitions:
+        print(f"Latest partition: {manifest.partitions[-1]}")  # noqa: T201
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(required=True, metavar="command")
+
+    def add_command(
+        name: str, fn: Callable[[argparse.Namespace], None]
+    ) -> argparse.ArgumentParser:
+        command = subparsers.add_parser(name, help=fn.__doc__, description=fn.__doc__)
+        command.set_defaults(func=fn)
+        command.add_argument(
+            "--base-dir", default=".", help="Root of the store (default: %(default)s)"
+        )
+        return command
+
+    for name, fn in (("octo", octo), ("zappi", zappi)):
+        command = add_command(name, fn)
+        command.add_argument("--start", type=_date, required=True)
+        command.add_argument(
+            "--end", type=_date, required=True, help="Day after the last to download"
+        )
+        command.add_argument("--tz", default=_DEFAULT_TZ)
+
+    command = add_command("export", export)
+    command.add_argument("source", nargs="?", choices=["octo", "zappi"], default="octo")
+    command.add_argument(
+        "--full",
+        action="store_true",
+        help="Export Octopus data from the start of the account's agreements",
+    )
+    command.add_argument(
+        "--start", type=_date, help="First (UTC) day of Zappi data to export"
+    )
+    command.add_argument(
+        "--end",
+        type=_date,
+        help="Last (UTC) day of Zappi data to export (default: today)",
+    )
+    command.add_argument("--tz", default=_DEFAULT_TZ)
+
+    add_command("status", status)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+def _date(value: str) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a date (YYYY-MM-DD): {value}") from None
+
+
+def _start_of(day: datetime.date, tz: str) -> "pendulum.DateTime":
+    import pendulum
+
+    return pendulum.datetime(day.year, day.month, day.day, tz=tz)
+
+
+def _load_dotenv() -> None:
+    import dotenv
+
+    dotenv.load_dotenv()
+
 
+def _create_storage(base_dir: str) -> "FileStorageManager":
+    from octopus_stats.file_storage_manager import (
+        FileStorageManager,
+        FileStorageSettings,
+    )
 
-def main() -> None:
-    zappi()
+    return FileStorageManager(FileStorageSettings(base_dir=base_dir))
 
 
 if __name__ == "__main__":
@@ -1,12 +1,28 @@
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
 
-from .octo_api_reader import Account as Account
-from .octo_api_reader import Agreement as Agreement
-from .octo_api_reader import ConsumptionRecord as ConsumptionRecord
-from .octo_api_reader import ElectricityMeter as ElectricityMeter
-from .octo_api_reader import ElectricityMeterPoint as ElectricityMeterPoint
-from .octo_api_reader import ElectricityMeterRegister as ElectricityMeterRegister
-from .octo_api_reader import OctoAPIConfig as OctoAPIConfig
-from .octo_api_reader import OctoAPIReader as OctoAPIReader
+if TYPE_CHECKING:
+    from .octo_api_models import Account as Account
+    from .octo_api_models import Agreement as Agreement
+    from .octo_api_models import ConsumptionRecord as ConsumptionRecord
+    from .octo_api_models import ElectricityMeter as ElectricityMeter
+    from .octo_api_models import ElectricityMeterPoint as ElectricityMeterPoint
+    from .octo_api_models import ElectricityMeterRegister as ElectricityMeterRegister
+    from .octo_api_reader import OctoAPIConfig as OctoAPIConfig
+    from .octo_api_reader import OctoAPIReader as OctoAPIReader
+
+# The exports are imported on first use, so that importing a light submodule (e.g. for a CLI) doesn't import the
+# reader, and pandas with it
+_EXPORTS = {
+    "Account": ".octo_api_models",
+    "Agreement": ".octo_api_models",
+    "ConsumptionRecord": ".octo_api_models",
+    "ElectricityMeter": ".octo_api_models",
+    "ElectricityMeterPoint": ".octo_api_models",
+    "ElectricityMeterRegister": ".octo_api_models",
+    "OctoAPIConfig": ".octo_api_reader",
+    "OctoAPIReader": ".octo_api_reader",
+}
 
 __all__ = [
     "Account",
@@ -18,3 +34,10 @@
     "OctoAPIConfig",
     "OctoAPIReader",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(module, __name__), name)
@@ -0,0 +1,185 @@
+import datetime
+import json
+import threading
+from pathlib import Path
+from typing import Any, Optional, Self
+
+from attrs import define, field, frozen
+
+from octopus_stats.octo_api_models import Agreement
+
+
+@frozen(kw_only=True)
+class MeterPointTopology:
+    mpan: str
+    serial_numbers: list[str] = field(factory=list)
+    """Serial numbers of the meters at the meter point, in the order the API lists them"""
+    agreements: list[Agreement] = field(factory=list)
+
+
+@frozen(kw_only=True)
+class AccountTopology:
+    """
+    The electricity meter points of an account, across all its properties, with their meters and agreements: everything
+    needed to choose a meter, without the rest of the `Account` tree.
+    """
+
+    account_number: str
+    meter_points: list[MeterPointTopology] = field(factory=list)
+    """Meter points in the order the API lists them, property by property"""
+    fetched_at: datetime.datetime
+
+    @property
+    def default_meter(self) -> tuple[str, str]:
+        """The (mpan, serial number) of the last meter of the last meter point, i.e. the current meter."""
+        for meter_point in reversed(self.meter_points):
+            if meter_point.serial_numbers:
+                return (meter_point.mpan, meter_point.serial_numbers[-1])
+        raise RuntimeError(f"Account {self.account_number} has no electricity meters")
+
+    def find_meter_point(self, mpan: str) -> Optional[MeterPointTopology]:
+        return next((mp for mp in self.meter_points if mp.mpan == mpan), None)
+
+    @classmethod
+    def from_api(cls, body: dict[str, Any], fetched_at: datetime.datetime) -> Self:
+        """Builds the topology directly from the raw `accounts/{number}` response."""
+        return cls(
+            account_number=body["number"],
+            meter_points=[
+                MeterPointTopology(
+                    mpan=mp["mpan"],
+                    serial_numbers=[m["serial_number"] for m in mp.get("meters", [])],
+                    agreements=[_agreement(a) for a in mp.get("agreements", [])],
+                )
+                for prop in body.get("properties", [])
+                for mp in prop.get("electricity_meter_points", [])
+            ],
+            fetched_at=fetched_at,
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "account_number": self.account_number,
+                "fetched_at": self.fetched_at.isoformat(),
+                "meter_points": [
+                    {
+                        "mpan": mp.mpan,
+                        "serial_numbers": mp.serial_numbers,
+                        "agreements": [
+                            {
+                                "tariff_code": a.tariff_code,
+                                "valid_from": a.valid_from.isoformat(),
+                                "valid_to": a.valid_to.isoformat()
+                                if a.valid_to
+                                else None,
+                            }
+                            for a in mp.agreements
+                        ],
+                    }
+                    for mp in self.meter_points
+                ],
+            },
+            indent=2,
+        )
+
+    @classmethod
+    def from_json(cls, content: str) -> Self:
+        data = json.loads(content)
+        return cls(
+            account_number=data["account_number"],
+            meter_points=[
+                MeterPointTopology(
+                    mpan=mp["mpan"],
+                    serial_numbers=mp["serial_numbers"],
+                    agreements=[_agreement(a) for a in mp["agreements"]],
+                )
+                for mp in data["meter_points"]
+            ],
+            fetched_at=datetime.datetime.fromisoformat(data["fetched_at"]),
+        )
+
+
+@define(kw_only=True, frozen=True)
+class TopologyCacheSettings:
+    ttl: datetime.timedelta = datetime.timedelta(days=1)
+    """How long a topology is used before it is fetched again"""
+    cache_dir: Optional[str] = None
+    """Directory in which to persist topologies between runs; if not set, they are only kept in memory"""
+
+
+class TopologyCache:
+    """
+    Keeps the topology of each account for `ttl`, in memory and optionally on disk, so that resolving an account's meter
+    doesn't cost an API call every time. The cache can be shared between threads and readers.
+    """
+
+    def __init__(self, settings: Optional[TopologyCacheSettings] = None) -> None:
+        self._settings = settings if settings is not None else TopologyCacheSettings()
+        self._dir = Path(self._settings.cache_dir) if self._settings.cache_dir else None
+        if self._dir is not None:
+            self._dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._topologies: dict[str, AccountTopology] = {}
+
+    def get(self, account_number: str) -> Optional[AccountTopology]:
+        """Returns the cached topology of the account, or `None` if there is none or it has expired."""
+        with self._lock:
+            topology = self._topologies.get(account_number)
+            if topology is None:
+                topology = self._load(account_number)
+            if topology is None:
+                return None
+            if topology.fetched_at + self._settings.ttl <= _now():
+                self._topologies.pop(account_number, None)
+                return None
+            self._topologies[account_number] = topology
+            return topology
+
+    def put(self, topology: AccountTopology) -> None:
+        with self._lock:
+            self._topologies[topology.account_number] = topology
+            path = self._path_for(topology.account_number)
+            if path is not None:
+                tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+                tmp_path.write_text(topology.to_json(), encoding="utf-8")
+                tmp_path.replace(path)
+
+    def invalidate(self, account_number: Optional[str] = None) -> None:
+        """Forgets the topology of the account, or of all accounts if `account_number` is `None`."""
+        with self._lock:
+            if account_number is None:
+                self._topologies.clear()
+                paths = list(self._dir.glob("*.json")) if self._dir else []
+            else:
+                self._topologies.pop(account_number, None)
+                paths = [p for p in [self._path_for(account_number)] if p is not None]
+            for path in paths:
+                path.unlink(missing_ok=True)
+
+    def _load(self, account_number: str) -> Optional[AccountTopology]:
+        path = self._path_for(account_number)
+        if path is None:
+            return None
+        try:
+            return AccountTopology.from_json(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def _path_for(self, account_number: str) -> Optional[Path]:
+        if self._dir is None:
+            return None
+        return self._dir / f"{account_number}.json"
+
+
+def _agreement(a: dict[str, Any]) -> Agreement:
+    valid_to = a.get("valid_to")
+    return Agreement(
+        tariff_code=a["tariff_code"],
+        valid_from=datetime.datetime.fromisoformat(a["valid_from"]),
+        valid_to=datetime.datetime.fromisoformat(valid_to) if valid_to else None,
+    )
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC)
@@ -0,0 +1,195 @@
+import asyncio
+import datetime
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
+from functools import cached_property, partial
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Optional, Self
+
+import httpx
+import pendulum
+from furl import furl  # type: ignore[reportMissingTypeStubs]
+
+from octopus_stats.account_topology import AccountTopology, TopologyCache
+from octopus_stats.http_session import create_async_client
+from octopus_stats.octo_api_models import Account, ConsumptionRecord, create_converter
+from octopus_stats.octo_api_reader import (
+    OctoAPIConfig,
+    _get_period_end,
+    _to_octo8601,
+)
+from octopus_stats.request_scheduler import RequestScheduler
+from octopus_stats.response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    import cattrs
+
+
+class AsyncOctoAPIReader:
+    """
+    The asyncio equivalent of `OctoAPIReader`, for streaming many meters concurrently on one event loop.
+
+    Each reader allows at most `max_concurrency` requests in flight at once. Share a client (see
+    `http_session.create_async_client`) between readers to share its connection pool. Cancelling a task that is
+    iterating one of the reader's generators cancels its in-flight request.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        config: OctoAPIConfig,
+        *,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[ResponseCache] = None,
+        max_concurrency: int = 4,
+        scheduler: Optional[RequestScheduler] = None,
+        topology_cache: Optional[TopologyCache] = None,
+    ) -> None:
+        """
+        Creates a reader. Pass a `client` to share a connection pool with other readers; otherwise the reader creates its
+        own. `cache`, `scheduler` and `topology_cache` are as for `OctoAPIReader`.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self._config = config
+        self._cache = cache
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._topology_cache = (
+            topology_cache if topology_cache is not None else TopologyCache()
+        )
+        self._owns_client = client is None
+        self._client = client if client is not None else create_async_client()
+        self._auth = httpx.BasicAuth(config.api_key, "")
+        self._limit = asyncio.Semaphore(max_concurrency)
+
+    @cached_property
+    def _converter(self) -> "cattrs.Converter":
+        """The converter for structuring records, created on first use: many uses of the reader never need it."""
+        return create_converter()
+
+    async def get_consumption(  # noqa: PLR0913
+        self,
+        *,
+        start: Optional[pendulum.DateTime] = None,
+        end: Optional[pendulum.DateTime] = None,
+        mpan: Optional[str] = None,
+        serial_number: Optional[str] = None,
+        account_number: Optional[str] = None,
+    ) -> AsyncGenerator[ConsumptionRecord, None]:
+        pages = self.get_consumption_pages(
+            start=start,
+            end=end,
+            mpan=mpan,
+            serial_number=serial_number,
+            account_number=account_number,
+        )
+        async with aclosing(pages):
+            async for page in pages:
+                for r in page:
+                    yield self._converter.structure(r, ConsumptionRecord)
+
+    async def get_consumption_pages(  # noqa: PLR0913
+        self,
+        *,
+        start: Optional[pendulum.DateTime] = None,
+        end: Optional[pendulum.DateTime] = None,
+        mpan: Optional[str] = None,
+        serial_number: Optional[str] = None,
+        account_number: Optional[str] = None,
+    ) -> AsyncGenerator[list[dict[str, Any]], None]:
+        """Gets the same records as `get_consumption`, as the raw `results` of each API page."""
+        (mpan, serial_number) = await self._resolve_meter(
+            mpan, serial_number, account_number
+        )
+        if start is None:
+            start = pendulum.DateTime.min
+        if end is None:
+            end = pendulum.DateTime.now()
+
+        f = furl(self._config.base_url)
+        f /= f"electricity-meter-points/{mpan}/meters/{serial_number}/consumption/"
+        f.add(
+            args={
+                "period_from": _to_octo8601(start),
+                "period_to": _to_octo8601(end),
+                "order_by": "period",
+                "page_size": "200",
+            }
+        )
+        response = await self._call_api_raw(f.url)
+        yield response["results"]
+        while response["next"]:
+            response = await self._call_api_raw(response["next"])
+            yield response["results"]
+
+    async def get_account(self, account_number: str) -> Account:
+        f = furl(self._config.base_url)
+        f /= f"accounts/{account_number}"
+        response = await self._call_api_raw(f.url)
+        return self._converter.structure(response, Account)
+
+    async def get_account_topology(
+        self, account_number: str, *, refresh: bool = False
+    ) -> AccountTopology:
+        """See `OctoAPIReader.get_account_topology`."""
+        # The caches may read and write files, so they are used off the event loop
+        if not refresh:
+            topology = await asyncio.to_thread(self._topology_cache.get, account_number)
+            if topology is not None:
+                return topology
+        f = furl(self._config.base_url)
+        f /= f"accounts/{account_number}"
+        body = await self._call_api_raw(f.url)
+        topology = AccountTopology.from_api(body, datetime.datetime.now(datetime.UTC))
+        await asyncio.to_thread(self._topology_cache.put, topology)
+        return topology
+
+    def invalidate_topology(self, account_number: Optional[str] = None) -> None:
+        """Forgets the cached topology of the account, or of all accounts if `account_number` is `None`."""
+        self._topology_cache.invalidate(account_number)
+
+    async def aclose(self) -> None:
+        """Closes the reader's HTTP client, unless it was supplied by the caller."""
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.aclose()
+
+    async def _resolve_meter(
+        self,
+        mpan: Optional[str],
+        serial_number: Optional[str],
+        account_number: Optional[str],
+    ) -> tuple[str, str]:
+        if account_number and not (mpan and serial_number):
+            topology = await self.get_account_topology(account_number)
+            (mpan, serial_number) = topology.default_meter
+
+        if not (mpan and serial_number):
+            raise RuntimeError("mpan and serial_number are required")
+        return (mpan, serial_number)
+
+    async def _call_api_raw(self, url: str) -> Any:
+        if self._cache is None:
+            return await self._fetch(url)
+        body = await asyncio.to_thread(self._cache.get, url)
+        if body is None:
+            body = await self._fetch(url)
+            await asyncio.to_thread(self._cache.put, url, body, _get_period_end(url))
+        return body
+
+    async def _fetch(self, url: str) -> Any:
+        async with self._limit:
+            r = await self._scheduler.send_async(
+                url, partial(self._client.get, url, auth=self._auth)
+            )
+        r.raise_for_status()
+        return r.json()
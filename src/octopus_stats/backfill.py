@@ -0,0 +1,268 @@
+import datetime
+import json
+import threading
+from collections import deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import zip_longest
+from pathlib import Path
+from typing import Any, Literal, Optional, Self
+
+import pendulum
+from attrs import define, evolve, field, validators
+
+from octopus_stats.octo_api_reader import OctoAPIReader
+from octopus_stats.parquet_writer import ParquetWriterSettings, PartitionedParquetWriter
+from octopus_stats.storage_manager import StorageManager
+
+ChunkState = Literal["pending", "running", "done", "failed"]
+
+
+@define(kw_only=True, frozen=True)
+class BackfillSettings:
+    checkpoint_path: str
+    """Local file in which the state of every chunk is kept, so that a backfill can be resumed"""
+    chunk_length: datetime.timedelta = field(
+        default=datetime.timedelta(days=28),
+        validator=[validators.gt(datetime.timedelta(0))],
+    )
+    """Length of each chunk of the period; the last chunk of each source may be shorter"""
+    workers: int = field(default=4, validator=[validators.ge(1)])
+    """Number of chunks run concurrently"""
+    max_attempts: int = field(default=3, validator=[validators.ge(1)])
+    """Number of times a chunk is run before it is left failed"""
+
+
+@define(kw_only=True)
+class BackfillChunk:
+    source: str
+    """What the chunk is of, e.g. a meter (`{mpan}/{serial_number}`) or a hub's serial number"""
+    start: datetime.datetime
+    end: datetime.datetime
+    state: ChunkState = "pending"
+    attempts: int = 0
+    """Number of times the chunk has been started"""
+    error: Optional[str] = None
+    """Why the chunk last failed, if it did"""
+
+    @property
+    def key(self) -> tuple[str, datetime.datetime, datetime.datetime]:
+        return (self.source, self.start, self.end)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "source": self.source,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "state": self.state,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        return cls(
+            source=data["source"],
+            start=datetime.datetime.fromisoformat(data["start"]),
+            end=datetime.datetime.fromisoformat(data["end"]),
+            state=data["state"],
+            attempts=data["attempts"],
+            error=data.get("error"),
+        )
+
+
+@define
+class BackfillStats:
+    skipped: int = 0
+    """Chunks already done, or failed with no attempts left, when the run started"""
+    done: int = 0
+    failed: int = 0
+    """Chunks that failed on their last attempt"""
+    retries: int = 0
+    records: int = 0
+    """Total of the record counts returned by the job"""
+
+
+class BackfillScheduler:
+    """
+    Runs a long backfill as independent chunks, checkpointing the state of each so that the backfill can be resumed.
+
+    `plan` splits a period into chunks for each source (e.g. each meter or hub), and `run` runs every unfinished chunk,
+    `workers` at a time, round-robin across the sources. Each chunk's state (pending, running, done or failed) is saved
+    to the checkpoint file whenever it changes, so after a crash or restart, `run` resumes with the chunks that were
+    pending or still running. A failing chunk is retried, after the other queued chunks, until it has been attempted
+    `max_attempts` times; it is then left failed, and not run again unless `reset_failed` is called.
+
+    Jobs must be idempotent, since a chunk that was running when the backfill stopped is run again from its start.
+    """
+
+    def __init__(self, settings: BackfillSettings) -> None:
+        self._settings = settings
+        self._path = Path(settings.checkpoint_path)
+        self._lock = threading.Lock()
+        self._chunks = self._load()
+
+    @property
+    def chunks(self) -> list[BackfillChunk]:
+        with self._lock:
+            return [evolve(c) for c in self._chunks]
+
+    def plan(
+        self,
+        sources: Iterable[str],
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> list[BackfillChunk]:
+        """
+        Adds the chunks of [`start`, `end`) for each source to the checkpoint, and returns all its chunks. Chunks that
+        are already in the checkpoint keep their state, so planning the same backfill again changes nothing.
+        """
+        length = self._settings.chunk_length
+        with self._lock:
+            known = {c.key for c in self._chunks}
+            for source in sources:
+                chunk_start = start
+                while chunk_start < end:
+                    chunk_end = min(chunk_start + length, end)
+                    chunk = BackfillChunk(
+                        source=source, start=chunk_start, end=chunk_end
+                    )
+                    if chunk.key not in known:
+                        self._chunks.append(chunk)
+                        known.add(chunk.key)
+                    chunk_start = chunk_end
+            self._save()
+        return self.chunks
+
+    def reset_failed(self) -> None:
+        """Gives the failed chunks a fresh retry budget, so that the next run tries them again."""
+        with self._lock:
+            for chunk in self._chunks:
+                if chunk.state == "failed":
+                    chunk.state = "pending"
+                    chunk.attempts = 0
+            self._save()
+
+    def run(self, job: Callable[[BackfillChunk], Optional[int]]) -> BackfillStats:
+        """
+        Runs `job` for each unfinished chunk, and returns the statistics of the run. The job is passed a copy of the
+        chunk, and may return the number of records it wrote; it fails the chunk by raising.
+        """
+        settings = self._settings
+        stats = BackfillStats()
+        with self._lock:
+            for chunk in self._chunks:
+                # Chunks left running were interrupted, and start again
+                if chunk.state == "running":
+                    chunk.state = "pending"
+            runnable = [c for c in self._chunks if self._is_runnable(c)]
+            stats.skipped = len(self._chunks) - len(runnable)
+            self._save()
+
+        queue = deque(_round_robin(runnable))
+        with ThreadPoolExecutor(max_workers=settings.workers) as executor:
+            futures: dict[Future[Optional[int]], BackfillChunk] = {}
+            while queue or futures:
+                while queue and len(futures) < settings.workers:
+                    chunk = queue.popleft()
+                    self._transition(chunk, "running")
+                    futures[executor.submit(job, evolve(chunk))] = chunk
+                (finished, _) = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk = futures.pop(future)
+                    try:
+                        records = future.result()
+                    # The chunk's failure is recorded, and mustn't stop the others
+                    except Exception as e:  # noqa: BLE001
+                        self._transition(chunk, "failed", f"{type(e).__name__}: {e}")
+                        if chunk.attempts < settings.max_attempts:
+                            stats.retries += 1
+                            queue.append(chunk)
+                        else:
+                            stats.failed += 1
+                    else:
+                        self._transition(chunk, "done")
+                        stats.done += 1
+                        stats.records += records or 0
+        return stats
+
+    def _is_runnable(self, chunk: BackfillChunk) -> bool:
+        return chunk.state == "pending" or (
+            chunk.state == "failed" and chunk.attempts < self._settings.max_attempts
+        )
+
+    def _transition(
+        self, chunk: BackfillChunk, state: ChunkState, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            chunk.state = state
+            if state == "running":
+                chunk.attempts += 1
+            else:
+                chunk.error = error
+            self._save()
+
+    def _load(self) -> list[BackfillChunk]:
+        try:
+            content = self._path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return []
+        return [BackfillChunk.from_dict(c) for c in json.loads(content)["chunks"]]
+
+    def _save(self) -> None:
+        """Saves the checkpoint, atomically so that a crash can't leave it half-written. Requires the lock."""
+        content = json.dumps({"chunks": [c.to_dict() for c in self._chunks]}, indent=2)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        tmp_path.replace(self._path)
+
+
+def consumption_backfill_job(
+    reader: OctoAPIReader,
+    storage: StorageManager,
+    settings: Optional[ParquetWriterSettings] = None,
+) -> Callable[[BackfillChunk], int]:
+    """
+    Creates a job that downloads a chunk of a meter's consumption, its source being `{mpan}/{serial_number}`, into the
+    meter's dataset, at `mpan={mpan}/serial={serial_number}/{dataset_path}`. Chunks are fetched concurrently, but those
+    of the same meter are written one at a time, as they share the dataset's metadata. A chunk that is run again may
+    leave duplicate rows, which `ConsumptionStore` and compaction drop.
+    """
+    settings = settings if settings is not None else ParquetWriterSettings()
+    locks: dict[str, threading.Lock] = {}
+    locks_lock = threading.Lock()
+
+    def job(chunk: BackfillChunk) -> int:
+        (mpan, serial_number) = chunk.source.split("/")
+        consumption = reader.get_consumption_frame(
+            start=pendulum.instance(chunk.start),
+            end=pendulum.instance(chunk.end),
+            mpan=mpan,
+            serial_number=serial_number,
+        )
+        # Each interval belongs to the one chunk containing its start
+        consumption = consumption[
+            (consumption["start_utc"] >= chunk.start)
+            & (consumption["start_utc"] < chunk.end)
+        ]
+        dataset_path = f"mpan={mpan}/serial={serial_number}/{settings.dataset_path}"
+        with locks_lock:
+            lock = locks.setdefault(chunk.source, threading.Lock())
+        with lock, PartitionedParquetWriter(
+            storage, evolve(settings, dataset_path=dataset_path)
+        ) as writer:
+            writer.write(consumption)
+        return len(consumption)
+
+    return job
+
+
+def _round_robin(chunks: list[BackfillChunk]) -> list[BackfillChunk]:
+    """Interleaves the sources' chunks, each source's in order: the first of each source, then the second, and so on."""
+    by_source: dict[str, list[BackfillChunk]] = {}
+    for chunk in sorted(chunks, key=lambda c: c.start):
+        by_source.setdefault(chunk.source, []).append(chunk)
+    return [
+        c for group in zip_longest(*by_source.values()) for c in group if c is not None
+    ]
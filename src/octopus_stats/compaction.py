@@ -0,0 +1,288 @@
+import datetime
+import json
+from typing import Any, Literal, Optional, Self
+
+import fastparquet
+import pandas as pd
+from attrs import define, field, validators
+
+from octopus_stats.export_manifest import MANIFEST_PATH, ExportManifest
+from octopus_stats.storage_manager import StorageManager
+
+COMPACTION_STATE_FILE = "_compaction.json"
+
+_METADATA_FILE = "_metadata"
+_DATE_PREFIX = "date_local="
+_PERIOD_PREFIX = "period_local="
+
+
+@define(kw_only=True, frozen=True)
+class CompactionSettings:
+    dataset_path: str = "consumption.parquet"
+    """Path of the daily (`date_local`-partitioned) dataset written by the exporter, relative to the storage root"""
+    compacted_path: str = "consumption_compacted.parquet"
+    """Directory of the compacted files, in `period_local={period}/part.{generation}.parquet`"""
+    granularity: Literal["month", "year"] = field(
+        default="month", validator=[validators.in_(["month", "year"])]
+    )
+    """Local period merged into each compacted file"""
+    compression: str = "SNAPPY"
+    row_group_size: int = field(default=100_000, validator=[validators.ge(1)])
+    """Maximum number of rows per row group of the compacted files"""
+
+
+@define(kw_only=True)
+class CompactedPeriod:
+    path: str
+    """The period's current compacted file"""
+    rows: int
+    replaced: list[str] = field(factory=list)
+    """Daily files merged into `path` that have not yet been removed from the daily dataset, and must be ignored"""
+
+
+@define(kw_only=True)
+class CompactionState:
+    """
+    Index of the compacted files, and the daily files they replace. Saving it is what commits a compaction: until then
+    readers see only the daily files, and afterwards the compacted files instead of the daily files they replace.
+    """
+
+    generation: int = 0
+    """Number of compactions committed so far, used to name each new compacted file uniquely"""
+    periods: dict[str, CompactedPeriod] = field(factory=dict)
+    """Compacted files, keyed by period (`YYYY-MM` or `YYYY`)"""
+
+    @property
+    def replaced(self) -> set[str]:
+        """Every daily file that has been replaced by a compacted file."""
+        return {path for period in self.periods.values() for path in period.replaced}
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "generation": self.generation,
+                "periods": {
+                    key: {
+                        "path": period.path,
+                        "rows": period.rows,
+                        "replaced": period.replaced,
+                    }
+                    for (key, period) in sorted(self.periods.items())
+                },
+            },
+            indent=2,
+        )
+
+    @classmethod
+    def from_json(cls, content: str) -> Self:
+        data: dict[str, Any] = json.loads(content)
+        return cls(
+            generation=data.get("generation", 0),
+            periods={
+                key: CompactedPeriod(
+                    path=period["path"],
+                    rows=period["rows"],
+                    replaced=list(period.get("replaced", [])),
+                )
+                for (key, period) in data.get("periods", {}).items()
+            },
+        )
+
+
+@define
+class CompactionStats:
+    periods_compacted: int = 0
+    files_replaced: int = 0
+    rows_read: int = 0
+    rows_written: int = 0
+    files_deleted: int = 0
+
+
+class Compactor:
+    """
+    Merges the exporter's small daily partitions into one file per month (or year), sorted and de-duplicated by
+    `start_utc`, with row groups of `row_group_size` rows and column statistics, so that scans open a handful of files
+    rather than one per day.
+
+    Only closed periods are compacted, i.e. those before the period of the latest day in the daily dataset; the daily
+    dataset therefore never becomes empty, and the exporter keeps appending to it (and resuming from its manifest's
+    watermark, which is left untouched) as before. Data exported late for a compacted period is merged into a new
+    compacted file the next time the compactor runs.
+
+    Each compaction is committed by atomically saving the compaction state, which lists the compacted files and the
+    daily files they replace; only then are the replaced files removed from the daily dataset and deleted. If that
+    cleanup is interrupted, the replaced files are still ignored by readers of the state, and the next run finishes
+    it. The compactor must not run at the same time as an export to the same store.
+    """
+
+    def __init__(self, storage: StorageManager, settings: CompactionSettings) -> None:
+        self._storage = storage
+        self._settings = settings
+
+    @property
+    def state_path(self) -> str:
+        return f"{self._settings.compacted_path}/{COMPACTION_STATE_FILE}"
+
+    def load_state(self) -> CompactionState:
+        try:
+            content = self._storage.read_file_contents(self.state_path)
+        except FileNotFoundError:
+            return CompactionState()
+        return CompactionState.from_json(content)
+
+    def compact(self) -> CompactionStats:
+        stats = CompactionStats()
+        state = self.load_state()
+        # Finish any cleanup interrupted by a previous run before looking for more to do
+        self._clean_up(state, stats)
+        daily = self._open_daily()
+        if daily is None:
+            return stats
+
+        groups: dict[str, list[Any]] = {}
+        for rg in daily.row_groups:
+            groups.setdefault(self._period(_partition_date(rg)), []).append(rg)
+        latest = self._period(max(_partition_date(rg) for rg in daily.row_groups))
+        closed = {key: rgs for (key, rgs) in sorted(groups.items()) if key < latest}
+        if not closed:
+            return stats
+
+        generation = state.generation + 1
+        for key, rgs in closed.items():
+            previous = state.periods.get(key)
+            merged = self._read_period(daily, rgs, previous, stats)
+            path = f"{self._settings.compacted_path}/{_PERIOD_PREFIX}{key}/part.{generation}.parquet"
+            self._write(path, merged)
+            replaced = [f"{daily.basepath}/{rg.columns[0].file_path}" for rg in rgs]
+            state.periods[key] = CompactedPeriod(
+                path=path,
+                rows=len(merged),
+                replaced=sorted(
+                    set(replaced).union(previous.replaced if previous else [])
+                ),
+            )
+            stats.periods_compacted += 1
+            stats.files_replaced += len(set(replaced))
+            stats.rows_written += len(merged)
+        state.generation = generation
+        self._storage.write_file_contents(self.state_path, state.to_json())
+
+        self._clean_up(state, stats)
+        return stats
+
+    def _read_period(
+        self,
+        daily: fastparquet.ParquetFile,
+        rgs: list[Any],
+        previous: Optional[CompactedPeriod],
+        stats: CompactionStats,
+    ) -> pd.DataFrame:
+        """Reads a period's daily row groups, after its previous compacted file (if any), sorted and de-duplicated."""
+        dates = sorted({pd.Timestamp(_partition_date(rg)) for rg in rgs})
+        daily_rows = daily.to_pandas(filters=[("date_local", "in", dates)])
+        daily_rows["date_local"] = daily_rows["date_local"].astype("datetime64[ns]")
+        frames = [daily_rows]
+        if previous is not None:
+            compacted = fastparquet.ParquetFile(
+                previous.path, open_with=self._storage.open_file
+            )
+            frames.insert(0, compacted.to_pandas()[daily_rows.columns])
+        merged = pd.concat(frames, ignore_index=True)
+        stats.rows_read += len(merged)
+        # Later writes (e.g. re-exports of the same intervals) win
+        merged = merged.drop_duplicates(subset="start_utc", keep="last")
+        return merged.sort_values("start_utc", kind="stable", ignore_index=True)
+
+    def _write(self, path: str, df: pd.DataFrame) -> None:
+        settings = self._settings
+        fastparquet.write(
+            path,
+            df,
+            row_group_offsets=settings.row_group_size,
+            compression=settings.compression,
+            write_index=False,
+            stats=True,
+            open_with=self._storage.open_file,
+            mkdirs=self._storage.make_dirs,
+        )
+
+    def _clean_up(self, state: CompactionState, stats: CompactionStats) -> None:
+        """
+        Removes replaced daily files, and superseded compacted files, once their replacements have been committed. Every
+        step can safely be repeated, so an interrupted cleanup is finished by running it again.
+        """
+        replaced = state.replaced
+        daily = self._open_daily()
+        if daily is not None and replaced:
+            rgs = [
+                rg
+                for rg in daily.row_groups
+                if f"{daily.basepath}/{rg.columns[0].file_path}" in replaced
+            ]
+            if rgs:
+                # Rewrite the dataset's metadata before deleting the files, so that it never refers to a missing file
+                daily.remove_row_groups(
+                    rgs, open_with=self._storage.open_file, remove_with=lambda _: None
+                )
+        for path in sorted(replaced):
+            if self._storage.file_exists(path):
+                self._storage.delete(path)
+                stats.files_deleted += 1
+
+        for period in state.periods.values():
+            directory = period.path.rsplit("/", 1)[0]
+            for path in self._storage.get_directory_listing(directory):
+                if path != period.path:
+                    self._storage.delete(path)
+                    stats.files_deleted += 1
+
+        self._update_export_manifest(state, daily)
+        if replaced:
+            for period in state.periods.values():
+                period.replaced = []
+            self._storage.write_file_contents(self.state_path, state.to_json())
+
+    def _update_export_manifest(
+        self, state: CompactionState, daily: Optional[fastparquet.ParquetFile]
+    ) -> None:
+        """Lists the compacted periods in the exporter's manifest, in place of the days they replaced."""
+        try:
+            manifest = ExportManifest.from_json(
+                self._storage.read_file_contents(MANIFEST_PATH)
+            )
+        except FileNotFoundError:
+            return
+        live = (
+            {f"{_DATE_PREFIX}{_partition_date(rg)}" for rg in daily.row_groups}
+            if daily is not None
+            else set()
+        )
+        partitions = {
+            p
+            for p in manifest.partitions
+            if p in live
+            or not p.startswith(_DATE_PREFIX)
+            or self._period(datetime.date.fromisoformat(p[len(_DATE_PREFIX) :]))
+            not in state.periods
+        }
+        partitions.update(f"{_PERIOD_PREFIX}{key}" for key in state.periods)
+        if partitions != set(manifest.partitions):
+            manifest.partitions = sorted(partitions)
+            self._storage.write_file_contents(MANIFEST_PATH, manifest.to_json())
+
+    def _open_daily(self) -> Optional[fastparquet.ParquetFile]:
+        dataset_path = self._settings.dataset_path
+        if not self._storage.file_exists(f"{dataset_path}/{_METADATA_FILE}"):
+            return None
+        return fastparquet.ParquetFile(dataset_path, open_with=self._storage.open_file)
+
+    def _period(self, day: datetime.date) -> str:
+        if self._settings.granularity == "year":
+            return f"{day:%Y}"
+        return f"{day:%Y-%m}"
+
+
+def _partition_date(rg: Any) -> datetime.date:
+    """The `date_local` of a daily row group, from its partition directory, e.g. `date_local=2024-01-31T00:00:00`."""
+    directory = rg.columns[0].file_path.split("/", 1)[0]
+    return datetime.date.fromisoformat(directory[len(_DATE_PREFIX) :][:10])
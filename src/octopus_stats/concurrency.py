@@ -0,0 +1,88 @@
+import asyncio
+from collections import deque
+from collections.abc import AsyncGenerator, Awaitable, Callable, Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def ordered_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    workers: int,
+    max_buffered: Optional[int] = None,
+) -> Generator[R, None, None]:
+    """
+    Applies `fn` to each of `items` on a pool of `workers` threads, yielding the results in the same order as `items`.
+
+    At most `max_buffered` calls are in flight or waiting to be consumed at any one time, so memory use stays bounded
+    however far ahead of the consumer the workers get. It defaults to twice the number of workers, or to 1 for a single
+    worker, in which case the calls are simply made inline. An exception raised by `fn` is re-raised when its result is
+    reached. Closing the generator early cancels any calls that have not started.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    if max_buffered is None:
+        max_buffered = 2 * workers if workers > 1 else 1
+    if max_buffered < 1:
+        raise ValueError("max_buffered must be at least 1")
+
+    if workers == 1 and max_buffered == 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    it = iter(items)
+    pending: deque[Future[R]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            pending.extend(
+                executor.submit(fn, item) for item in islice(it, max_buffered)
+            )
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(it, 1):
+                    pending.append(executor.submit(fn, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+async def async_ordered_map(
+    fn: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    *,
+    max_buffered: int,
+) -> AsyncGenerator[R, None]:
+    """
+    The asyncio equivalent of `ordered_map`: runs `fn` on each of `items` as a task, yielding the results in the same
+    order as `items`.
+
+    At most `max_buffered` tasks are in flight or waiting to be consumed at any one time; limit the number that are
+    actually doing I/O at once with a semaphore inside `fn`. An exception raised by `fn` is re-raised when its result
+    is reached. Closing the generator early, or cancelling the task that is iterating it, cancels the remaining tasks.
+    """
+    if max_buffered < 1:
+        raise ValueError("max_buffered must be at least 1")
+
+    it = iter(items)
+    pending: deque[asyncio.Task[R]] = deque()
+    try:
+        pending.extend(
+            asyncio.ensure_future(fn(item)) for item in islice(it, max_buffered)
+        )
+        while pending:
+            result = await pending.popleft()
+            for item in islice(it, 1):
+                pending.append(asyncio.ensure_future(fn(item)))
+            yield result
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,60 @@
+from collections.abc import Iterable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+# Length of "YYYY-MM-DDTHH:MM:SS", i.e. the wall-clock part of an ISO 8601 timestamp
+_WALL_CLOCK_LENGTH = 19
+
+
+def build_consumption_frame(pages: Iterable[list[dict[str, Any]]]) -> pd.DataFrame:
+    """
+    Builds a consumption DataFrame directly from pages of raw consumption API results, without creating an object per
+    record. The columns match those written by the `download` script:
+      - start_utc, end_utc: interval bounds (tz-aware, UTC)
+      - total_consumed_kwh
+      - start_local, end_local: interval bounds in the meter's local time (naive), as reported by the API
+      - start_utc_offset, end_utc_offset
+      - duration, date_local, dayofyear_local, dayofweek_local, hourofday_local
+    """
+    starts: list[str] = []
+    ends: list[str] = []
+    consumption: list[float] = []
+    for page in pages:
+        starts.extend([r["interval_start"] for r in page])
+        ends.extend([r["interval_end"] for r in page])
+        consumption.extend([r["consumption"] for r in page])
+
+    (start_utc, start_local) = _parse_timestamps(starts)
+    (end_utc, end_local) = _parse_timestamps(ends)
+    frame = pd.DataFrame(
+        {
+            "start_utc": start_utc,
+            "end_utc": end_utc,
+            "total_consumed_kwh": np.asarray(consumption, dtype=np.float64),
+            "start_local": start_local,
+            "end_local": end_local,
+            "start_utc_offset": start_local - start_utc.dt.tz_localize(None),
+            "end_utc_offset": end_local - end_utc.dt.tz_localize(None),
+        }
+    )
+    frame["duration"] = frame["end_utc"] - frame["start_utc"]
+    frame["date_local"] = frame["start_local"].dt.normalize()
+    frame["dayofyear_local"] = frame["start_local"].dt.dayofyear
+    frame["dayofweek_local"] = frame["start_local"].dt.dayofweek
+    frame["hourofday_local"] = frame["start_local"].dt.hour
+    return frame
+
+
+def _parse_timestamps(timestamps: list[str]) -> tuple[pd.Series, pd.Series]:
+    """
+    Parses ISO 8601 timestamps with UTC offsets into a tz-aware UTC series and a naive local (wall-clock) series. The
+    local series is taken from the leading date and time of each string, so the UTC offset of each value is simply the
+    difference between the two.
+    """
+    utc = pd.Series(pd.to_datetime(timestamps, utc=True, format="ISO8601"))
+    utc = utc.dt.as_unit("ns")
+    wall_clock = np.array(timestamps, dtype=f"U{_WALL_CLOCK_LENGTH}")
+    local = pd.Series(wall_clock.astype("datetime64[s]").astype("datetime64[ns]"))
+    return (utc, local)
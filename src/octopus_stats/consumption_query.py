@@ -0,0 +1,226 @@
+import datetime
+from collections.abc import Iterator, Sequence
+from typing import Any, Optional
+
+import fastparquet
+import pandas as pd
+from attrs import define, field
+
+from octopus_stats.compaction import (
+    COMPACTION_STATE_FILE,
+    CompactionSettings,
+    CompactionState,
+)
+from octopus_stats.storage_manager import StorageManager
+
+_METADATA_FILE = "_metadata"
+_ONE_DAY = datetime.timedelta(days=1)
+
+
+@define(kw_only=True, frozen=True)
+class ConsumptionQuery:
+    start: Optional[datetime.datetime] = None
+    """Earliest `start_utc` to return (inclusive, tz-aware), or `None` for the beginning of the data"""
+    end: Optional[datetime.datetime] = None
+    """Latest `start_utc` to return (exclusive, tz-aware), or `None` for the end of the data"""
+    columns: Optional[tuple[str, ...]] = field(
+        default=None, converter=lambda c: tuple(c) if c is not None else None
+    )
+    """Columns to read, or `None` for all of them"""
+    meter: str = ""
+    """Directory of the meter's export relative to the storage root, e.g. from `fan_out_exporter.meter_dir`"""
+
+
+@define
+class QueryStats:
+    files_opened: int = 0
+    """Compacted files whose footers were read; the daily dataset's `_metadata` counts as one"""
+    files_pruned: int = 0
+    """Compacted files skipped, without being opened, because their period is outside the query"""
+    row_groups_read: int = 0
+    row_groups_pruned: int = 0
+    """Row groups skipped because their partition or statistics are outside the query, or they have been replaced"""
+    rows_read: int = 0
+
+
+class ConsumptionStore:
+    """
+    Queries the consumption exported to a store, across the exporter's daily dataset and any files compacted from it
+    by the `Compactor`, reading as little as possible: compacted files are pruned by their period before being opened,
+    row groups by their `date_local` partition and their `start_utc` statistics, and only the requested columns are
+    read. A week of data therefore costs about a week of reads, however much history the store holds.
+    """
+
+    def __init__(
+        self, storage: StorageManager, layout: Optional[CompactionSettings] = None
+    ) -> None:
+        self._storage = storage
+        self._layout = layout or CompactionSettings()
+        self._stats = QueryStats()
+
+    @property
+    def stats(self) -> QueryStats:
+        """Totals over every query run so far."""
+        return self._stats
+
+    def read(self, query: ConsumptionQuery) -> pd.DataFrame:
+        """Reads the query's rows into a single DataFrame, sorted by `start_utc` and without duplicate intervals."""
+        chunks = list(self._iter_chunks(query, _with_start_utc(query.columns)))
+        if not chunks:
+            return pd.DataFrame(columns=list(query.columns or []))
+        consumption = pd.concat(chunks, ignore_index=True)
+        # Data exported late for a compacted period may repeat intervals in its compacted file; the later write wins
+        consumption = consumption.drop_duplicates(subset="start_utc", keep="last")
+        consumption = consumption.sort_values(
+            "start_utc", kind="stable", ignore_index=True
+        )
+        return consumption[list(query.columns)] if query.columns else consumption
+
+    def iter_chunks(self, query: ConsumptionQuery) -> Iterator[pd.DataFrame]:
+        """
+        Reads the query's rows one row group at a time, so that memory use is bounded by the row group size rather than
+        by the size of the result. Chunks are in storage order, and intervals exported late for an already compacted
+        period may appear twice until it is compacted again.
+        """
+        yield from self._iter_chunks(query, query.columns)
+
+    def _iter_chunks(
+        self, query: ConsumptionQuery, columns: Optional[Sequence[str]]
+    ) -> Iterator[pd.DataFrame]:
+        for bound in (query.start, query.end):
+            if bound is not None and bound.tzinfo is None:
+                raise ValueError("Query bounds must be timezone-aware")
+        prefix = f"{query.meter.rstrip('/')}/" if query.meter else ""
+        state = self._load_state(prefix)
+        filters = _filters(query)
+        (first_day, last_day) = _day_range(query)
+
+        for key, period in sorted(state.periods.items()):
+            if not _period_overlaps(key, first_day, last_day):
+                self._stats.files_pruned += 1
+                continue
+            compacted = fastparquet.ParquetFile(
+                f"{prefix}{period.path}", open_with=self._storage.open_file
+            )
+            self._stats.files_opened += 1
+            yield from self._read_row_groups(compacted, filters, columns, query)
+
+        dataset_path = f"{prefix}{self._layout.dataset_path}"
+        if self._storage.file_exists(f"{dataset_path}/{_METADATA_FILE}"):
+            daily = fastparquet.ParquetFile(
+                dataset_path, open_with=self._storage.open_file
+            )
+            self._stats.files_opened += 1
+            replaced = {f"{prefix}{path}" for path in state.replaced}
+            yield from self._read_row_groups(daily, filters, columns, query, replaced)
+
+    def _read_row_groups(  # noqa: PLR0913
+        self,
+        pf: fastparquet.ParquetFile,
+        filters: list[tuple[str, str, Any]],
+        columns: Optional[Sequence[str]],
+        query: ConsumptionQuery,
+        replaced: Optional[set[str]] = None,
+    ) -> Iterator[pd.DataFrame]:
+        selected = (
+            {id(rg) for rg in fastparquet.api.filter_row_groups(pf, filters)}
+            if filters
+            else {id(rg) for rg in pf.row_groups}
+        )
+        # Daily row groups are in the order they were appended; read them in date order instead
+        order = sorted(
+            range(len(pf.row_groups)),
+            key=lambda i: pf.row_groups[i].columns[0].file_path or "",
+        )
+        for i in order:
+            rg = pf.row_groups[i]
+            if id(rg) not in selected or (
+                replaced and f"{pf.basepath}/{rg.columns[0].file_path}" in replaced
+            ):
+                self._stats.row_groups_pruned += 1
+                continue
+            rows = pf[i].to_pandas(columns=_with_start_utc(columns))
+            self._stats.row_groups_read += 1
+            self._stats.rows_read += len(rows)
+            if "date_local" in rows and isinstance(
+                rows["date_local"].dtype, pd.CategoricalDtype
+            ):
+                # Partition values are read as categories
+                rows["date_local"] = rows["date_local"].astype("datetime64[ns]")
+            mask = pd.Series(True, index=rows.index)
+            if query.start is not None:
+                mask &= rows["start_utc"] >= pd.Timestamp(query.start)
+            if query.end is not None:
+                mask &= rows["start_utc"] < pd.Timestamp(query.end)
+            rows = rows[mask].reset_index(drop=True)
+            if columns and "start_utc" not in columns and "start_utc" in rows:
+                rows = rows.drop(columns="start_utc")
+            if not rows.empty:
+                yield rows
+
+    def _load_state(self, prefix: str) -> CompactionState:
+        path = f"{prefix}{self._layout.compacted_path}/{COMPACTION_STATE_FILE}"
+        try:
+            return CompactionState.from_json(self._storage.read_file_contents(path))
+        except FileNotFoundError:
+            return CompactionState()
+
+
+def _with_start_utc(columns: Optional[Sequence[str]]) -> Optional[list[str]]:
+    """The columns to read to answer a query, i.e. the requested columns plus `start_utc`, to filter on."""
+    if columns is None:
+        return None
+    return list(columns) if "start_utc" in columns else [*columns, "start_utc"]
+
+
+def _day_range(
+    query: ConsumptionQuery,
+) -> tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """
+    The local dates that may hold the query's rows. A local date is within a day of the UTC date, whatever the meter's
+    timezone, so the range is widened by a day at each end.
+    """
+    first = (
+        (pd.Timestamp(query.start).tz_convert("UTC") - _ONE_DAY).date()
+        if query.start is not None
+        else None
+    )
+    last = (
+        (pd.Timestamp(query.end).tz_convert("UTC") + _ONE_DAY).date()
+        if query.end is not None
+        else None
+    )
+    return (first, last)
+
+
+def _filters(query: ConsumptionQuery) -> list[tuple[str, str, Any]]:
+    """Row group filters on the `date_local` partitions and the `start_utc` statistics, which are stored as naive UTC."""
+    filters: list[tuple[str, str, Any]] = []
+    (first_day, last_day) = _day_range(query)
+    if query.start is not None:
+        filters.append(("date_local", ">=", pd.Timestamp(first_day)))
+        start = pd.Timestamp(query.start).tz_convert("UTC").tz_localize(None)
+        filters.append(("start_utc", ">=", start))
+    if query.end is not None:
+        filters.append(("date_local", "<=", pd.Timestamp(last_day)))
+        end = pd.Timestamp(query.end).tz_convert("UTC").tz_localize(None)
+        filters.append(("start_utc", "<", end))
+    return filters
+
+
+def _period_overlaps(
+    key: str, first_day: Optional[datetime.date], last_day: Optional[datetime.date]
+) -> bool:
+    """Whether a compacted period (`YYYY` or `YYYY-MM`) overlaps the days from `first_day` to `last_day` inclusive."""
+    if len(key) == len("YYYY"):
+        (start, end) = (
+            datetime.date(int(key), 1, 1),
+            datetime.date(int(key) + 1, 1, 1),
+        )
+    else:
+        (year, month) = (int(key[:4]), int(key[5:7]))
+        start = datetime.date(year, month, 1)
+        end = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return (last_day is None or start <= last_day) and (
+        first_day is None or end > first_day
+    )
@@ -0,0 +1,38 @@
+import json
+from datetime import datetime
+from typing import Optional, Self
+
+from attrs import define, field
+
+MANIFEST_PATH = "_manifest.json"
+
+
+@define(kw_only=True)
+class ExportManifest:
+    """
+    Index of the partitions written by the exporter, kept alongside them so that the exporter can find where to resume
+    without scanning the store.
+    """
+
+    watermark: Optional[datetime] = None
+    """Latest processed record datetime, i.e. where the next incremental export starts"""
+    partitions: list[str] = field(factory=list)
+    """Paths of the partitions written so far, sorted"""
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+                "partitions": self.partitions,
+            },
+            indent=2,
+        )
+
+    @classmethod
+    def from_json(cls, content: str) -> Self:
+        data = json.loads(content)
+        watermark = data.get("watermark")
+        return cls(
+            watermark=datetime.fromisoformat(watermark) if watermark else None,
+            partitions=list(data.get("partitions", [])),
+        )
@@ -0,0 +1,315 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections.abc import Iterable
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from itertools import zip_longest
+from pathlib import Path
+from typing import Any, Optional
+
+import pytz
+from attrs import define, field, frozen, validators
+
+from octopus_stats.account_topology import TopologyCache, TopologyCacheSettings
+from octopus_stats.concurrency import ordered_map
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.instrumentation import MetricsRecorder
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from octopus_stats.octo_exporter import OctoExporter, OctoExporterSettings
+from octopus_stats.parquet_writer import ParquetWriterSettings
+from octopus_stats.request_scheduler import RequestScheduler, RequestSchedulerSettings
+
+
+@define(kw_only=True, frozen=True)
+class FanOutExporterSettings:
+    base_dir: str
+    """Directory under which each meter is exported, in `[account={number}/]mpan={mpan}/serial={serial}`"""
+    tz_name: str = "Europe/London"
+    workers: int = field(
+        factory=lambda: os.cpu_count() or 1, validator=[validators.ge(1)]
+    )
+    """Number of worker processes, each exporting one meter at a time"""
+    discovery_workers: int = field(default=4, validator=[validators.ge(1)])
+    """Number of accounts looked up concurrently, to find their meters"""
+    full: bool = False
+    """Whether to export each meter from the start of its agreements, rather than from where its last export finished"""
+    writer: ParquetWriterSettings = field(factory=ParquetWriterSettings)
+    scheduler: RequestSchedulerSettings = field(factory=RequestSchedulerSettings)
+    """Rate limits and retries of each worker process, so the limits on the API as a whole are `workers` times these"""
+    start_method: Optional[str] = None
+    """`multiprocessing` start method of the worker processes (default: the platform's default)"""
+
+
+@frozen(kw_only=True)
+class MeterExportJob:
+    """The export of a single meter, as sent to a worker process."""
+
+    config: OctoAPIConfig
+    """Config with the meter's mpan and serial number, and its account number if known"""
+    output_dir: str
+    settings: FanOutExporterSettings
+    topology_cache_dir: Optional[str] = None
+    """Where the account topologies found by discovery are cached, so that workers needn't fetch them again"""
+
+
+@define(kw_only=True)
+class MeterExportResult:
+    account_number: Optional[str]
+    mpan: Optional[str]
+    serial_number: Optional[str]
+    records: int = 0
+    """Records written"""
+    seconds: float = 0.0
+    error: Optional[str] = None
+    """Why the export (or the discovery of the account's meters) failed, if it did"""
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class FanOutExporter:
+    """
+    Exports every meter of many accounts (or of individually configured meters) in parallel, across a pool of worker
+    processes.
+
+    Each account config is expanded into all the meters of all its meter points, found from the account's topology;
+    a config with an mpan and serial number exports just that meter. Each meter is exported by an `OctoExporter` into
+    its own directory, so meters can be exported, resumed or failed independently. Meters are queued round-robin
+    across the configs, so that no one account holds up the rest, and a failure (in discovery or export, or of a worker
+    process dying) is reported in that meter's result without affecting any other.
+    """
+
+    def __init__(
+        self, configs: Iterable[OctoAPIConfig], settings: FanOutExporterSettings
+    ) -> None:
+        self._configs = list(configs)
+        self._settings = settings
+
+    def export(self) -> list[MeterExportResult]:
+        """Exports every meter, and returns the result for each, failures included, in the order they were queued."""
+        with tempfile.TemporaryDirectory(prefix="topology-") as topology_cache_dir:
+            (jobs, failures) = self.discover(topology_cache_dir)
+            return failures + self._run(jobs)
+
+    def discover(
+        self, topology_cache_dir: Optional[str] = None
+    ) -> tuple[list[MeterExportJob], list[MeterExportResult]]:
+        """
+        Finds the meters to export, and returns their jobs (in the order they will be queued) along with the results of
+        any configs whose meters could not be found.
+        """
+        topology_cache = TopologyCache(
+            TopologyCacheSettings(cache_dir=topology_cache_dir)
+        )
+
+        def find_jobs(
+            config: OctoAPIConfig,
+        ) -> list[MeterExportJob] | MeterExportResult:
+            try:
+                return self._find_jobs(config, topology_cache, topology_cache_dir)
+            # One account's failure mustn't stop the others
+            except Exception as e:  # noqa: BLE001
+                return MeterExportResult(
+                    account_number=config.account_number,
+                    mpan=config.mpan,
+                    serial_number=config.serial_number,
+                    error=_describe(e),
+                )
+
+        groups: list[list[MeterExportJob]] = []
+        failures: list[MeterExportResult] = []
+        found = ordered_map(
+            find_jobs, self._configs, workers=self._settings.discovery_workers
+        )
+        for jobs in found:
+            if isinstance(jobs, MeterExportResult):
+                failures.append(jobs)
+            else:
+                groups.append(jobs)
+        return (_round_robin(groups), failures)
+
+    def _find_jobs(
+        self,
+        config: OctoAPIConfig,
+        topology_cache: TopologyCache,
+        topology_cache_dir: Optional[str],
+    ) -> list[MeterExportJob]:
+        if config.mpan and config.serial_number:
+            meters = [(config.mpan, config.serial_number)]
+        elif config.account_number:
+            reader = OctoAPIReader(
+                config,
+                scheduler=RequestScheduler(self._settings.scheduler),
+                topology_cache=topology_cache,
+            )
+            try:
+                topology = reader.get_account_topology(config.account_number)
+            finally:
+                reader.close()
+            meters = [
+                (meter_point.mpan, serial_number)
+                for meter_point in topology.meter_points
+                if config.mpan in (None, meter_point.mpan)
+                for serial_number in meter_point.serial_numbers
+            ]
+        else:
+            raise RuntimeError(
+                "An account number, or an mpan and serial number, is required"
+            )
+
+        jobs: list[MeterExportJob] = []
+        for mpan, serial_number in dict.fromkeys(meters):
+            meter_config = OctoAPIConfig(
+                api_key=config.api_key,
+                mpan=mpan,
+                serial_number=serial_number,
+                account_number=config.account_number,
+                base_url=config.base_url,
+            )
+            jobs.append(
+                MeterExportJob(
+                    config=meter_config,
+                    output_dir=str(
+                        Path(self._settings.base_dir) / meter_dir(meter_config)
+                    ),
+                    settings=self._settings,
+                    topology_cache_dir=topology_cache_dir,
+                )
+            )
+        return jobs
+
+    def _run(self, jobs: list[MeterExportJob]) -> list[MeterExportResult]:
+        if not jobs:
+            return []
+        results: list[Optional[MeterExportResult]] = [None] * len(jobs)
+        broken = self._run_pool(jobs, list(range(len(jobs))), results)
+        if broken:
+            # A worker process died, which breaks the pool and fails every job it hadn't finished. Run each of those
+            # again in a process of its own, so that a crash fails only the job that caused it.
+            def run_alone(i: int) -> None:
+                error = self._run_pool(jobs, [i], results).get(i)
+                if error is not None:
+                    results[i] = _failed(jobs[i], error)
+
+            for _ in ordered_map(run_alone, broken, workers=self._settings.workers):
+                pass
+        return [r for r in results if r is not None]
+
+    def _run_pool(
+        self,
+        jobs: list[MeterExportJob],
+        indices: list[int],
+        results: list[Optional[MeterExportResult]],
+    ) -> dict[int, BrokenProcessPool]:
+        """
+        Runs the jobs at `indices` on a pool of worker processes, storing their results, and returns the errors of any
+        that were cut short because the pool broke.
+        """
+        mp_context = (
+            multiprocessing.get_context(self._settings.start_method)
+            if self._settings.start_method
+            else None
+        )
+        broken: dict[int, BrokenProcessPool] = {}
+        with ProcessPoolExecutor(
+            max_workers=min(self._settings.workers, len(indices)),
+            mp_context=mp_context,
+        ) as executor:
+            # The pool starts jobs in the order they are submitted, i.e. round-robin across the configs
+            futures: dict[Future[MeterExportResult], int] = {
+                executor.submit(export_meter, jobs[i]): i for i in indices
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool as e:
+                    broken[i] = e
+                # e.g. the job's result couldn't be sent back
+                except Exception as e:  # noqa: BLE001
+                    results[i] = _failed(jobs[i], e)
+        return dict(sorted(broken.items()))
+
+
+def export_meter(job: MeterExportJob) -> MeterExportResult:
+    """Exports a single meter; runs in a worker process, and reports any failure in its result rather than raising."""
+    started = time.perf_counter()
+    recorder = MetricsRecorder()
+    settings = job.settings
+    try:
+        Path(job.output_dir).mkdir(parents=True, exist_ok=True)
+        reader = OctoAPIReader(
+            job.config,
+            scheduler=RequestScheduler(settings.scheduler),
+            topology_cache=TopologyCache(
+                TopologyCacheSettings(cache_dir=job.topology_cache_dir)
+            ),
+            instrumentation=recorder,
+        )
+        exporter_settings = OctoExporterSettings(
+            storage=FileStorageManager(FileStorageSettings(base_dir=job.output_dir)),
+            tz=pytz.timezone(settings.tz_name),
+            writer=settings.writer,
+            instrumentation=recorder,
+        )
+        try:
+            OctoExporter(job.config, exporter_settings, reader).export(
+                full=settings.full
+            )
+        finally:
+            reader.close()
+    # Any failure is reported in the result
+    except Exception as e:  # noqa: BLE001
+        result = _failed(job, e)
+    else:
+        result = _succeeded(
+            job, int(recorder.counter("export_records_total", exporter="octopus"))
+        )
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def meter_dir(config: OctoAPIConfig) -> str:
+    """The directory, relative to the base directory, into which a meter is exported."""
+    path = f"mpan={config.mpan}/serial={config.serial_number}"
+    return f"account={config.account_number}/{path}" if config.account_number else path
+
+
+def load_configs(path: str) -> list[OctoAPIConfig]:
+    """
+    Loads configs from a JSON file containing a list of objects, each with an `api_key` and either an `account_number`
+    or an `mpan` and `serial_number` (or all three, to export one meter of an account).
+    """
+    content: list[dict[str, Any]] = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [OctoAPIConfig(**c) for c in content]
+
+
+def _round_robin(groups: list[list[MeterExportJob]]) -> list[MeterExportJob]:
+    """Interleaves the groups' jobs: the first of each group, then the second of each, and so on."""
+    return [job for jobs in zip_longest(*groups) for job in jobs if job is not None]
+
+
+def _succeeded(job: MeterExportJob, records: int) -> MeterExportResult:
+    return MeterExportResult(
+        account_number=job.config.account_number,
+        mpan=job.config.mpan,
+        serial_number=job.config.serial_number,
+        records=records,
+    )
+
+
+def _failed(job: MeterExportJob, e: BaseException) -> MeterExportResult:
+    return MeterExportResult(
+        account_number=job.config.account_number,
+        mpan=job.config.mpan,
+        serial_number=job.config.serial_number,
+        error=_describe(e),
+    )
+
+
+def _describe(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}"
@@ -1,8 +1,14 @@
+import mmap
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from typing import BinaryIO, Optional
 
 from attrs import define
 
-from octopus_stats.octo_exporter import StorageManager
+from octopus_stats.storage_manager import DEFAULT_CHUNK_SIZE, StorageManager
 
 
 @define(kw_only=True, frozen=True)
@@ -28,6 +34,89 @@ def read_file_contents(self, filepath: str) -> str:
             return content
 
 
+    def read_bytes(
+        self, filepath: str, offset: int = 0, length: Optional[int] = None
+    ) -> bytes:
+        filename = self._get_path(filepath)
+        with filename.open("rb") as f:
+            if offset < 0:
+                f.seek(max(offset, -f.seek(0, os.SEEK_END)), os.SEEK_END)
+            else:
+                f.seek(offset)
+            return f.read() if length is None else f.read(length)
+
+    def get_file_size(self, filepath: str) -> int:
+        return self._get_path(filepath).stat().st_size
+
+    def iter_file_chunks(
+        self,
+        filepath: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        offset: int = 0,
+        length: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        filename = self._get_path(filepath)
+        with filename.open("rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            if offset < 0:
+                offset = max(size + offset, 0)
+            remaining = size - offset if length is None else min(length, size - offset)
+            f.seek(offset)
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    @contextmanager
+    def map_file(self, filepath: str) -> Iterator[memoryview]:
+        """
+        Memory-maps `filepath` read-only, yielding a zero-copy view of its contents. Slices of the view (e.g. a parquet
+        footer or column chunk) are only paged in from disk when accessed. The view must not be used after the context
+        exits.
+        """
+        filename = self._get_path(filepath)
+        with filename.open("rb") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                # Zero-length files cannot be mapped
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def open_file(self, filepath: str, mode: str = "rb") -> BinaryIO:
+        if "b" not in mode:
+            raise ValueError("open_file only supports binary modes")
+        filename = self._get_path(filepath)
+        if mode[0] in "wax":
+            filename.parent.mkdir(parents=True, exist_ok=True)
+        return filename.open(mode)  # type: ignore[return-value]
+
+    def make_dirs(self, dirpath: str) -> None:
+        self._get_path(dirpath).mkdir(parents=True, exist_ok=True)
+
+    def write_file_contents(self, filepath: str, content: str) -> None:
+        filename = self._get_path(filepath)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file alongside the target, then rename it over the target (which is atomic); the
+        # temporary file is the writing thread's own, as other threads (or processes) may be writing the same target
+        tmp_filename = filename.with_name(
+            f".{filename.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            with tmp_filename.open("w") as f:
+                f.write(content)
+            tmp_filename.replace(filename)
+        finally:
+            tmp_filename.unlink(missing_ok=True)
+
     def get_directory_listing(self, dirpath: str) -> list[str]:
         if Path(dirpath).is_absolute():
             raise ValueError("dirpath must be a relative path")
@@ -36,3 +125,16 @@ def get_directory_listing(self, dirpath: str) -> list[str]:
         files = [p.relative_to(self._basepath).as_posix() for p in paths if p.is_file()]
         files.sort()
         return files
+
+    def delete(self, filepath: str) -> None:
+        self._get_path(filepath).unlink(missing_ok=True)
+
+    def move(self, source: str, destination: str) -> None:
+        filename = self._get_path(destination)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        self._get_path(source).replace(filename)
+
+    def _get_path(self, filepath: str) -> Path:
+        if Path(filepath).is_absolute():
+            raise ValueError("filepath must be a relative path")
+        return self._basepath.joinpath(filepath)
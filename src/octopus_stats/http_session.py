@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING, Optional
+
+import requests
+from attrs import define, field, validators
+from requests.adapters import HTTPAdapter
+
+if TYPE_CHECKING:
+    import httpx
+
+
+@define(kw_only=True, frozen=True)
+class HttpSessionSettings:
+    pool_connections: int = field(default=4, validator=[validators.ge(1)])
+    """Number of hosts to keep a connection pool for"""
+    pool_maxsize: int = field(default=10, validator=[validators.ge(1)])
+    """Maximum number of connections kept alive per host; set this to at least the number of concurrent workers"""
+    pool_block: bool = False
+    """If true, requests wait for a free connection rather than opening a short-lived extra one"""
+
+
+def create_session(settings: Optional[HttpSessionSettings] = None) -> requests.Session:
+    """
+    Creates a `requests.Session` with keep-alive connection pools sized according to `settings`.
+
+    The session carries no credentials, so one session can be shared by several API readers; each reader passes its own
+    (long-lived) auth object with every request. Reusing an `HTTPDigestAuth` object in this way lets it answer the
+    server's challenge pre-emptively on later requests, rather than taking a 401 round trip each time. Note that digest
+    state is kept per thread, so each worker thread negotiates once.
+    """
+    if settings is None:
+        settings = HttpSessionSettings()
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.pool_connections,
+        pool_maxsize=settings.pool_maxsize,
+        pool_block=settings.pool_block,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def create_async_client(
+    settings: Optional[HttpSessionSettings] = None,
+) -> "httpx.AsyncClient":
+    """
+    Creates an `httpx.AsyncClient` for the async readers, with a keep-alive connection pool sized according to
+    `settings`, so that many readers on one event loop can share a single pool.
+
+    httpx limits connections across all hosts rather than per host, so the pool holds up to `pool_maxsize` keep-alive
+    connections for each of `pool_connections` hosts. If `pool_block` is false, the total is not capped; otherwise
+    requests wait for a free connection once the cap is reached. Like `create_session`, the client carries no
+    credentials.
+    """
+    # httpx is only imported here, so that the synchronous readers don't pay for it
+    import httpx
+
+    if settings is None:
+        settings = HttpSessionSettings()
+    max_keepalive = settings.pool_connections * settings.pool_maxsize
+    limits = httpx.Limits(
+        max_connections=max_keepalive if settings.pool_block else None,
+        max_keepalive_connections=max_keepalive,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=30)
@@ -0,0 +1,227 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Generator
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+from attrs import define
+
+_NULL_TIMER = contextlib.nullcontext()
+
+_LabelKey = tuple[tuple[str, str], ...]
+_SeriesKey = tuple[str, _LabelKey]
+
+
+class Instrumentation:
+    """
+    Receives measurements from the readers, exporters and stores: counts of events (e.g. requests, bytes, records) and
+    observations of durations. This base class discards them, and is the default everywhere, so that instrumentation
+    costs next to nothing unless it is enabled by passing a `MetricsRecorder` instead.
+
+    Metric names are given without a namespace; counters end in `_total` (or `_bytes_total`), durations in `_seconds`.
+    """
+
+    enabled = False
+    """Whether measurements are kept, i.e. whether it is worth working out any that are costly to compute"""
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        """Adds `value` to the counter `name`."""
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Records one observation of `name`, e.g. the duration of an operation."""
+
+    def timed(
+        self,
+        name: str,  # noqa: ARG002
+        **labels: str,  # noqa: ARG002
+    ) -> AbstractContextManager[Any]:
+        """Observes the wall-clock duration of the block as `name`."""
+        return _NULL_TIMER
+
+
+NULL_INSTRUMENTATION = Instrumentation()
+
+
+@define
+class MetricSummary:
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+
+
+class MetricsRecorder(Instrumentation):
+    """
+    Aggregates measurements in memory, per metric and set of labels, for export as structured log lines or in the
+    Prometheus text format (e.g. for node_exporter's textfile collector). Observations are summarised by their count,
+    sum and maximum. If `event_logger` is given, each individual measurement is also logged there at DEBUG level, as a
+    JSON object. The recorder can be shared between threads.
+    """
+
+    enabled = True
+
+    def __init__(
+        self,
+        *,
+        namespace: str = "octopus_stats",
+        event_logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self._namespace = namespace
+        self._event_logger = event_logger
+        self._lock = threading.Lock()
+        self._counters: dict[_SeriesKey, float] = {}
+        self._summaries: dict[_SeriesKey, MetricSummary] = {}
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._log_event("count", name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = MetricSummary()
+            summary.count += 1
+            summary.total += value
+            summary.maximum = max(summary.maximum, value)
+        self._log_event("observe", name, value, labels)
+
+    def timed(self, name: str, **labels: str) -> AbstractContextManager[Any]:
+        return self._time(name, labels)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """The current value of a counter, or 0 if nothing has been counted."""
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def summary(self, name: str, **labels: str) -> MetricSummary:
+        """A snapshot of the observations of a metric so far."""
+        with self._lock:
+            summary = self._summaries.get((name, _label_key(labels)), MetricSummary())
+            return MetricSummary(summary.count, summary.total, summary.maximum)
+
+    def to_log_records(self) -> list[dict[str, Any]]:
+        """The current value of every series, as flat dicts suitable for structured logging."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+        records: list[dict[str, Any]] = [
+            {"metric": name, **dict(labels), "value": value}
+            for ((name, labels), value) in counters
+        ]
+        records.extend(
+            {
+                "metric": name,
+                **dict(labels),
+                "count": s.count,
+                "sum": s.total,
+                "max": s.maximum,
+            }
+            for ((name, labels), s) in summaries
+        )
+        return records
+
+    def log_summary(self, logger: logging.Logger, level: int = logging.INFO) -> None:
+        """Logs the current value of every series, one JSON object per line."""
+        for record in self.to_log_records():
+            logger.log(level, json.dumps(record))
+
+    def to_prometheus(self) -> str:
+        """The current value of every series, in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+        lines: list[str] = []
+        previous = None
+        for (name, labels), value in counters:
+            metric = f"{self._namespace}_{name}"
+            if name != previous:
+                lines.append(f"# TYPE {metric} counter")
+                previous = name
+            lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), s in summaries:
+            metric = f"{self._namespace}_{name}"
+            if name != previous:
+                lines.append(f"# TYPE {metric} summary")
+                previous = name
+            formatted = _format_labels(labels)
+            lines.append(f"{metric}_count{formatted} {s.count}")
+            lines.append(f"{metric}_sum{formatted} {_format_value(s.total)}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Writes `to_prometheus` to `path` atomically, so that a collector scraping the file never sees a partial write.
+        """
+        target = Path(path)
+        temp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        temp.write_text(self.to_prometheus(), encoding="utf-8")
+        temp.replace(target)
+
+    @contextlib.contextmanager
+    def _time(self, name: str, labels: dict[str, str]) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _log_event(
+        self, kind: str, name: str, value: float, labels: dict[str, str]
+    ) -> None:
+        if self._event_logger is not None and self._event_logger.isEnabledFor(
+            logging.DEBUG
+        ):
+            self._event_logger.debug(
+                json.dumps({"event": kind, "metric": name, **labels, "value": value})
+            )
+
+
+def record_http_response(
+    instrumentation: Instrumentation,
+    api: str,
+    response: requests.Response,
+    seconds: float,
+) -> None:
+    """
+    Records a response fetched through a `RequestScheduler`. `seconds`, observed as `http_request_seconds`, includes any
+    retries and waits for the rate limits; `http_response_seconds` is the time from sending the final attempt to
+    parsing its headers, i.e. connection setup (DNS, TLS) plus the API's own latency.
+    """
+    if not instrumentation.enabled:
+        return
+    instrumentation.count(
+        "http_requests_total", api=api, status=str(response.status_code)
+    )
+    instrumentation.observe("http_request_seconds", seconds, api=api)
+    instrumentation.observe(
+        "http_response_seconds", response.elapsed.total_seconds(), api=api
+    )
+    instrumentation.count("http_response_bytes_total", len(response.content), api=api)
+
+
+def _label_key(labels: dict[str, str]) -> _LabelKey:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: _LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for (k, v) in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
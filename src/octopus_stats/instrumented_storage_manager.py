@@ -0,0 +1,133 @@
+import time
+from collections.abc import Iterator
+from types import TracebackType
+from typing import Any, BinaryIO, Optional, Self
+
+from octopus_stats.instrumentation import Instrumentation
+from octopus_stats.storage_manager import DEFAULT_CHUNK_SIZE, StorageManager
+
+
+class InstrumentedStorageManager(StorageManager):
+    """
+    Wraps another store, reporting the time taken by each operation as `storage_seconds` and the bytes read and
+    written as `storage_bytes_total`, both labelled by operation. Files opened with `open_file` are timed from opening
+    to closing. Methods specific to the wrapped store are passed through untimed.
+    """
+
+    def __init__(
+        self, storage: StorageManager, instrumentation: Instrumentation
+    ) -> None:
+        super().__init__()
+        self._storage = storage
+        self._instrumentation = instrumentation
+
+    def read_file_contents(self, filepath: str) -> str:
+        with self._instrumentation.timed("storage_seconds", op="read_file_contents"):
+            content = self._storage.read_file_contents(filepath)
+        self._instrumentation.count("storage_bytes_total", len(content), op="read")
+        return content
+
+    def read_bytes(
+        self, filepath: str, offset: int = 0, length: Optional[int] = None
+    ) -> bytes:
+        with self._instrumentation.timed("storage_seconds", op="read_bytes"):
+            content = self._storage.read_bytes(filepath, offset, length)
+        self._instrumentation.count("storage_bytes_total", len(content), op="read")
+        return content
+
+    def get_file_size(self, filepath: str) -> int:
+        with self._instrumentation.timed("storage_seconds", op="get_file_size"):
+            return self._storage.get_file_size(filepath)
+
+    def iter_file_chunks(
+        self,
+        filepath: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        offset: int = 0,
+        length: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        for chunk in self._storage.iter_file_chunks(
+            filepath, chunk_size, offset, length
+        ):
+            self._instrumentation.count("storage_bytes_total", len(chunk), op="read")
+            yield chunk
+
+    def file_exists(self, filepath: str) -> bool:
+        with self._instrumentation.timed("storage_seconds", op="file_exists"):
+            return self._storage.file_exists(filepath)
+
+    def open_file(self, filepath: str, mode: str = "rb") -> BinaryIO:
+        f = self._storage.open_file(filepath, mode)
+        if not self._instrumentation.enabled:
+            return f
+        return _InstrumentedFile(f, self._instrumentation)  # type: ignore[return-value]
+
+    def make_dirs(self, dirpath: str) -> None:
+        with self._instrumentation.timed("storage_seconds", op="make_dirs"):
+            self._storage.make_dirs(dirpath)
+
+    def write_file_contents(self, filepath: str, content: str) -> None:
+        with self._instrumentation.timed("storage_seconds", op="write_file_contents"):
+            self._storage.write_file_contents(filepath, content)
+        self._instrumentation.count("storage_bytes_total", len(content), op="write")
+
+    def get_directory_listing(self, dirpath: str) -> list[str]:
+        with self._instrumentation.timed("storage_seconds", op="get_directory_listing"):
+            return self._storage.get_directory_listing(dirpath)
+
+    def delete(self, filepath: str) -> None:
+        with self._instrumentation.timed("storage_seconds", op="delete"):
+            self._storage.delete(filepath)
+
+    def move(self, source: str, destination: str) -> None:
+        with self._instrumentation.timed("storage_seconds", op="move"):
+            self._storage.move(source, destination)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._storage, name)
+
+
+class _InstrumentedFile:
+    """A file object that counts the bytes read and written through it, and times how long it is open."""
+
+    def __init__(self, f: BinaryIO, instrumentation: Instrumentation) -> None:
+        self._f = f
+        self._instrumentation = instrumentation
+        self._opened = time.perf_counter()
+        self._closed = False
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._instrumentation.count("storage_bytes_total", len(data), op="read")
+        return data
+
+    def write(self, data: bytes) -> int:
+        written = self._f.write(data)
+        self._instrumentation.count("storage_bytes_total", written, op="write")
+        return written
+
+    def close(self) -> None:
+        self._f.close()
+        if not self._closed:
+            self._closed = True
+            self._instrumentation.observe(
+                "storage_seconds", time.perf_counter() - self._opened, op="open_file"
+            )
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._f, name)
@@ -0,0 +1,78 @@
+import datetime
+from typing import TYPE_CHECKING, Optional
+
+from attrs import field, frozen
+
+if TYPE_CHECKING:
+    import cattrs
+
+
+@frozen
+class ConsumptionRecord:
+    interval_start: datetime.datetime
+    interval_end: datetime.datetime
+    consumption: float
+
+
+@frozen
+class Agreement:
+    tariff_code: str
+    valid_from: datetime.datetime
+    valid_to: Optional[datetime.datetime]
+
+
+@frozen
+class ElectricityMeterRegister:
+    identifier: str
+    rate: str
+    is_settlement_register: bool
+
+
+@frozen
+class ElectricityMeter:
+    serial_number: str
+    registers: list[ElectricityMeterRegister] = field(factory=list)
+
+
+@frozen
+class ElectricityMeterPoint:
+    mpan: str
+    profile_class: int
+    consumption_standard: int
+    meters: list[ElectricityMeter] = field(factory=list)
+    agreements: list[Agreement] = field(factory=list)
+
+
+@frozen
+class Property:
+    id_: str = field(alias="id")
+    moved_in_at: datetime.datetime
+    moved_out_at: Optional[datetime.datetime]
+    address_line_1: str
+    address_line_2: str
+    address_line_3: str
+    town: str
+    county: str
+    postcode: str
+    electricity_meter_points: list[ElectricityMeterPoint] = field(factory=list)
+
+
+@frozen
+class Account:
+    number: str
+    properties: list[Property] = field(factory=list)
+
+
+def create_converter() -> "cattrs.Converter":
+    """Creates a converter that structures API responses into the record classes above."""
+    # cattrs is only imported here, so that importing the models (e.g. for a CLI) doesn't pay for it
+    import cattrs
+    from cattrs.gen import make_dict_structure_fn
+
+    converter = cattrs.Converter()
+    converter.register_structure_hook(
+        datetime.datetime, lambda ts, _: datetime.datetime.fromisoformat(ts)
+    )
+    hook = make_dict_structure_fn(Property, converter, _cattrs_use_alias=True)
+    converter.register_structure_hook(Property, hook)
+    return converter
@@ -1,25 +1,64 @@
 import datetime
 import os
+import time
 from collections.abc import Generator
-from typing import Any, Optional, Self, overload
+from functools import cached_property, partial
+from typing import TYPE_CHECKING, Any, Literal, Optional, Self, overload
+from urllib.parse import parse_qs, urlsplit
 
-import cattrs
+import pandas as pd
 import pendulum
 import requests
-from attrs import define, field, frozen, validators
-from cattrs.gen import make_dict_structure_fn
+from attrs import define, field, validators
 from furl import furl  # type: ignore[reportMissingTypeStubs]
 from requests.auth import HTTPBasicAuth
 
+from octopus_stats.account_topology import AccountTopology, TopologyCache
+from octopus_stats.concurrency import ordered_map
+from octopus_stats.consumption_frame import build_consumption_frame
+from octopus_stats.http_session import create_session
+from octopus_stats.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+    record_http_response,
+)
+from octopus_stats.octo_api_models import (  # Record classes re-exported for callers
+    Account,
+    Agreement,  # noqa: F401
+    ConsumptionRecord,
+    ElectricityMeter,  # noqa: F401
+    ElectricityMeterPoint,  # noqa: F401
+    ElectricityMeterRegister,  # noqa: F401
+    Property,  # noqa: F401
+    create_converter,
+)
+from octopus_stats.request_scheduler import RequestScheduler
+from octopus_stats.response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    import cattrs
+
 _BASE_URL = "https://api.octopus.energy/v1/"
+_INTERVAL_LENGTH = datetime.timedelta(minutes=30)
+_DEFAULT_SHARD_WINDOW = datetime.timedelta(days=28)
+
+RateType = Literal["standard-unit-rates", "standing-charges"]
 
 
 @define(kw_only=True, frozen=True)
 class OctoAPIConfig:
     api_key: str = field(validator=[validators.min_len(2)])
-    mpan: Optional[str] = field(validator=[validators.min_len(2)])
-    serial_number: Optional[str] = field(validator=[validators.min_len(2)])
-    account_number: Optional[str] = field(validator=[validators.min_len(2)])
+    mpan: Optional[str] = field(
+        default=None, validator=validators.optional(validators.min_len(2))
+    )
+    serial_number: Optional[str] = field(
+        default=None, validator=validators.optional(validators.min_len(2))
+    )
+    account_number: Optional[str] = field(
+        default=None, validator=validators.optional(validators.min_len(2))
+    )
+    base_url: str = _BASE_URL
+    """Root URL of the API, ending with a slash; override it to use a stand-in server"""
 
     @classmethod
     def from_env(cls, prefix: str = "OCTOPUS_") -> Self:
@@ -47,71 +86,42 @@ def from_env(cls, prefix: str = "OCTOPUS_") -> Self:
         return cls(api_key=api_key, mpan=mpan, serial_number=serial_number, account_number=account_number)
 
 
-@frozen
-class ConsumptionRecord:
-    interval_start: datetime.datetime
-    interval_end: datetime.datetime
-    consumption: float
-
-
-@frozen
-class Agreement:
-    tariff_code: str
-    valid_from: datetime.datetime
-    valid_to: Optional[datetime.datetime]
-
-
-@frozen
-class ElectricityMeterRegister:
-    identifier: str
-    rate: str
-    is_settlement_register: bool
-
-
-@frozen
-class ElectricityMeter:
-    serial_number: str
-    registers: list[ElectricityMeterRegister] = field(factory=list)
-
-
-@frozen
-class ElectricityMeterPoint:
-    mpan: str
-    profile_class: int
-    consumption_standard: int
-    meters: list[ElectricityMeter] = field(factory=list)
-    agreements: list[Agreement] = field(factory=list)
-
-
-@frozen
-class Property:
-    id_: str = field(alias="id")
-    moved_in_at: datetime.datetime
-    moved_out_at: Optional[datetime.datetime]
-    address_line_1: str
-    address_line_2: str
-    address_line_3: str
-    town: str
-    county: str
-    postcode: str
-    electricity_meter_points: list[ElectricityMeterPoint] = field(factory=list)
-
-
-@frozen
-class Account:
-    number: str
-    properties: list[Property] = field(factory=list)
-
-
 class OctoAPIReader:
-    def __init__(self, config: OctoAPIConfig) -> None:
+    def __init__(  # noqa: PLR0913
+        self,
+        config: OctoAPIConfig,
+        *,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        topology_cache: Optional[TopologyCache] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ) -> None:
+        """
+        Creates a reader. Pass a `session` (see `http_session.create_session`) to share a connection pool with other
+        readers; otherwise the reader creates its own. If a `cache` is given, responses are cached there, and
+        consumption pages for periods that are long past are never fetched again. Pass a `scheduler` to share rate
+        limits and throttling state with other readers of the same API; otherwise the reader creates its own. Account
+        topologies (see `get_account_topology`) are kept in `topology_cache`, or in a private in-memory cache. Requests,
+        pages, records and cache lookups are reported to `instrumentation`, if given.
+        """
         self._config = config
-        self._converter = cattrs.Converter()
-        self._converter.register_structure_hook(
-            datetime.datetime, lambda ts, _: datetime.datetime.fromisoformat(ts)
+        self._cache = cache
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._topology_cache = (
+            topology_cache if topology_cache is not None else TopologyCache()
+        )
+        self._owns_session = session is None
+        self._session = session if session is not None else create_session()
+        self._auth = HTTPBasicAuth(config.api_key, "")
+        self._instrumentation = (
+            instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
         )
-        hook = make_dict_structure_fn(Property, self._converter, _cattrs_use_alias=True)
-        self._converter.register_structure_hook(Property, hook)
+
+    @cached_property
+    def _converter(self) -> "cattrs.Converter":
+        """The converter for structuring records, created on first use: many uses of the reader never need it."""
+        return create_converter()
 
     @overload
     def get_consumption(
@@ -155,6 +165,169 @@ def get_consumption(  # noqa: PLR0913
         serial_number: Optional[str] = None,
         account_number: Optional[str] = None,
     ) -> Generator[ConsumptionRecord, Any, None]:
+        (mpan, serial_number) = self._resolve_meter(mpan, serial_number, account_number)
+        if start is None:
+            start = pendulum.DateTime.min
+        if end is None:
+            end = pendulum.DateTime.now()
+
+        for page in self._get_consumption_pages(mpan, serial_number, start, end):
+            with self._instrumentation.timed("structure_seconds", api="octopus"):
+                records = [
+                    self._converter.structure(r, ConsumptionRecord) for r in page
+                ]
+            yield from records
+
+    def get_consumption_frame(  # noqa: PLR0913
+        self,
+        *,
+        start: Optional[pendulum.DateTime] = None,
+        end: Optional[pendulum.DateTime] = None,
+        mpan: Optional[str] = None,
+        serial_number: Optional[str] = None,
+        account_number: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Gets the same records as `get_consumption`, as a DataFrame (see `build_consumption_frame` for the columns). The
+        raw API results are converted column by column, without creating a `ConsumptionRecord` per interval.
+        """
+        pages = self.get_consumption_pages(
+            start=start,
+            end=end,
+            mpan=mpan,
+            serial_number=serial_number,
+            account_number=account_number,
+        )
+        return build_consumption_frame(pages)
+
+    def get_consumption_pages(  # noqa: PLR0913
+        self,
+        *,
+        start: Optional[pendulum.DateTime] = None,
+        end: Optional[pendulum.DateTime] = None,
+        mpan: Optional[str] = None,
+        serial_number: Optional[str] = None,
+        account_number: Optional[str] = None,
+    ) -> Generator[list[dict[str, Any]], Any, None]:
+        """
+        Gets the same records as `get_consumption`, as the raw `results` of each API page, e.g. to pass in batches to
+        `build_consumption_frame`.
+        """
+        (mpan, serial_number) = self._resolve_meter(mpan, serial_number, account_number)
+        if start is None:
+            start = pendulum.DateTime.min
+        if end is None:
+            end = pendulum.DateTime.now()
+
+        yield from self._get_consumption_pages(mpan, serial_number, start, end)
+
+    def get_consumption_sharded(  # noqa: PLR0913
+        self,
+        *,
+        start: pendulum.DateTime,
+        end: Optional[pendulum.DateTime] = None,
+        mpan: Optional[str] = None,
+        serial_number: Optional[str] = None,
+        account_number: Optional[str] = None,
+        window: datetime.timedelta = _DEFAULT_SHARD_WINDOW,
+        workers: int = 4,
+        max_buffered_windows: Optional[int] = None,
+    ) -> Generator[ConsumptionRecord, Any, None]:
+        """
+        Gets the same records as `get_consumption`, but splits [`start`, `end`) into consecutive windows of length
+        `window` and pages through up to `workers` of them concurrently. Records are yielded in order.
+
+        Each record is assigned to exactly one window by its `interval_start`, so nothing is duplicated or lost at the
+        window edges. `window` must be a whole number of half-hours, and `start` should fall on a half-hour boundary so
+        that no interval straddles two windows. `max_buffered_windows` caps how many windows can be in flight or
+        waiting to be yielded at once (by default, twice the number of workers).
+        """
+        if window <= datetime.timedelta(0) or window % _INTERVAL_LENGTH:
+            raise ValueError("window must be a positive whole number of half-hours")
+        (mpan, serial_number) = self._resolve_meter(mpan, serial_number, account_number)
+        if end is None:
+            end = pendulum.DateTime.now()
+
+        def get_window(
+            bounds: tuple[pendulum.DateTime, pendulum.DateTime]
+        ) -> list[ConsumptionRecord]:
+            (window_start, window_end) = bounds
+            records: list[ConsumptionRecord] = []
+            pages = self._get_consumption_pages(
+                mpan, serial_number, window_start, window_end
+            )
+            for page in pages:
+                for r in page:
+                    record = self._converter.structure(r, ConsumptionRecord)
+                    if window_start <= record.interval_start < window_end:
+                        records.append(record)
+            return records
+
+        windows = ordered_map(
+            get_window,
+            _split_period(start, end, window),
+            workers=workers,
+            max_buffered=max_buffered_windows,
+        )
+        for records in windows:
+            yield from records
+
+    def get_account(self, account_number: str):
+        endpoint = f"accounts/{account_number}"
+        response = self._call_api(endpoint, {})
+        return self._converter.structure(response, Account)
+
+    def get_account_topology(
+        self, account_number: str, *, refresh: bool = False
+    ) -> AccountTopology:
+        """
+        Gets the electricity meter points of the account, with their meters and agreements. The topology is cached, so
+        that it is fetched at most once per TTL; pass `refresh` to fetch it regardless.
+        """
+        if not refresh:
+            topology = self._topology_cache.get(account_number)
+            if topology is not None:
+                return topology
+        body = self._call_api(f"accounts/{account_number}", {})
+        topology = AccountTopology.from_api(body, datetime.datetime.now(datetime.UTC))
+        self._topology_cache.put(topology)
+        return topology
+
+    def get_tariff_rate_pages(
+        self,
+        tariff_code: str,
+        rate_type: RateType,
+        *,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+    ) -> Generator[list[dict[str, Any]], Any, None]:
+        """
+        Gets the rates of an electricity tariff that apply in [`start`, `end`), as the raw `results` of each API page:
+        the unit rates (p/kWh) or the standing charges (p/day), each with its `valid_from`, `valid_to` (`None` if
+        open-ended) and `payment_method`.
+        """
+        endpoint = (
+            f"products/{_product_code(tariff_code)}/electricity-tariffs/{tariff_code}/"
+            f"{rate_type}/"
+        )
+        params = {
+            "period_from": _to_octo8601(start),
+            "period_to": _to_octo8601(end),
+            "page_size": "1500",
+        }
+        for response in self._get_pages(endpoint, params):
+            yield response["results"]
+
+    def invalidate_topology(self, account_number: Optional[str] = None) -> None:
+        """Forgets the cached topology of the account, or of all accounts if `account_number` is `None`."""
+        self._topology_cache.invalidate(account_number)
+
+    def _resolve_meter(
+        self,
+        mpan: Optional[str],
+        serial_number: Optional[str],
+        account_number: Optional[str],
+    ) -> tuple[str, str]:
         if account_number and not (mpan and serial_number):
             (mpan, serial_number) = self._get_default_meter(
                 account_number=account_number
@@ -162,14 +335,19 @@ def get_consumption(  # noqa: PLR0913
 
         if not (mpan and serial_number):
             raise RuntimeError("mpan and serial_number are required")
+        return (mpan, serial_number)
 
+    def _get_consumption_pages(
+        self,
+        mpan: str,
+        serial_number: str,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+    ) -> Generator[list[dict[str, Any]], Any, None]:
+        """Follows the `next` links for a consumption query, yielding the raw `results` of each page."""
         endpoint = (
             f"electricity-meter-points/{mpan}/meters/{serial_number}/consumption/"
         )
-        if start is None:
-            start = pendulum.DateTime.min
-        if end is None:
-            end = pendulum.DateTime.now()
         params = {
             "period_from": _to_octo8601(start),
             "period_to": _to_octo8601(end),
@@ -177,35 +355,94 @@ def get_consumption(  # noqa: PLR0913
             "page_size": "200",
         }
 
-        response = self._call_api(endpoint, params)
+        for response in self._get_pages(endpoint, params):
+            self._count_page(response["results"])
+            yield response["results"]
 
-        for r in response["results"]:
-            yield self._converter.structure(r, ConsumptionRecord)
+    def _get_pages(
+        self, endpoint: str, params: dict[str, str]
+    ) -> Generator[dict[str, Any], Any, None]:
+        """Follows the `next` links for a query of a paged endpoint, yielding each response."""
+        response = self._call_api(endpoint, params)
+        yield response
         while response["next"]:
             response = self._call_api_raw(response["next"])
-            for r in response["results"]:
-                yield self._converter.structure(r, ConsumptionRecord)
+            yield response
 
-    def get_account(self, account_number: str):
-        endpoint = f"accounts/{account_number}"
-        response = self._call_api(endpoint, {})
-        return self._converter.structure(response, Account)
+    def _count_page(self, results: list[dict[str, Any]]) -> None:
+        self._instrumentation.count("pages_total", api="octopus")
+        self._instrumentation.count("records_total", len(results), api="octopus")
 
     def _get_default_meter(self, account_number: str) -> tuple[str, str]:
-        account = self.get_account(account_number)
-        meter_point = account.properties[-1].electricity_meter_points[-1]
-        return (meter_point.mpan, meter_point.meters[-1].serial_number)
+        return self.get_account_topology(account_number).default_meter
 
     def _call_api(self, endpoint: str, params: dict[str, str]) -> Any:
-        f = furl(_BASE_URL)
+        f = furl(self._config.base_url)
         f /= endpoint
         f.add(args=params)
         return self._call_api_raw(f.url)
 
+    def close(self) -> None:
+        """Closes the reader's HTTP session, unless it was supplied by the caller."""
+        if self._owns_session:
+            self._session.close()
+
     def _call_api_raw(self, url: str):
-        r = requests.get(url, auth=HTTPBasicAuth(self._config.api_key, ""), timeout=30)
+        if self._cache is not None:
+            fetched = False
+
+            def fetch() -> Any:
+                nonlocal fetched
+                fetched = True
+                return self._fetch(url)
+
+            body = self._cache.get_or_fetch(url, fetch, _get_period_end(url))
+            self._instrumentation.count(
+                "cache_lookups_total",
+                api="octopus",
+                result="miss" if fetched else "hit",
+            )
+            return body
+        return self._fetch(url)
+
+    def _fetch(self, url: str) -> Any:
+        started = time.perf_counter()
+        r = self._scheduler.send(
+            url, partial(self._session.get, url, auth=self._auth, timeout=30)
+        )
+        record_http_response(
+            self._instrumentation, "octopus", r, time.perf_counter() - started
+        )
         r.raise_for_status()
-        return r.json()
+        with self._instrumentation.timed("json_decode_seconds", api="octopus"):
+            return r.json()
+
+
+def _get_period_end(url: str) -> Optional[datetime.datetime]:
+    """Returns the end of the period of data requested by `url` (from its `period_to` parameter), if there is one."""
+    period_to = parse_qs(urlsplit(url).query).get("period_to")
+    if not period_to:
+        return None
+    return datetime.datetime.fromisoformat(period_to[0])
+
+
+def _product_code(tariff_code: str) -> str:
+    """The product of a tariff, e.g. `AGILE-FLEX-22-11-25` for `E-1R-AGILE-FLEX-22-11-25-C`."""
+    product = tariff_code.split("-")[2:-1]
+    if not product:
+        raise ValueError(f"Unrecognized tariff code: {tariff_code}")
+    return "-".join(product)
+
+
+def _split_period(
+    start: pendulum.DateTime, end: pendulum.DateTime, window: datetime.timedelta
+) -> Generator[tuple[pendulum.DateTime, pendulum.DateTime], Any, None]:
+    """Splits [`start`, `end`) into consecutive half-open windows of length `window` (the last may be shorter)."""
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + window, end)
+        yield (window_start, window_end)
+        window_start = window_end
 
 
 def _to_octo8601(dt: pendulum.DateTime) -> str:
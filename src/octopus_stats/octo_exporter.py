@@ -1,85 +1,307 @@
-from abc import ABC, abstractmethod
-from datetime import UTC, date, datetime, tzinfo
-from typing import Optional, Union
+import time
+from datetime import UTC, date, datetime, timedelta, tzinfo
+from typing import Optional
 
-import pytz
-from attrs import define
-from dateutil.relativedelta import relativedelta
+import fastparquet
+import pandas as pd
+import pendulum
+from attrs import define, evolve, field
 
-from octopus_stats.octo_api_reader import OctoAPIConfig
+from octopus_stats.compaction import CompactionSettings, Compactor
+from octopus_stats.consumption_frame import build_consumption_frame
+from octopus_stats.consumption_query import ConsumptionQuery, ConsumptionStore
+from octopus_stats.export_manifest import MANIFEST_PATH, ExportManifest
+from octopus_stats.instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from octopus_stats.parquet_writer import ParquetWriterSettings, PartitionedParquetWriter
+from octopus_stats.pipeline import StageStats, run_pipeline
+from octopus_stats.rollups import RollupSettings, RollupStore
+from octopus_stats.storage_manager import StorageManager
 
-_dt_min_utc = datetime.min
-_dt_min_utc = _dt_min_utc.replace(tzinfo=pytz.UTC)
-
-class StorageManager(ABC):
-    @abstractmethod
-    def read_file_contents(self, filepath: str) -> str:
-        raise NotImplementedError("Function read_file must be implemented")
-
-    @abstractmethod
-    def get_directory_listing(self, dirpath: str) -> list[str]:
-        raise NotImplementedError("Function get_directory_listing must be implemented")
+_METADATA_FILES = ("_metadata", "_common_metadata")
+_DATE_PREFIX = "date_local="
+_PERIOD_PREFIX = "period_local="
+_STAGING_SUFFIX = ".staging"
 
 
 @define(kw_only=True, frozen=True)
 class OctoExporterSettings:
     storage: StorageManager
     tz: tzinfo
+    writer: ParquetWriterSettings = field(factory=ParquetWriterSettings)
+    queue_size: int = 4
+    """Maximum number of pages or frames waiting between each pair of export stages"""
+    instrumentation: Instrumentation = NULL_INSTRUMENTATION
+    """Receives the export's measurements, and those of the reader if the exporter creates it"""
+    rollups: bool = True
+    """Whether to keep hourly, daily and monthly rollups of the consumption (by local time) up to date"""
 
 
 class OctoExporter:
-    def __init__(self, config: OctoAPIConfig, settings: OctoExporterSettings) -> None:
+    def __init__(
+        self,
+        config: OctoAPIConfig,
+        settings: OctoExporterSettings,
+        reader: Optional[OctoAPIReader] = None,
+    ) -> None:
         self._config = config
         self._settings = settings
         self._storage = settings.storage
+        self._reader = reader
+        self._owns_reader = reader is None
+        self._rollups = (
+            RollupStore(
+                settings.storage,
+                RollupSettings(
+                    time_column="start_local", value_columns=["total_consumed_kwh"]
+                ),
+            )
+            if settings.rollups
+            else None
+        )
+
+    @property
+    def rollups(self) -> Optional[RollupStore]:
+        return self._rollups
+
+    def export(self, full: bool = False) -> list[StageStats]:
+        """
+        Exports consumption data to the store, and returns the statistics for each stage of the export. A full export
+        replaces the exported dataset, starting from the beginning of the account's agreements (if known); it is
+        written to a staging dataset alongside, which is only swapped in once the whole export has succeeded. Otherwise
+        the export starts from where the previous one finished.
+        """
+        try:
+            if full:
+                return self._read_consumption(
+                    self._get_account_start_date(), staging=True
+                )
+            return self._read_consumption(self._get_next_start_date())
+        finally:
+            if self._owns_reader and self._reader is not None:
+                self._reader.close()
+                self._reader = None
 
-    def export(self, full: bool = False) -> None:
-        if full:
-            start_date = None
+    def _read_consumption(
+        self, start_date: Optional[datetime], staging: bool = False
+    ) -> list[StageStats]:
+        """
+        Runs the export as a pipeline of three stages on separate threads, joined by bounded queues: fetch pages from
+        the API, transform each page into a frame, and write the frames to the store. Memory use is therefore bounded by
+        the queue sizes and the writer's buffer, however long the period being exported. If `staging`, the frames are
+        written to the staging dataset, and the manifest and rollups are only updated once it is swapped in.
+        """
+        started = time.perf_counter()
+        instrumentation = self._settings.instrumentation
+        reader = self._get_reader()
+        pages = reader.get_consumption_pages(
+            start=pendulum.instance(start_date) if start_date else None,
+            mpan=self._config.mpan,
+            serial_number=self._config.serial_number,
+            account_number=self._config.account_number,
+        )
+        writer = self._create_writer(staging)
+        pending_days: set[date] = set()
+        pending_latest: list[datetime] = []
+
+        def record_pending() -> None:
+            if pending_days and not staging:
+                if self._rollups is not None:
+                    self._rollups.mark_dirty(pending_days)
+                partitions = sorted(f"date_local={d:%Y-%m-%d}" for d in pending_days)
+                self._record_partitions(partitions, max(pending_latest))
+                pending_days.clear()
+                pending_latest.clear()
+
+        def write(df: pd.DataFrame) -> None:
+            if df.empty:
+                return
+            writer.write(df)
+            instrumentation.count("export_records_total", len(df), exporter="octopus")
+            pending_days.update(d.date() for d in df["date_local"].unique())
+            pending_latest.append(df["end_utc"].max().to_pydatetime())
+            # The manifest only advances once the data has actually been flushed to the store
+            if writer.buffered_rows == 0:
+                record_pending()
+
+        stats = run_pipeline(
+            ("fetch", pages),
+            [
+                ("transform", lambda page: build_consumption_frame([page])),
+                ("write", write),
+            ],
+            queue_size=self._settings.queue_size,
+        )
+        writer.flush()
+        if staging:
+            self._swap_in_staging()
         else:
-            start_date = self._get_next_start_date()
+            record_pending()
+        if self._rollups is not None:
+            with instrumentation.timed("rollup_seconds", exporter="octopus"):
+                self._rollups.refresh(self._load_days)
+        for stage in stats:
+            _record_stage(instrumentation, stage)
+        instrumentation.observe(
+            "export_seconds", time.perf_counter() - started, exporter="octopus"
+        )
+        return stats
 
-        self._read_consumption(start_date)
+    def _create_writer(self, staging: bool) -> PartitionedParquetWriter:
+        settings = self._settings.writer
+        if staging:
+            settings = evolve(settings, dataset_path=self._staging_path())
+            # Any staging dataset left by a full export that failed is started afresh
+            self._delete_dataset(settings.dataset_path)
+        return PartitionedParquetWriter(self._storage, settings)
 
-    def _read_consumption(self, start_date: Optional[datetime]):
-        pass
+    def _load_days(self, days: list[date]) -> pd.DataFrame:
+        """Reads back the consumption of `days`, for the rollups."""
+        query = ConsumptionQuery(
+            # Local days are within a day of UTC days
+            start=datetime.combine(
+                min(days) - timedelta(days=1), datetime.min.time(), UTC
+            ),
+            end=datetime.combine(
+                max(days) + timedelta(days=2), datetime.min.time(), UTC
+            ),
+            columns=["start_local", "total_consumed_kwh"],
+        )
+        return ConsumptionStore(self._storage, self._compaction_layout()).read(query)
 
-    def _get_account_start_date(self):
-        pass
+    def _compaction_layout(self) -> CompactionSettings:
+        return CompactionSettings(dataset_path=self._settings.writer.dataset_path)
 
-    def _get_next_start_date(self) -> datetime | None:
-        now = datetime.now(UTC)
-        check = now.date()
-        found_date: datetime | None = None
-
-        # Dataframes are saved into partitioned directories named after the local time (HH-MM) of the latest consumption
-        # record in the file. The file path will therefore be in the format YYYY/mm/dd/HH-MM e.g. 2023/12/01/22-30
-        while not found_date and check > now.date() - relativedelta(years=1):
-            latest_date = self._get_latest_processed_datetime(check)
-            if latest_date:
-                found_date = latest_date
-                continue
-            check = check - relativedelta(days=1)
-
-        return found_date
-
-    def _get_latest_processed_datetime(self, date: date) -> Union[datetime, None]:
+    def _get_account_start_date(self) -> Optional[datetime]:
+        """Gets the start of the earliest agreement for the configured meter point, if there is an account number."""
+        if not self._config.account_number:
+            return None
+        topology = self._get_reader().get_account_topology(self._config.account_number)
+        valid_from = [
+            agreement.valid_from
+            for meter_point in topology.meter_points
+            if self._config.mpan in (None, meter_point.mpan)
+            for agreement in meter_point.agreements
+        ]
+        return min(valid_from, default=None)
+
+    def _get_reader(self) -> OctoAPIReader:
+        if self._reader is None:
+            self._reader = OctoAPIReader(
+                self._config, instrumentation=self._settings.instrumentation
+            )
+        return self._reader
+
+    def rebuild_manifest(self) -> ExportManifest:
+        """
+        Rebuilds the manifest from the store, e.g. if it is missing or the store has been modified by hand, and saves
+        it. The partitions are the days in the exported dataset's metadata and any periods compacted from it, and the
+        watermark is the end of the dataset's latest interval.
+        """
+        manifest = ExportManifest()
+        layout = self._compaction_layout()
+        periods = Compactor(self._storage, layout).load_state().periods
+        manifest.partitions = [f"{_PERIOD_PREFIX}{key}" for key in periods]
+        dataset = self._open_dataset()
+        days = sorted(_dataset_days(dataset))
+        if days:
+            manifest.partitions.extend(f"{_DATE_PREFIX}{d:%Y-%m-%d}" for d in days)
+            # The latest interval is in the latest day, so only that day's intervals are read
+            query = ConsumptionQuery(
+                start=datetime.combine(days[-1], datetime.min.time(), UTC)
+                - timedelta(days=1),
+                columns=["end_utc"],
+            )
+            ends = ConsumptionStore(self._storage, layout).read(query)["end_utc"]
+            manifest.watermark = ends.max().to_pydatetime()
+
+        manifest.partitions.sort()
+        self._save_manifest(manifest)
+        return manifest
+
+    def _swap_in_staging(self) -> None:
         """
-        Gets the latest-processed record datetime, based on the files present in the folder for a specified date. If no
-        matching files are present, returns `None`.
+        Replaces the exported dataset with the staging dataset written by a full export, and rebuilds the manifest
+        from it. Files compacted from the dataset are kept: the full export's data supersedes theirs when the store is
+        read, and when the periods are next compacted. The days of both datasets are marked dirty in the rollups, so
+        that the days no longer exported drop out of them.
         """
-        date_dir = date.strftime("%Y/%m/%d")
-        files = self._storage.get_directory_listing(date_dir)
-        if not files:
+        dataset_path = self._settings.writer.dataset_path
+        staging_path = self._staging_path()
+        replaced = self._open_dataset(dataset_path)
+        staged = self._open_dataset(staging_path)
+        days = _dataset_days(replaced) | _dataset_days(staged)
+        self._delete_dataset(dataset_path)
+        if staged is not None:
+            # The metadata goes last, so that it never refers to a missing file
+            names = [*_dataset_files(staged), *_METADATA_FILES]
+            for name in names:
+                if self._storage.file_exists(f"{staging_path}/{name}"):
+                    self._storage.move(
+                        f"{staging_path}/{name}", f"{dataset_path}/{name}"
+                    )
+        self.rebuild_manifest()
+        if self._rollups is not None and days:
+            self._rollups.mark_dirty(days)
+
+    def _delete_dataset(self, dataset_path: str) -> None:
+        dataset = self._open_dataset(dataset_path)
+        if dataset is None:
+            return
+        # The metadata goes first, so that it never refers to a missing file
+        for name in [*_METADATA_FILES, *_dataset_files(dataset)]:
+            self._storage.delete(f"{dataset_path}/{name}")
+
+    def _staging_path(self) -> str:
+        return f"{self._settings.writer.dataset_path}{_STAGING_SUFFIX}"
+
+    def _open_dataset(
+        self, dataset_path: Optional[str] = None
+    ) -> Optional[fastparquet.ParquetFile]:
+        dataset_path = dataset_path or self._settings.writer.dataset_path
+        if not self._storage.file_exists(f"{dataset_path}/{_METADATA_FILES[0]}"):
             return None
+        return fastparquet.ParquetFile(dataset_path, open_with=self._storage.open_file)
 
-        def date_from_filename(filename: str) -> datetime | None:
-            try:
-                return datetime.strptime(filename, "%Y/%m/%d/%H-%M").replace(tzinfo=self._settings.tz)
-            except ValueError:
-                return _dt_min_utc
+    def _record_partitions(self, partitions: list[str], latest: datetime) -> None:
+        """Records newly-written partitions, and the latest record datetime in them, in a single manifest update."""
+        manifest = self._load_manifest() or ExportManifest()
+        manifest.partitions = sorted(set(manifest.partitions).union(partitions))
+        if manifest.watermark is None or latest > manifest.watermark:
+            manifest.watermark = latest
+        self._save_manifest(manifest)
 
-        latest_date = max(
-            [d for f in files if (d := date_from_filename(f)) is not None]
-        )
-        return latest_date if latest_date > _dt_min_utc else None
+    def _load_manifest(self) -> ExportManifest | None:
+        try:
+            content = self._storage.read_file_contents(MANIFEST_PATH)
+        except FileNotFoundError:
+            return None
+        return ExportManifest.from_json(content)
+
+    def _save_manifest(self, manifest: ExportManifest) -> None:
+        self._storage.write_file_contents(MANIFEST_PATH, manifest.to_json())
+
+    def _get_next_start_date(self) -> datetime | None:
+        manifest = self._load_manifest()
+        if manifest is None:
+            manifest = self.rebuild_manifest()
+        return manifest.watermark
+
+
+def _dataset_files(dataset: fastparquet.ParquetFile) -> list[str]:
+    """The files of a dataset's row groups, relative to its directory."""
+    return sorted({rg.columns[0].file_path for rg in dataset.row_groups})
+
+
+def _dataset_days(dataset: Optional[fastparquet.ParquetFile]) -> set[date]:
+    if dataset is None or not dataset.row_groups:
+        return set()
+    return {pd.Timestamp(d).date() for d in dataset.cats["date_local"]}
+
+
+def _record_stage(instrumentation: Instrumentation, stage: StageStats) -> None:
+    labels = {"exporter": "octopus", "stage": stage.name}
+    instrumentation.count("stage_items_total", stage.items, **labels)
+    instrumentation.observe("stage_busy_seconds", stage.busy_seconds, **labels)
+    instrumentation.observe("stage_starved_seconds", stage.starved_seconds, **labels)
+    instrumentation.observe("stage_blocked_seconds", stage.blocked_seconds, **labels)
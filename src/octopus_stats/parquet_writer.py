@@ -0,0 +1,102 @@
+from types import TracebackType
+from typing import Optional, Self
+
+import fastparquet
+import pandas as pd
+from attrs import define, field, validators
+
+from octopus_stats.storage_manager import StorageManager
+
+_METADATA_FILE = "_metadata"
+
+
+@define(kw_only=True, frozen=True)
+class ParquetWriterSettings:
+    dataset_path: str = "consumption.parquet"
+    """Path of the (hive-partitioned) dataset directory, relative to the storage root"""
+    partition_on: list[str] = field(factory=lambda: ["date_local"])
+    compression: str = "SNAPPY"
+    """Codec for the column chunks, e.g. SNAPPY, ZSTD, GZIP or None"""
+    row_group_size: int = field(default=100_000, validator=[validators.ge(1)])
+    """Maximum number of rows per row group"""
+    flush_rows: int = field(default=500_000, validator=[validators.ge(1)])
+    """Number of buffered rows that triggers a flush"""
+
+
+@define
+class ParquetWriterStats:
+    flushes: int = 0
+    rows_written: int = 0
+    partitions_written: int = 0
+
+
+class PartitionedParquetWriter:
+    """
+    Writes DataFrames to a hive-partitioned parquet dataset through a `StorageManager`.
+
+    Frames passed to `write` are buffered in memory (across any number of partitions) until `flush_rows` rows have
+    accumulated, and are then written in a single append: each partition touched gets one new file per row group of at
+    most `row_group_size` rows, and the dataset metadata is rewritten once. Use the writer as a context manager, or call
+    `flush` when done, to write any remaining rows.
+    """
+
+    def __init__(
+        self, storage: StorageManager, settings: ParquetWriterSettings
+    ) -> None:
+        self._storage = storage
+        self._settings = settings
+        self._buffer: list[pd.DataFrame] = []
+        self._buffered_rows = 0
+        self._stats = ParquetWriterStats()
+
+    @property
+    def stats(self) -> ParquetWriterStats:
+        return self._stats
+
+    @property
+    def buffered_rows(self) -> int:
+        return self._buffered_rows
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        self._buffer.append(df)
+        self._buffered_rows += len(df)
+        if self._buffered_rows >= self._settings.flush_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        frame = pd.concat(self._buffer, ignore_index=True)
+        self._buffer = []
+        self._buffered_rows = 0
+
+        settings = self._settings
+        dataset_path = settings.dataset_path
+        fastparquet.write(
+            dataset_path,
+            frame,
+            row_group_offsets=settings.row_group_size,
+            compression=settings.compression,
+            file_scheme="hive",
+            partition_on=settings.partition_on,
+            append=self._storage.file_exists(f"{dataset_path}/{_METADATA_FILE}"),
+            open_with=self._storage.open_file,
+            mkdirs=self._storage.make_dirs,
+        )
+        self._stats.flushes += 1
+        self._stats.rows_written += len(frame)
+        self._stats.partitions_written += frame.groupby(settings.partition_on).ngroups
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.flush()
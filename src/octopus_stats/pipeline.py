@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any, Optional
+
+from attrs import define
+
+_END = object()
+_POLL_SECONDS = 0.1
+
+
+@define
+class StageStats:
+    name: str
+    items: int = 0
+    """Number of items produced (for the source) or processed (for other stages)"""
+    busy_seconds: float = 0.0
+    """Time spent doing the stage's own work"""
+    starved_seconds: float = 0.0
+    """Time spent waiting for input from the previous stage"""
+    blocked_seconds: float = 0.0
+    """Time spent waiting for the next stage to accept output, i.e. under backpressure"""
+    elapsed_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Items per second of elapsed time"""
+        return self.items / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class _CancelledError(Exception):
+    pass
+
+
+class _Stage:
+    def __init__(self, name: str, stop: threading.Event) -> None:
+        self.stats = StageStats(name=name)
+        self._stop = stop
+
+    def put(self, q: "queue.Queue[Any]", item: Any) -> None:
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _CancelledError
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self.stats.blocked_seconds += time.perf_counter() - start
+
+    def get(self, q: "queue.Queue[Any]") -> Any:
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _CancelledError
+            try:
+                item = q.get(timeout=_POLL_SECONDS)
+                break
+            except queue.Empty:
+                continue
+        self.stats.starved_seconds += time.perf_counter() - start
+        return item
+
+    def fail(self, error: BaseException, errors: list[BaseException]) -> None:
+        """Records the stage's error, and stops the whole pipeline."""
+        errors.append(error)
+        self._stop.set()
+
+
+def run_pipeline(
+    source: tuple[str, Iterable[Any]],
+    stages: Sequence[tuple[str, Callable[[Any], Any]]],
+    *,
+    queue_size: int = 4,
+) -> list[StageStats]:
+    """
+    Runs a linear pipeline, with each stage on its own thread, and returns the statistics for each stage.
+
+    `source` is a (name, iterable) pair whose items are fed to the first of `stages`; each stage is a (name, function)
+    pair whose function is called with each item from the previous stage. A function's return value is passed to the
+    next stage, unless it is `None`; the return values of the last stage are discarded. Adjacent stages are joined by
+    queues of at most `queue_size` items, so a slow stage holds back the stages before it rather than letting work pile
+    up in memory. If any stage raises, the whole pipeline is stopped and the exception is re-raised.
+    """
+    if not stages:
+        raise ValueError("At least one stage is required")
+    if queue_size < 1:
+        raise ValueError("queue_size must be at least 1")
+
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    queues: list[queue.Queue[Any]] = [queue.Queue(queue_size) for _ in stages]
+    (source_name, items) = source
+    source_stage = _Stage(source_name, stop)
+    workers = [_Stage(name, stop) for (name, _) in stages]
+
+    threads = [
+        threading.Thread(
+            target=_run_source,
+            args=(source_stage, items, queues[0], errors),
+            name=source_name,
+        )
+    ]
+    for i, (name, fn) in enumerate(stages):
+        output = queues[i + 1] if i + 1 < len(stages) else None
+        threads.append(
+            threading.Thread(
+                target=_run_stage,
+                args=(workers[i], fn, queues[i], output, errors),
+                name=name,
+            )
+        )
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return [source_stage.stats, *(w.stats for w in workers)]
+
+
+def _run_source(
+    stage: _Stage,
+    items: Iterable[Any],
+    output: "queue.Queue[Any]",
+    errors: list[BaseException],
+) -> None:
+    """Feeds the source's items to the first stage, followed by the end marker."""
+    stats = stage.stats
+    started = time.perf_counter()
+    it = iter(items)
+    try:
+        while True:
+            t0 = time.perf_counter()
+            item = next(it, _END)
+            stats.busy_seconds += time.perf_counter() - t0
+            if item is _END:
+                break
+            stats.items += 1
+            stage.put(output, item)
+        stage.put(output, _END)
+    except _CancelledError:
+        pass
+    except BaseException as e:  # noqa: BLE001
+        stage.fail(e, errors)
+    finally:
+        close = getattr(it, "close", None)
+        if close is not None:
+            close()
+        stats.elapsed_seconds = time.perf_counter() - started
+
+
+def _run_stage(
+    stage: _Stage,
+    fn: Callable[[Any], Any],
+    input_queue: "queue.Queue[Any]",
+    output: "Optional[queue.Queue[Any]]",
+    errors: list[BaseException],
+) -> None:
+    """Calls `fn` with each item from the previous stage, passing its results on to the next stage (if any)."""
+    started = time.perf_counter()
+    try:
+        while (item := stage.get(input_queue)) is not _END:
+            t0 = time.perf_counter()
+            result = fn(item)
+            stage.stats.busy_seconds += time.perf_counter() - t0
+            stage.stats.items += 1
+            if output is not None and result is not None:
+                stage.put(output, result)
+        if output is not None:
+            stage.put(output, _END)
+    except _CancelledError:
+        pass
+    except BaseException as e:  # noqa: BLE001
+        stage.fail(e, errors)
+    finally:
+        stage.stats.elapsed_seconds = time.perf_counter() - started
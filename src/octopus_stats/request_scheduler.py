@@ -0,0 +1,266 @@
+import asyncio
+import datetime
+import email.utils
+import math
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, Optional, Protocol, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from attrs import define, field, validators
+
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_THROTTLE_STATUSES = frozenset({429, 503})
+_POLL_SECONDS = 0.05
+
+
+class _Response(Protocol):
+    @property
+    def status_code(self) -> int:
+        ...
+
+    @property
+    def headers(self) -> Any:
+        ...
+
+
+ResponseT = TypeVar("ResponseT", bound=_Response)
+
+
+@define(kw_only=True, frozen=True)
+class RequestSchedulerSettings:
+    requests_per_second: float = field(default=10.0, validator=[validators.gt(0)])
+    """Sustained request rate allowed to each host"""
+    burst: int = field(default=10, validator=[validators.ge(1)])
+    """Number of requests that can be sent to a host at once after it has been idle"""
+    max_concurrency: int = field(default=8, validator=[validators.ge(1)])
+    """Maximum number of requests in flight to each host; throttling reduces the actual limit below this"""
+    max_retries: int = field(default=5, validator=[validators.ge(0)])
+    """Number of times a request is retried after a throttling or server error, or a connection failure"""
+    backoff_base: datetime.timedelta = datetime.timedelta(seconds=0.5)
+    """Upper bound of the (jittered) delay before the first retry; it doubles with each further retry"""
+    backoff_max: datetime.timedelta = datetime.timedelta(seconds=60)
+    """Cap on the upper bound of the retry delay, when the server does not say how long to wait"""
+
+
+@define
+class RequestSchedulerStats:
+    requests: int = 0
+    """Number of requests sent, including retries"""
+    retries: int = 0
+    throttled: int = 0
+    """Number of responses that asked the client to slow down (429 or 503)"""
+    failures: int = 0
+    """Number of requests that were given up on, after their retries were exhausted"""
+
+
+class _Host:
+    def __init__(self, settings: RequestSchedulerSettings, now: float) -> None:
+        self.tokens = float(settings.burst)
+        self.refilled_at = now
+        self.limit = settings.max_concurrency
+        self.in_flight = 0
+        self.blocked_until = now
+        self.successes = 0
+        self.decreased_at = -math.inf
+
+
+class RequestScheduler:
+    """
+    Paces, limits and retries the HTTP requests of any number of readers, per host.
+
+    Requests to each host are paced by a token bucket (`requests_per_second`, up to `burst` at once) and limited to a
+    number in flight that adapts to the server: it is halved whenever the server throttles a request (429 or 503), and
+    grows by one for each window of that many successful requests, up to `max_concurrency`. Throttling and server
+    errors, and connection failures, are retried up to `max_retries` times. If the server sends `Retry-After`, the
+    whole host is paused for that long; otherwise the retry waits a random time of up to `backoff_base` doubled for
+    each attempt, capped at `backoff_max`. Once the retries are exhausted, the last response is returned (or the last
+    error raised), so that callers handle it as they would without a scheduler.
+
+    A scheduler can be shared between threads, readers and event loops.
+    """
+
+    def __init__(
+        self,
+        settings: Optional[RequestSchedulerSettings] = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._settings = (
+            settings if settings is not None else RequestSchedulerSettings()
+        )
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._hosts: dict[str, _Host] = {}
+        self._stats = RequestSchedulerStats()
+
+    @property
+    def stats(self) -> RequestSchedulerStats:
+        with self._lock:
+            return RequestSchedulerStats(
+                requests=self._stats.requests,
+                retries=self._stats.retries,
+                throttled=self._stats.throttled,
+                failures=self._stats.failures,
+            )
+
+    def concurrency_limit(self, url: str) -> int:
+        """Returns the current limit on the number of requests in flight to the host of `url`."""
+        with self._lock:
+            return self._get_host(_host_key(url)).limit
+
+    def send(self, url: str, fn: Callable[[], ResponseT]) -> ResponseT:
+        """Calls `fn`, which sends a request to `url` and returns its response, scheduling and retrying it as needed."""
+        host = _host_key(url)
+        attempt = 0
+        while True:
+            while (wait := self._try_start(host)) is not None:
+                self._sleep(wait)
+            started = self._clock()
+            try:
+                response = fn()
+            except (requests.ConnectionError, requests.Timeout):
+                if (delay := self._complete(host, started, attempt, None)) is None:
+                    raise
+            except BaseException:
+                self._release(host)
+                raise
+            else:
+                if (delay := self._complete(host, started, attempt, response)) is None:
+                    return response
+            self._sleep(delay)
+            attempt += 1
+
+    async def send_async(
+        self, url: str, fn: Callable[[], Awaitable[ResponseT]]
+    ) -> ResponseT:
+        """The asyncio equivalent of `send`."""
+        # The async readers have imported httpx already; the synchronous ones needn't
+        import httpx
+
+        host = _host_key(url)
+        attempt = 0
+        while True:
+            while (wait := self._try_start(host)) is not None:
+                await asyncio.sleep(wait)
+            started = self._clock()
+            try:
+                response = await fn()
+            except httpx.TransportError:
+                if (delay := self._complete(host, started, attempt, None)) is None:
+                    raise
+            except BaseException:
+                self._release(host)
+                raise
+            else:
+                if (delay := self._complete(host, started, attempt, response)) is None:
+                    return response
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _try_start(self, key: str) -> Optional[float]:
+        """Starts a request to the host if it is allowed now; otherwise returns how long to wait before trying again."""
+        settings = self._settings
+        with self._lock:
+            now = self._clock()
+            host = self._get_host(key)
+            host.tokens = min(
+                float(settings.burst),
+                host.tokens + (now - host.refilled_at) * settings.requests_per_second,
+            )
+            host.refilled_at = now
+            if now < host.blocked_until:
+                return host.blocked_until - now
+            if host.in_flight >= host.limit:
+                return _POLL_SECONDS
+            if host.tokens < 1:
+                return (1 - host.tokens) / settings.requests_per_second
+            host.tokens -= 1
+            host.in_flight += 1
+            self._stats.requests += 1
+            return None
+
+    def _complete(
+        self,
+        key: str,
+        started: float,
+        attempt: int,
+        response: Optional[_Response],
+    ) -> Optional[float]:
+        """
+        Records the outcome of a request (`response` is `None` if it failed), and returns how long to wait before
+        retrying it, or `None` if it should not be retried.
+        """
+        settings = self._settings
+        with self._lock:
+            host = self._get_host(key)
+            host.in_flight -= 1
+            if response is not None and response.status_code not in _RETRY_STATUSES:
+                host.successes += 1
+                if host.successes >= host.limit:
+                    host.limit = min(host.limit + 1, settings.max_concurrency)
+                    host.successes = 0
+                return None
+
+            retry_after = None
+            if response is not None and response.status_code in _THROTTLE_STATUSES:
+                self._stats.throttled += 1
+                # Only react once to a burst of throttled requests, i.e. to those sent since the last decrease
+                if started > host.decreased_at:
+                    host.limit = max(1, host.limit // 2)
+                    host.successes = 0
+                    host.decreased_at = self._clock()
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+
+            if attempt >= settings.max_retries:
+                self._stats.failures += 1
+                return None
+            self._stats.retries += 1
+            if retry_after is not None:
+                host.blocked_until = max(
+                    host.blocked_until, self._clock() + retry_after
+                )
+                return retry_after
+            ceiling = min(
+                settings.backoff_max.total_seconds(),
+                settings.backoff_base.total_seconds() * 2**attempt,
+            )
+            return random.uniform(0, ceiling)  # noqa: S311
+
+    def _release(self, key: str) -> None:
+        """Records that a request ended without an outcome, e.g. because it was cancelled."""
+        with self._lock:
+            self._get_host(key).in_flight -= 1
+
+    def _get_host(self, key: str) -> _Host:
+        """Requires the lock."""
+        host = self._hosts.get(key)
+        if host is None:
+            host = self._hosts[key] = _Host(self._settings, self._clock())
+        return host
+
+
+def _host_key(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a `Retry-After` header, which is either a number of seconds or an HTTP date, into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.UTC)
+    return max(0.0, (when - datetime.datetime.now(datetime.UTC)).total_seconds())
@@ -0,0 +1,183 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+from collections.abc import Callable
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from attrs import define, field, validators
+
+
+@define(kw_only=True, frozen=True)
+class ResponseCacheSettings:
+    cache_dir: str
+    max_bytes: int = field(default=256 * 1024 * 1024, validator=[validators.ge(0)])
+    """Total size of cached responses above which the least recently used are evicted"""
+    recent_ttl: datetime.timedelta = datetime.timedelta(minutes=15)
+    """How long to keep responses for periods that are still open or may still change"""
+    settle_time: datetime.timedelta = datetime.timedelta(days=2)
+    """How long after the end of a period its data may still change; older periods are cached indefinitely"""
+
+
+@define
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """
+    A local, size-bounded cache of decoded JSON API responses, keyed by normalized URL.
+
+    Each response is stored in its own file, named after a hash of the URL. Responses for periods that ended more than
+    `settle_time` ago never expire; anything else expires after `recent_ttl`. When the cache grows beyond `max_bytes`,
+    the least recently used responses are evicted. The cache can be shared between threads and readers.
+    """
+
+    def __init__(self, settings: ResponseCacheSettings) -> None:
+        self._settings = settings
+        self._dir = Path(settings.cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = ResponseCacheStats()
+        self._size = sum(p.stat().st_size for p in self._entries())
+
+    @property
+    def stats(self) -> ResponseCacheStats:
+        with self._lock:
+            return ResponseCacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                stores=self._stats.stores,
+                evictions=self._stats.evictions,
+            )
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached responses, in bytes"""
+        return self._size
+
+    def get(self, url: str) -> Optional[Any]:
+        """Returns the cached response for `url`, or `None` if there is no unexpired response."""
+        path = self._path_for(normalize_url(url))
+        body = self._read(path)
+        with self._lock:
+            if body is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+        return body
+
+    def put(self, url: str, body: Any, period_end: Optional[datetime.datetime]) -> None:
+        """
+        Caches `body` as the response for `url`. `period_end` is the (tz-aware) end of the period of data that the
+        response covers, or `None` if it does not cover a closed period; it determines how long the entry is kept.
+        """
+        key = normalize_url(url)
+        entry = {"url": key, "expires_at": self._expiry(period_end), "body": body}
+        content = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        path = self._path_for(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content)
+        with self._lock:
+            previous_size = path.stat().st_size if path.exists() else 0
+            tmp_path.replace(path)
+            self._size += len(content) - previous_size
+            self._stats.stores += 1
+            if self._size > self._settings.max_bytes:
+                self._evict()
+
+    def get_or_fetch(
+        self,
+        url: str,
+        fetch: Callable[[], Any],
+        period_end: Optional[datetime.datetime],
+    ) -> Any:
+        """Returns the cached response for `url` if there is one; otherwise calls `fetch` and caches its result."""
+        body = self.get(url)
+        if body is None:
+            body = fetch()
+            self.put(url, body, period_end)
+        return body
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self._entries():
+                path.unlink(missing_ok=True)
+            self._size = 0
+
+    def _expiry(self, period_end: Optional[datetime.datetime]) -> Optional[float]:
+        now = datetime.datetime.now(datetime.UTC)
+        if period_end is not None and period_end + self._settings.settle_time <= now:
+            return None
+        return (now + self._settings.recent_ttl).timestamp()
+
+    def _read(self, path: Path) -> Optional[Any]:
+        try:
+            with path.open("rb") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        expires_at = entry["expires_at"]
+        if (
+            expires_at is not None
+            and expires_at <= datetime.datetime.now(datetime.UTC).timestamp()
+        ):
+            self._remove(path)
+            return None
+        # Record the access, so that eviction is least-recently-used rather than least-recently-stored. If the entry has
+        # been evicted (by another thread or process) since it was read, what was read is still valid
+        with suppress(FileNotFoundError):
+            os.utime(path)
+        return entry["body"]
+
+    def _remove(self, path: Path) -> None:
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            self._size -= size
+
+    def _evict(self) -> None:
+        """Removes the least recently used entries until the cache is within its size limit. Requires the lock."""
+        entries = [(p.stat(), p) for p in self._entries()]
+        entries.sort(key=lambda e: e[0].st_mtime_ns)
+        for stat, path in entries:
+            if self._size <= self._settings.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= stat.st_size
+            self._stats.evictions += 1
+
+    def _entries(self) -> list[Path]:
+        return list(self._dir.glob("*/*.json"))
+
+    def _path_for(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self._dir / digest[:2] / f"{digest}.json"
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL for use as a cache key: the scheme and host are lower-cased, the fragment is dropped and the query
+    parameters are sorted, so that equivalent requests share an entry.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, "")
+    )
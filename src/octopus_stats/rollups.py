@@ -0,0 +1,219 @@
+import datetime
+import json
+from collections.abc import Callable, Iterable
+from itertools import groupby
+from typing import Literal, Optional, Self
+
+import fastparquet
+import pandas as pd
+from attrs import define, field
+
+from octopus_stats.storage_manager import StorageManager
+
+Granularity = Literal["hour", "day", "month"]
+
+ROLLUP_STATE_FILE = "_rollups.json"
+
+
+@define(kw_only=True, frozen=True)
+class RollupSettings:
+    time_column: str
+    """Column bucketed into hours, days and months, e.g. local wall-clock times to aggregate by local day"""
+    value_columns: tuple[str, ...] = field(converter=tuple)
+    """Columns summed in each bucket"""
+    base_dir: str = "rollups"
+    """Directory of the rollups, in `hour/YYYY-MM.parquet`, `day/YYYY.parquet` and `month.parquet`"""
+    compression: str = "SNAPPY"
+
+
+@define(kw_only=True)
+class RollupState:
+    dirty: list[datetime.date] = field(factory=list)
+    """Days written since they were last aggregated, sorted"""
+
+    def to_json(self) -> str:
+        return json.dumps({"dirty": [d.isoformat() for d in self.dirty]}, indent=2)
+
+    @classmethod
+    def from_json(cls, content: str) -> Self:
+        data = json.loads(content)
+        return cls(
+            dirty=[datetime.date.fromisoformat(d) for d in data.get("dirty", [])]
+        )
+
+
+class RollupStore:
+    """
+    Materialized hourly, daily and monthly aggregates of a meter's data: for each bucket, the number of records and
+    the sum of each value column, with the bucket's start in `period_start`.
+
+    Exporters mark the days they write as dirty, and then refresh the rollups, which re-aggregates just the dirty days
+    (a month at a time) from the raw data: their hours replace those in the month's hourly table, their totals those in
+    the year's daily table, and the totals of their months those in the monthly table. Since the dirty days are
+    persisted until they have been aggregated, an interrupted refresh is finished by the next one.
+    """
+
+    def __init__(self, storage: StorageManager, settings: RollupSettings) -> None:
+        self._storage = storage
+        self._settings = settings
+
+    def mark_dirty(self, days: Iterable[datetime.date]) -> None:
+        """Records that the data of `days` has changed, and that their aggregates must be refreshed."""
+        state = self._load_state()
+        dirty = set(state.dirty).union(days)
+        if len(dirty) > len(state.dirty):
+            state.dirty = sorted(dirty)
+            self._save_state(state)
+
+    @property
+    def dirty(self) -> list[datetime.date]:
+        return self._load_state().dirty
+
+    def refresh(
+        self, load: Callable[[list[datetime.date]], pd.DataFrame]
+    ) -> list[datetime.date]:
+        """
+        Re-aggregates the dirty days, and returns them. `load` is called with the dirty days of each month in turn, and
+        must return all the raw rows of those days (it may return others, which are ignored).
+        """
+        state = self._load_state()
+        refreshed = list(state.dirty)
+        for _, month_days in groupby(refreshed, key=lambda d: (d.year, d.month)):
+            days = list(month_days)
+            self._update_month(days, load(days))
+            state.dirty = [d for d in state.dirty if d not in days]
+            self._save_state(state)
+        return refreshed
+
+    def read(
+        self,
+        granularity: Granularity,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+    ) -> pd.DataFrame:
+        """Reads the buckets that start on or after `start` and before `end`, opening only the tables that hold them."""
+        base_dir = self._settings.base_dir
+        if granularity == "month":
+            paths = [f"{base_dir}/month.parquet"]
+        else:
+            paths = [
+                path
+                for path in self._storage.get_directory_listing(
+                    f"{base_dir}/{granularity}"
+                )
+                if _table_overlaps(path, granularity, start, end)
+            ]
+        frames = [table for path in paths if (table := self._read(path)) is not None]
+        if not frames:
+            return _empty(["records", *self._settings.value_columns])
+        rollup = pd.concat(frames, ignore_index=True)
+        days = rollup["period_start"].dt.date
+        mask = pd.Series(True, index=rollup.index)
+        if start is not None:
+            mask &= days >= start
+        if end is not None:
+            mask &= days < end
+        return rollup[mask].reset_index(drop=True)
+
+    def _update_month(self, days: list[datetime.date], raw: pd.DataFrame) -> None:
+        settings = self._settings
+        columns = ["records", *settings.value_columns]
+        if raw.empty:
+            hourly = daily = _empty(columns)
+        else:
+            raw = raw[raw[settings.time_column].dt.date.isin(days)].assign(records=1)
+            times = raw[settings.time_column]
+            hourly = _aggregate(raw, times.dt.floor("h"), columns)
+            daily = _aggregate(hourly, hourly["period_start"].dt.floor("D"), columns)
+
+        base_dir = settings.base_dir
+        self._replace(f"{base_dir}/hour/{days[0]:%Y-%m}.parquet", hourly, set(days))
+        year = self._replace(f"{base_dir}/day/{days[0]:%Y}.parquet", daily, set(days))
+        # The month's total is that of all its days, not just the dirty ones
+        month_start = days[0].replace(day=1)
+        if year.empty:
+            monthly = _empty(columns)
+        else:
+            month = year[year["period_start"].dt.month == month_start.month]
+            monthly = _aggregate(month, _month_start(month["period_start"]), columns)
+        self._replace(f"{base_dir}/month.parquet", monthly, {month_start})
+
+    def _replace(
+        self, path: str, rows: pd.DataFrame, days: set[datetime.date]
+    ) -> pd.DataFrame:
+        """Replaces the rows of a table whose buckets start on `days` with `rows`, and returns the new table."""
+        existing = self._read(path)
+        if existing is not None:
+            keep = existing[~existing["period_start"].dt.date.isin(days)]
+            frames = [df for df in (keep, rows) if not df.empty]
+            rows = pd.concat(frames, ignore_index=True) if frames else keep
+        if rows.empty:
+            self._storage.delete(path)
+            return rows
+        rows = rows.sort_values("period_start", ignore_index=True)
+        fastparquet.write(
+            path,
+            rows,
+            compression=self._settings.compression,
+            write_index=False,
+            open_with=self._storage.open_file,
+            mkdirs=self._storage.make_dirs,
+        )
+        return rows
+
+    def _read(self, path: str) -> Optional[pd.DataFrame]:
+        if not self._storage.file_exists(path):
+            return None
+        return fastparquet.ParquetFile(
+            path, open_with=self._storage.open_file
+        ).to_pandas()
+
+    def _load_state(self) -> RollupState:
+        try:
+            content = self._storage.read_file_contents(self._state_path())
+        except FileNotFoundError:
+            return RollupState()
+        return RollupState.from_json(content)
+
+    def _save_state(self, state: RollupState) -> None:
+        self._storage.write_file_contents(self._state_path(), state.to_json())
+
+    def _state_path(self) -> str:
+        return f"{self._settings.base_dir}/{ROLLUP_STATE_FILE}"
+
+
+def _aggregate(
+    df: pd.DataFrame, period_start: pd.Series, columns: list[str]
+) -> pd.DataFrame:
+    return (
+        df[columns]
+        .groupby(period_start.rename("period_start"), sort=True)
+        .sum()
+        .reset_index()
+    )
+
+
+def _empty(columns: list[str]) -> pd.DataFrame:
+    return pd.DataFrame(columns=["period_start", *columns])
+
+
+def _month_start(times: pd.Series) -> pd.Series:
+    """The start of the month of each (naive or tz-aware) time."""
+    return times.dt.normalize() - pd.to_timedelta(times.dt.day - 1, unit="D")
+
+
+def _table_overlaps(
+    path: str,
+    granularity: Granularity,
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+) -> bool:
+    """Whether an hourly (`YYYY-MM.parquet`) or daily (`YYYY.parquet`) table may hold buckets in [`start`, `end`)."""
+    key = path.rsplit("/", 1)[-1].removesuffix(".parquet")
+    if granularity == "hour":
+        first = datetime.date(int(key[:4]), int(key[5:7]), 1)
+        last = (first + datetime.timedelta(days=31)).replace(day=1)
+    else:
+        first = datetime.date(int(key), 1, 1)
+        last = datetime.date(int(key) + 1, 1, 1)
+    return (start is None or last > start) and (end is None or first < end)
@@ -0,0 +1,101 @@
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from typing import BinaryIO, Optional
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class StorageManager(ABC):
+    @abstractmethod
+    def read_file_contents(self, filepath: str) -> str:
+        """Reads the contents of `filepath`. Raises `FileNotFoundError` if it does not exist."""
+        raise NotImplementedError("Function read_file must be implemented")
+
+    @abstractmethod
+    def read_bytes(
+        self, filepath: str, offset: int = 0, length: Optional[int] = None
+    ) -> bytes:
+        """
+        Reads up to `length` bytes (default: the rest of the file) from `filepath`, starting at `offset`. A negative
+        `offset` counts back from the end of the file, e.g. to read a parquet footer. Raises `FileNotFoundError` if the
+        file does not exist.
+        """
+        raise NotImplementedError("Function read_bytes must be implemented")
+
+    @abstractmethod
+    def get_file_size(self, filepath: str) -> int:
+        """Gets the size of `filepath` in bytes. Raises `FileNotFoundError` if it does not exist."""
+        raise NotImplementedError("Function get_file_size must be implemented")
+
+    def iter_file_chunks(
+        self,
+        filepath: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        offset: int = 0,
+        length: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """
+        Streams the byte range [`offset`, `offset` + `length`) of `filepath` in chunks of at most `chunk_size` bytes.
+        Implementations should override this if they can stream more efficiently than with repeated ranged reads.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        size = self.get_file_size(filepath)
+        if offset < 0:
+            offset = max(size + offset, 0)
+        end = size if length is None else min(offset + length, size)
+        while offset < end:
+            chunk = self.read_bytes(filepath, offset, min(chunk_size, end - offset))
+            if not chunk:
+                break
+            yield chunk
+            offset += len(chunk)
+
+    def file_exists(self, filepath: str) -> bool:
+        try:
+            self.get_file_size(filepath)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @abstractmethod
+    def open_file(self, filepath: str, mode: str = "rb") -> BinaryIO:
+        """
+        Opens `filepath` as a binary file object, e.g. for use as the `open_with` function of a parquet library. Write
+        modes create any missing parent directories. Unlike `write_file_contents`, writes are not atomic.
+        """
+        raise NotImplementedError("Function open_file must be implemented")
+
+    @abstractmethod
+    def make_dirs(self, dirpath: str) -> None:
+        """Creates `dirpath` and any missing parents; does nothing if it already exists."""
+        raise NotImplementedError("Function make_dirs must be implemented")
+
+    @abstractmethod
+    def write_file_contents(self, filepath: str, content: str) -> None:
+        """
+        Writes `content` to `filepath`, replacing any existing file. The write must be atomic: readers see either the
+        old or the new content, never a partial file.
+        """
+        raise NotImplementedError("Function write_file_contents must be implemented")
+
+    @abstractmethod
+    def get_directory_listing(self, dirpath: str) -> list[str]:
+        raise NotImplementedError("Function get_directory_listing must be implemented")
+
+    @abstractmethod
+    def delete(self, filepath: str) -> None:
+        """Deletes `filepath`; does nothing if it does not exist."""
+        raise NotImplementedError("Function delete must be implemented")
+
+    def move(self, source: str, destination: str) -> None:
+        """
+        Moves `source` to `destination`, replacing any existing file. Raises `FileNotFoundError` if `source` does not
+        exist. Implementations should override this if they can rename files, rather than copying and deleting them.
+        """
+        if not self.file_exists(source):
+            raise FileNotFoundError(source)
+        with self.open_file(destination, "wb") as f:
+            for chunk in self.iter_file_chunks(source):
+                f.write(chunk)
+        self.delete(source)
@@ -0,0 +1,245 @@
+import datetime
+import threading
+from collections.abc import Iterable, Sequence
+from typing import Any, Optional, Self
+
+import numpy as np
+import pandas as pd
+import pendulum
+from attrs import define
+
+from octopus_stats.octo_api_models import Agreement
+from octopus_stats.octo_api_reader import OctoAPIReader, RateType
+
+_SECONDS_PER_DAY = 86400
+_OPEN_ENDED = np.iinfo(np.int64).max
+
+
+@define(kw_only=True, frozen=True)
+class TariffCostSettings:
+    payment_method: Optional[str] = "DIRECT_DEBIT"
+    """Payment method whose rates apply, for tariffs whose rates differ by payment method; `None` to accept any"""
+    include_vat: bool = True
+    """Whether to price with the rates including VAT, rather than excluding it"""
+
+
+@define
+class TariffCostStats:
+    rate_fetches: int = 0
+    """Rate schedules fetched from the API (each may be several pages)"""
+    rate_cache_hits: int = 0
+    intervals_priced: int = 0
+    intervals_unpriced: int = 0
+    """Intervals outside every agreement, or without a rate, whose costs are NaN"""
+
+
+class IntervalIndex:
+    """
+    Half-open periods [start, end), in epoch seconds, sorted by start for binary-search lookup. Where periods overlap,
+    a time is located in the one that started last.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray) -> None:
+        self._order = np.argsort(starts, kind="stable")
+        self._starts = starts[self._order]
+        self._ends = ends[self._order]
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def locate(self, times: np.ndarray) -> np.ndarray:
+        """The position (in the order given) of the period containing each time, or -1 if there is none."""
+        if not len(self._starts):
+            return np.full(len(times), -1, dtype=np.int64)
+        index = np.searchsorted(self._starts, times, side="right") - 1
+        found = index >= 0
+        found[found] = times[found] < self._ends[index[found]]
+        return np.where(found, self._order[np.maximum(index, 0)], -1)
+
+
+class RateSchedule:
+    """A tariff's unit rates (p/kWh) or standing charges (p/day) over time."""
+
+    def __init__(
+        self, starts: np.ndarray, ends: np.ndarray, values: np.ndarray
+    ) -> None:
+        self._index = IntervalIndex(starts, ends)
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, times: np.ndarray) -> np.ndarray:
+        """The rate at each time (in epoch seconds), or NaN if none applies."""
+        position = self._index.locate(times)
+        return np.where(position >= 0, self._values[np.maximum(position, 0)], np.nan)
+
+    @classmethod
+    def from_results(
+        cls,
+        pages: Iterable[list[dict[str, Any]]],
+        *,
+        include_vat: bool = True,
+        payment_method: Optional[str] = None,
+    ) -> Self:
+        """Builds the schedule from the raw `results` of the API's rate pages, column by column."""
+        results = [
+            r
+            for page in pages
+            for r in page
+            if payment_method is None
+            or r.get("payment_method") in (None, payment_method)
+        ]
+        if not results:
+            return cls(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0))
+        value_key = "value_inc_vat" if include_vat else "value_exc_vat"
+        values = np.array([r[value_key] for r in results], dtype=np.float64)
+        starts = _epoch_seconds([r["valid_from"] for r in results])
+        valid_to = [r.get("valid_to") for r in results]
+        open_ended = np.array([v is None for v in valid_to])
+        ends = np.full(len(results), _OPEN_ENDED, dtype=np.int64)
+        if not open_ended.all():
+            ends[~open_ended] = _epoch_seconds([v for v in valid_to if v is not None])
+        return cls(starts, ends, values)
+
+
+@define(kw_only=True)
+class _CachedSchedule:
+    start: int
+    end: int
+    schedule: RateSchedule
+
+
+class TariffCostEngine:
+    """
+    Prices consumption frames under an account's agreements. The rates of each tariff are fetched once for the period
+    needed and kept in memory, so that pricing many meters, or many frames of one meter, costs one API query per tariff
+    and rate type; pass the reader a `ResponseCache` to keep them on disk between runs as well. The engine can be
+    shared between threads.
+
+    Only single-register tariffs (`E-1R-...`) are priced: the rates of the others (e.g. Economy 7) apply to the
+    readings of each register, which the consumption doesn't break down.
+    """
+
+    def __init__(
+        self, reader: OctoAPIReader, settings: Optional[TariffCostSettings] = None
+    ) -> None:
+        self._reader = reader
+        self._settings = settings if settings is not None else TariffCostSettings()
+        self._lock = threading.Lock()
+        self._schedules: dict[tuple[str, RateType], _CachedSchedule] = {}
+        self._fetch_locks: dict[tuple[str, RateType], threading.Lock] = {}
+        self._stats = TariffCostStats()
+
+    @property
+    def stats(self) -> TariffCostStats:
+        return self._stats
+
+    def price(
+        self, consumption: pd.DataFrame, agreements: Sequence[Agreement]
+    ) -> pd.DataFrame:
+        """
+        Prices each interval of a consumption frame (see `build_consumption_frame`) under the agreement in force at its
+        start, and returns the frame with these columns added:
+          - tariff_code: the agreement's tariff, or NaN outside every agreement
+          - unit_rate (p/kWh) and standing_charge (p/day): the tariff's rates at the start of the interval
+          - consumption_cost: the interval's consumption at the unit rate, in pence
+          - standing_charge_cost: the daily standing charge, apportioned by the interval's duration, in pence
+          - cost: the sum of the two
+        Costs are NaN where there is no agreement or rate.
+        """
+        costs = consumption.reset_index(drop=True)
+        starts = _epoch_seconds(costs["start_utc"])
+        durations = _epoch_seconds(costs["end_utc"]) - starts
+
+        tariffs = sorted({a.tariff_code for a in agreements})
+        agreement_index = IntervalIndex(
+            _epoch_seconds([a.valid_from for a in agreements]),
+            np.array(
+                [
+                    int(a.valid_to.timestamp()) if a.valid_to else _OPEN_ENDED
+                    for a in agreements
+                ],
+                dtype=np.int64,
+            ),
+        )
+        # The tariff of each agreement, and -1 (no tariff) last, for the intervals outside every agreement
+        agreement_tariffs = np.array(
+            [*(tariffs.index(a.tariff_code) for a in agreements), -1], dtype=np.int64
+        )
+        codes = agreement_tariffs[agreement_index.locate(starts)]
+
+        unit_rate = np.full(len(costs), np.nan)
+        standing_charge = np.full(len(costs), np.nan)
+        for i, tariff_code in enumerate(tariffs):
+            mask = codes == i
+            if not mask.any() or not _is_single_register(tariff_code):
+                continue
+            times = starts[mask]
+            (first, last) = (int(times.min()), int(times.max()) + 1)
+            unit_rate[mask] = self._schedule(
+                tariff_code, "standard-unit-rates", first, last
+            ).lookup(times)
+            standing_charge[mask] = self._schedule(
+                tariff_code, "standing-charges", first, last
+            ).lookup(times)
+
+        costs["tariff_code"] = pd.Categorical.from_codes(codes, categories=tariffs)
+        costs["unit_rate"] = unit_rate
+        costs["standing_charge"] = standing_charge
+        costs["consumption_cost"] = costs["total_consumed_kwh"].to_numpy() * unit_rate
+        costs["standing_charge_cost"] = standing_charge * durations / _SECONDS_PER_DAY
+        costs["cost"] = costs["consumption_cost"] + costs["standing_charge_cost"]
+        priced = int(np.count_nonzero(~np.isnan(costs["cost"].to_numpy())))
+        with self._lock:
+            self._stats.intervals_priced += priced
+            self._stats.intervals_unpriced += len(costs) - priced
+        return costs
+
+    def _schedule(
+        self, tariff_code: str, rate_type: RateType, start: int, end: int
+    ) -> RateSchedule:
+        """The tariff's rates over at least [`start`, `end`), fetching them unless they are already held."""
+        # Whole UTC days, so that nearby periods share the fetch (and the reader's cached responses)
+        start -= start % _SECONDS_PER_DAY
+        end += -end % _SECONDS_PER_DAY
+        key = (tariff_code, rate_type)
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        # Threads needing the same schedule wait for one fetch, while others fetch (or price) in parallel
+        with fetch_lock:
+            with self._lock:
+                cached = self._schedules.get(key)
+                if cached is not None and cached.start <= start and end <= cached.end:
+                    self._stats.rate_cache_hits += 1
+                    return cached.schedule
+            if cached is not None:
+                (start, end) = (min(start, cached.start), max(end, cached.end))
+            pages = self._reader.get_tariff_rate_pages(
+                tariff_code,
+                rate_type,
+                start=pendulum.from_timestamp(start),
+                end=pendulum.from_timestamp(end),
+            )
+            schedule = RateSchedule.from_results(
+                pages,
+                include_vat=self._settings.include_vat,
+                payment_method=self._settings.payment_method,
+            )
+            with self._lock:
+                self._schedules[key] = _CachedSchedule(
+                    start=start, end=end, schedule=schedule
+                )
+                self._stats.rate_fetches += 1
+            return schedule
+
+
+def _is_single_register(tariff_code: str) -> bool:
+    return tariff_code.split("-")[1:2] == ["1R"]
+
+
+def _epoch_seconds(
+    times: pd.Series | Sequence[str] | Sequence[datetime.datetime],
+) -> np.ndarray:
+    """Seconds since the epoch of tz-aware times, or of ISO 8601 strings with UTC offsets."""
+    return pd.DatetimeIndex(pd.to_datetime(times, utc=True)).as_unit("s").asi8
@@ -0,0 +1,254 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+import fastparquet
+import numpy as np
+import pandas as pd
+from attrs import define, field, validators
+
+_JOULES_PER_KWH = 3_600_000.0
+_SECONDS_PER_DAY = 86400
+
+ENERGY_BREAKDOWN = {
+    "grid_import_kwh": ("imp",),
+    "grid_export_kwh": ("exp",),
+    "generated_kwh": ("gep",),
+    "ev_imported_kwh": ("h1b", "h2b", "h3b"),
+    "ev_diverted_kwh": ("h1d", "h2d", "h3d"),
+}
+"""Columns of the alignment, and the Zappi fields (in joules, summed over the phases) that each is made of"""
+
+_ALIGNED_COLUMNS = [
+    "zappi_minutes",
+    "coverage",
+    *ENERGY_BREAKDOWN,
+    "ev_kwh",
+    "household_kwh",
+]
+"""Columns that alignment adds to the intervals"""
+
+MinuteData = Union[np.ndarray, pd.DataFrame]
+"""Zappi 1-minute data, as a structured array of `ZAPPI_USAGE_DTYPE` or a frame from `usage_array_to_frame`"""
+
+
+def align_intervals(intervals: pd.DataFrame, minutes: MinuteData) -> pd.DataFrame:
+    """
+    Bins Zappi 1-minute data into consumption intervals (e.g. Octopus half-hours), and returns the intervals with the
+    energy breakdown of each. Each minute is assigned to the interval containing its start, by binary search of the
+    intervals' UTC starts, so local clock changes need no special handling, and the sums are taken with `bincount`.
+
+    `intervals` must have `start_utc`, `end_utc` and `total_consumed_kwh` columns, with no overlapping intervals; its
+    other columns are kept. Added columns:
+      - zappi_minutes: number of minutes of Zappi data in the interval, and `coverage`, that as a fraction of its length
+      - grid_import_kwh, grid_export_kwh, generated_kwh, ev_imported_kwh, ev_diverted_kwh (see `ENERGY_BREAKDOWN`)
+      - ev_kwh: energy into the EV, imported and diverted
+      - household_kwh: consumption other than the EV's imports
+    Intervals without any Zappi data (gaps) have NaN breakdowns, rather than zero. Minutes outside every interval are
+    ignored.
+    """
+    return _align(intervals, *_minute_columns(minutes))
+
+
+def _align(
+    intervals: pd.DataFrame, minute_starts: np.ndarray, fields: dict[str, np.ndarray]
+) -> pd.DataFrame:
+    aligned = intervals.sort_values("start_utc", kind="stable", ignore_index=True)
+    starts = _epoch_seconds(aligned["start_utc"])
+    ends = _epoch_seconds(aligned["end_utc"])
+    index = np.searchsorted(starts, minute_starts, side="right") - 1
+    matched = index >= 0
+    matched[matched] = minute_starts[matched] < ends[index[matched]]
+    index = index[matched]
+    n = len(aligned)
+
+    counts = np.bincount(index, minlength=n)
+    aligned["zappi_minutes"] = counts
+    aligned["coverage"] = counts / np.maximum((ends - starts) / 60, 1)
+    gaps = counts == 0
+    for column, names in ENERGY_BREAKDOWN.items():
+        joules = sum(fields[name][matched].astype(np.float64) for name in names)
+        kwh = np.bincount(index, weights=joules, minlength=n) / _JOULES_PER_KWH
+        kwh[gaps] = np.nan
+        aligned[column] = kwh
+    aligned["ev_kwh"] = aligned["ev_imported_kwh"] + aligned["ev_diverted_kwh"]
+    aligned["household_kwh"] = (
+        aligned["total_consumed_kwh"] - aligned["ev_imported_kwh"]
+    ).clip(lower=0)
+    return aligned
+
+
+@define(kw_only=True, frozen=True)
+class AlignmentCacheSettings:
+    max_days: int = field(default=1000, validator=[validators.ge(1)])
+    """Number of aligned days kept in memory, beyond which the least recently used are dropped"""
+    cache_dir: Optional[str] = None
+    """Directory in which to persist aligned days between runs; if not set, they are only kept in memory"""
+
+
+@define
+class AlignmentStats:
+    hits: int = 0
+    misses: int = 0
+    minutes_matched: int = 0
+    """Minutes of Zappi data assigned to an interval, by the alignments computed (not those found in the cache)"""
+    minutes_unmatched: int = 0
+
+
+class AlignmentCache:
+    """
+    Keeps the columns added by aligning days, in memory and optionally on disk, keyed by the day and a fingerprint of
+    its inputs, so that a day is only aligned again when its consumption or Zappi data changes. The cache can be shared
+    between threads.
+    """
+
+    def __init__(self, settings: Optional[AlignmentCacheSettings] = None) -> None:
+        self._settings = settings or AlignmentCacheSettings()
+        self._dir = Path(self._settings.cache_dir) if self._settings.cache_dir else None
+        if self._dir is not None:
+            self._dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._days: OrderedDict[str, tuple[str, pd.DataFrame]] = OrderedDict()
+
+    def get(self, day: str, fingerprint: str) -> Optional[pd.DataFrame]:
+        """The day's aligned columns, if they are cached for these inputs; they are a copy, which the caller may modify."""
+        with self._lock:
+            entry = self._days.get(day)
+            if entry is not None and entry[0] == fingerprint:
+                self._days.move_to_end(day)
+                return entry[1].copy()
+        loaded = self._load(day, fingerprint)
+        if loaded is None:
+            return None
+        self._remember(day, fingerprint, loaded)
+        return loaded.copy()
+
+    def put(self, day: str, fingerprint: str, df: pd.DataFrame) -> None:
+        self._remember(day, fingerprint, df.copy())
+        if self._dir is None:
+            return
+        path = self._dir / f"{day}.{fingerprint}.parquet"
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        fastparquet.write(str(tmp_path), df, write_index=False)
+        tmp_path.replace(path)
+        for stale in self._dir.glob(f"{day}.*.parquet"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+    def _remember(self, day: str, fingerprint: str, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._days[day] = (fingerprint, df)
+            self._days.move_to_end(day)
+            while len(self._days) > self._settings.max_days:
+                self._days.popitem(last=False)
+
+    def _load(self, day: str, fingerprint: str) -> Optional[pd.DataFrame]:
+        if self._dir is None:
+            return None
+        path = self._dir / f"{day}.{fingerprint}.parquet"
+        if not path.exists():
+            return None
+        return fastparquet.ParquetFile(str(path)).to_pandas()
+
+
+class IntervalAligner:
+    """
+    Aligns Zappi data with consumption intervals (see `align_intervals`) a UTC day at a time, so that with a cache,
+    re-running an analysis only aligns the days whose data has changed.
+    """
+
+    def __init__(self, cache: Optional[AlignmentCache] = None) -> None:
+        self._cache = cache
+        self._stats = AlignmentStats()
+
+    @property
+    def stats(self) -> AlignmentStats:
+        return self._stats
+
+    def align(self, intervals: pd.DataFrame, minutes: MinuteData) -> pd.DataFrame:
+        """Equivalent to `align_intervals(intervals, minutes)`, but using the cache for each day it can."""
+        intervals = intervals.sort_values("start_utc", kind="stable", ignore_index=True)
+        (minute_starts, fields) = _minute_columns(minutes)
+        order = np.argsort(minute_starts, kind="stable")
+        minute_starts = minute_starts[order]
+        fields = {name: values[order] for (name, values) in fields.items()}
+
+        starts = _epoch_seconds(intervals["start_utc"])
+        (days, first) = np.unique(starts // _SECONDS_PER_DAY, return_index=True)
+        if not len(days):
+            return _align(intervals, minute_starts, fields)
+        bounds = [*first.tolist(), len(intervals)]
+        # Each day's intervals are those starting on it, and may end after midnight (e.g. local days in summer time),
+        # so they need the minutes from the start of the first to the end of the last
+        ends = np.maximum.reduceat(_epoch_seconds(intervals["end_utc"]), first)
+        lo = np.searchsorted(minute_starts, starts[first])
+        hi = np.searchsorted(minute_starts, ends)
+        frames = [
+            self._align_day(
+                str(np.datetime64(int(day), "D")),
+                intervals.iloc[bounds[i] : bounds[i + 1]],
+                minute_starts[lo[i] : hi[i]],
+                {name: values[lo[i] : hi[i]] for (name, values) in fields.items()},
+            )
+            for (i, day) in enumerate(days)
+        ]
+        return pd.concat(frames, ignore_index=True)
+
+    def _align_day(
+        self,
+        day: str,
+        intervals: pd.DataFrame,
+        minute_starts: np.ndarray,
+        fields: dict[str, np.ndarray],
+    ) -> pd.DataFrame:
+        # Only the added columns are cached, and they are joined onto the intervals given, whose other columns (which
+        # the fingerprint doesn't cover) may differ from those of the intervals aligned
+        fingerprint = ""
+        columns = None
+        if self._cache is not None:
+            fingerprint = _fingerprint(intervals, minute_starts, fields)
+            columns = self._cache.get(day, fingerprint)
+        if columns is not None:
+            self._stats.hits += 1
+        else:
+            self._stats.misses += 1
+            columns = _align(intervals, minute_starts, fields)[_ALIGNED_COLUMNS]
+            matched = int(columns["zappi_minutes"].sum())
+            self._stats.minutes_matched += matched
+            self._stats.minutes_unmatched += len(minute_starts) - matched
+            if self._cache is not None:
+                self._cache.put(day, fingerprint, columns)
+        aligned = intervals.reset_index(drop=True)
+        for column in _ALIGNED_COLUMNS:
+            aligned[column] = columns[column].to_numpy()
+        return aligned
+
+
+def _epoch_seconds(times: pd.Series) -> np.ndarray:
+    """Seconds since the epoch of tz-aware times, whatever their resolution."""
+    return pd.DatetimeIndex(times).as_unit("s").asi8
+
+
+def _minute_columns(minutes: MinuteData) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """The start (in epoch seconds) of each minute, and the fields used by the breakdown."""
+    names = {name for fields in ENERGY_BREAKDOWN.values() for name in fields}
+    starts = minutes["interval_start"]
+    if isinstance(starts, pd.Series) and isinstance(starts.dtype, pd.DatetimeTZDtype):
+        starts = _epoch_seconds(starts)
+    fields = {name: np.asarray(minutes[name]) for name in sorted(names)}
+    return (np.asarray(starts, dtype=np.int64), fields)
+
+
+def _fingerprint(
+    intervals: pd.DataFrame, minute_starts: np.ndarray, fields: dict[str, np.ndarray]
+) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for column in ("start_utc", "end_utc"):
+        digest.update(_epoch_seconds(intervals[column]).tobytes())
+    digest.update(intervals["total_consumed_kwh"].to_numpy(np.float64).tobytes())
+    digest.update(minute_starts.tobytes())
+    for name in sorted(fields):
+        digest.update(np.ascontiguousarray(fields[name]).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,223 @@
+import asyncio
+import datetime
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
+from functools import partial
+from types import TracebackType
+from typing import Any, Optional, Self
+from urllib.parse import urlparse
+
+import httpx
+import numpy as np
+import pendulum
+from octopus_stats.concurrency import async_ordered_map
+from octopus_stats.http_session import create_async_client
+from octopus_stats.request_scheduler import RequestScheduler
+from octopus_stats.response_cache import ResponseCache
+
+from zappi_stats.zappi_api_reader import (
+    _SECONDS_PER_DAY,
+    ASN_HEADER,
+    MAX_ASN_REDIRECTS,
+    ZAPPI_USAGE_DTYPE,
+    MyenergiApiConfig,
+    ZappiUsageByMinuteRecordRaw,
+    _create_usage_record,
+    _day_path,
+    decode_usage_records,
+)
+
+
+class AsyncZappiApiReader:
+    """
+    The asyncio equivalent of `ZappiApiReader`, for streaming many hubs concurrently on one event loop.
+
+    Each reader allows at most `max_concurrency` requests in flight at once. Share a client (see
+    `http_session.create_async_client`) between readers to share its connection pool. Cancelling a task that is
+    iterating one of the reader's generators cancels its in-flight requests.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        config: MyenergiApiConfig,
+        *,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[ResponseCache] = None,
+        max_concurrency: int = 4,
+        scheduler: Optional[RequestScheduler] = None,
+    ) -> None:
+        """
+        Creates a reader. Pass a `client` to share a connection pool with other readers; otherwise the reader creates its
+        own. `cache` and `scheduler` are as for `ZappiApiReader`.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self._config = config
+        self._cache = cache
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._host: Optional[str] = None
+        self._api_url: Optional[str] = None
+        self._owns_client = client is None
+        self._client = client if client is not None else create_async_client()
+        self._auth = httpx.DigestAuth(config.hub_serial_number, config.api_key)
+        self._max_concurrency = max_concurrency
+        self._limit = asyncio.Semaphore(max_concurrency)
+
+    async def connect(self) -> None:
+        # See ZappiApiReader.connect for a description of the protocol
+        url = self._config.director_url
+        for _ in range(MAX_ASN_REDIRECTS):
+            async with self._limit:
+                r = await self._scheduler.send_async(
+                    url, partial(self._client.get, url, auth=self._auth)
+                )
+            asn = r.headers.get(ASN_HEADER, None)
+            if asn is None:
+                raise RuntimeError(f"Header {ASN_HEADER} not present")
+            parsed_url = urlparse(url)
+            current_host = parsed_url.hostname
+            if not current_host:
+                raise RuntimeError("Unable to parse host")
+            if current_host == asn:
+                self._host = current_host
+                self._api_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+                return
+            # Replace the hostname with ASN and try again
+            url = parsed_url._replace(
+                netloc=parsed_url.netloc.replace(current_host, asn)
+            ).geturl()
+
+        raise RuntimeError("Unable to determine API host")
+
+    async def get_data(
+        self,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        *,
+        max_buffered_days: Optional[int] = None,
+    ) -> AsyncGenerator[ZappiUsageByMinuteRecordRaw, None]:
+        """
+        Gets the 1-minute usage records in the range [`start`, `end`), in chronological order.
+
+        Each day in the range is a separate API call, and up to `max_concurrency` days are fetched at once.
+        `max_buffered_days` caps how many days can be in flight or waiting to be yielded at once (by default, twice
+        `max_concurrency`).
+        """
+        assert self.is_connected
+
+        start_utc = start.set(tz="UTC")
+        end_utc = end.set(tz="UTC")
+        days = self._get_days(start_utc, end_utc, max_buffered_days)
+        async with aclosing(days):
+            async for day in days:
+                for x in day:
+                    rec = _create_usage_record(x)
+                    if start_utc <= rec.interval_start < end_utc:
+                        yield rec
+
+    async def get_data_array(
+        self,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        *,
+        max_buffered_days: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Gets the same records as `get_data`, as a single structured array of `ZAPPI_USAGE_DTYPE` sorted by
+        `interval_start`.
+        """
+        assert self.is_connected
+
+        start_utc = start.set(tz="UTC")
+        end_utc = end.set(tz="UTC")
+        start_ts = int(start_utc.timestamp())
+        end_ts = int(end_utc.timestamp())
+        arrays: list[np.ndarray] = []
+        days = self._get_days(start_utc, end_utc, max_buffered_days)
+        async with aclosing(days):
+            async for day in days:
+                arr = decode_usage_records(day)
+                ts = arr["interval_start"]
+                arrays.append(arr[(ts >= start_ts) & (ts < end_ts)])
+        if not arrays:
+            return np.zeros(0, dtype=ZAPPI_USAGE_DTYPE)
+        return np.concatenate(arrays)
+
+    async def get_day_array(self, day: datetime.date) -> np.ndarray:
+        """
+        Gets all the 1-minute usage records for a single (UTC) day with one API call, as a structured array of
+        `ZAPPI_USAGE_DTYPE` sorted by `interval_start`.
+        """
+        assert self.is_connected
+
+        day_start = pendulum.datetime(day.year, day.month, day.day, tz="UTC")
+        arr = decode_usage_records(await self._get_day(day_start))
+        ts = arr["interval_start"]
+        start_ts = int(day_start.timestamp())
+        return arr[(ts >= start_ts) & (ts < start_ts + _SECONDS_PER_DAY)]
+
+    async def aclose(self) -> None:
+        """Closes the reader's HTTP client, unless it was supplied by the caller."""
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.aclose()
+
+    @property
+    def is_connected(self) -> bool:
+        return self._host is not None
+
+    @property
+    def connected_host(self) -> str:
+        if self._host is None:
+            raise RuntimeError("Not connected")
+        return self._host
+
+    async def _get_days(
+        self,
+        start_utc: pendulum.DateTime,
+        end_utc: pendulum.DateTime,
+        max_buffered_days: Optional[int],
+    ) -> AsyncGenerator[list[dict[str, int]], None]:
+        if max_buffered_days is None:
+            max_buffered_days = 2 * self._max_concurrency
+        period = pendulum.interval(start_utc, end_utc)
+        days = async_ordered_map(
+            self._get_day, period.range("days"), max_buffered=max_buffered_days
+        )
+        async with aclosing(days):
+            async for day in days:
+                yield day
+
+    async def _get_day(self, dt: pendulum.DateTime) -> list[dict[str, int]]:
+        zappi_id = self._config.hub_serial_number
+        url = f"{self._api_url}/{_day_path(zappi_id, dt)}"
+        # The cache reads and writes files, so it is used off the event loop
+        results = None
+        if self._cache is not None:
+            results = await asyncio.to_thread(self._cache.get, url)
+        if results is None:
+            results = await self._fetch(url)
+            if self._cache is not None:
+                day_end = pendulum.datetime(dt.year, dt.month, dt.day, tz="UTC").add(
+                    days=1
+                )
+                await asyncio.to_thread(self._cache.put, url, results, day_end)
+        return results[f"U{zappi_id}"]
+
+    async def _fetch(self, url: str) -> Any:
+        async with self._limit:
+            r = await self._scheduler.send_async(
+                url, partial(self._client.get, url, auth=self._auth)
+            )
+        r.raise_for_status()
+        return r.json()
@@ -1,12 +1,27 @@
 import datetime
 import os
+import time
 from collections.abc import Generator
-from typing import Optional, Self
-from urllib.parse import urlparse, urlunsplit
+from functools import partial
+from itertools import chain
+from operator import itemgetter
+from typing import Any, Optional, Self
+from urllib.parse import urlparse
 
+import numpy as np
+import pandas as pd
 import pendulum
 import requests
 from attrs import define, frozen
+from octopus_stats.concurrency import ordered_map
+from octopus_stats.http_session import create_session
+from octopus_stats.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+    record_http_response,
+)
+from octopus_stats.request_scheduler import RequestScheduler
+from octopus_stats.response_cache import ResponseCache
 from requests.auth import HTTPDigestAuth
 
 
@@ -70,10 +85,95 @@ def _create_usage_record(rec: dict[str, int]) -> ZappiUsageByMinuteRecordRaw:
     )
 
 
+ZAPPI_USAGE_DTYPE = np.dtype(
+    [
+        ("interval_start", np.int64),
+        ("imp", np.int32),
+        ("gep", np.int32),
+        ("exp", np.int32),
+        ("h1b", np.int32),
+        ("h2b", np.int32),
+        ("h3b", np.int32),
+        ("h1d", np.int32),
+        ("h2d", np.int32),
+        ("h3d", np.int32),
+        ("v1", np.uint16),
+        ("v2", np.uint16),
+        ("v3", np.uint16),
+        ("frq", np.uint16),
+    ]
+)
+"""
+Structured array equivalent of `ZappiUsageByMinuteRecordRaw`. `interval_start` holds the start of the 1-minute interval
+as seconds since the Unix epoch (UTC); the remaining fields have the same units as the record class.
+"""
+
+_USAGE_FIELDS = ZAPPI_USAGE_DTYPE.names[1:]  # type: ignore[index]
+_SECONDS_PER_DAY = 86400
+
+# Every key of a raw record, in the order in which `decode_usage_records` reads them
+_RECORD_KEYS = ("yr", "mon", "dom", "hr", "min", *_USAGE_FIELDS)
+_RECORD_DEFAULTS = dict.fromkeys(_RECORD_KEYS, 0)
+_get_record_values = itemgetter(*_RECORD_KEYS)
+
+
+def decode_usage_records(recs: list[dict[str, int]]) -> np.ndarray:
+    """
+    Decodes a list of raw 1-minute records (as returned in the `U{zappi_id}` member of a `cgi-jday` response) into a
+    structured array of `ZAPPI_USAGE_DTYPE`, without creating an object per record. Missing values default to 0, as
+    for `_create_usage_record`.
+    """
+    n = len(recs)
+    arr = np.zeros(n, dtype=ZAPPI_USAGE_DTYPE)
+    if not n:
+        return arr
+
+    # A single pass reads every value of every record into one row per record
+    values = chain.from_iterable(_get_record_values(_RECORD_DEFAULTS | r) for r in recs)
+    rows = np.fromiter(values, dtype=np.int64, count=n * len(_RECORD_KEYS))
+    columns = dict(zip(_RECORD_KEYS, rows.reshape(n, -1).T, strict=True))
+    days = (
+        (columns["yr"] - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+        + (columns["mon"] - 1)
+    ).astype("datetime64[D]") + (columns["dom"] - 1)
+    arr["interval_start"] = (
+        days.astype(np.int64) * _SECONDS_PER_DAY
+        + columns["hr"] * 3600
+        + columns["min"] * 60
+    )
+    for key in _USAGE_FIELDS:
+        arr[key] = columns[key]
+    return arr
+
+
+def usage_array_to_frame(arr: np.ndarray) -> pd.DataFrame:
+    """Converts a structured array of `ZAPPI_USAGE_DTYPE` to a DataFrame with a tz-aware (UTC) `interval_start`."""
+    usage = pd.DataFrame(arr)
+    usage["interval_start"] = pd.to_datetime(
+        usage["interval_start"], unit="s", utc=True
+    )
+    return usage
+
+
+def _day_path(zappi_id: str, day: datetime.date) -> str:
+    """Returns the path of the `cgi-jday` request for all the 1-minute records of a single (UTC) day."""
+    sh = 0
+    sm = 0
+    mc = 1440
+    return f"cgi-jday-Z{zappi_id}-{day.year}-{day.month}-{day.day}-{sh}-{sm}-{mc}"
+
+
+DIRECTOR_URL = "https://director.myenergi.net/"
+ASN_HEADER = "x_myenergi-asn"
+MAX_ASN_REDIRECTS = 3
+
+
 @define(kw_only=True, frozen=True)
 class MyenergiApiConfig:
     hub_serial_number: str
     api_key: str
+    director_url: str = DIRECTOR_URL
+    """URL of the director, which redirects each hub to its API server; override it to use a stand-in server"""
 
     @classmethod
     def from_env(cls, prefix: str = "MYENERGI_") -> Self:
@@ -94,28 +194,49 @@ def from_env(cls, prefix: str = "MYENERGI_") -> Self:
         return cls(api_key=api_key, hub_serial_number=hub_serial_number)
 
 
-DIRECTOR_URL = "https://director.myenergi.net/"
-ASN_HEADER = "x_myenergi-asn"
-MAX_ASN_REDIRECTS = 3
-
-
 class ZappiApiReader:
-    def __init__(self, config: MyenergiApiConfig) -> None:
+    def __init__(  # noqa: PLR0913
+        self,
+        config: MyenergiApiConfig,
+        *,
+        session: Optional[requests.Session] = None,
+        cache: Optional[ResponseCache] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ) -> None:
+        """
+        Creates a reader. Pass a `session` (see `http_session.create_session`) to share a connection pool with other
+        readers; otherwise the reader creates its own. When fetching days concurrently, size the pool to at least the
+        number of workers. If a `cache` is given, day responses are cached there, and days that are long past are never
+        fetched again. Pass a `scheduler` to share rate limits and throttling state with other readers of the same API;
+        otherwise the reader creates its own. Requests, days, records and cache lookups are reported to
+        `instrumentation`, if given.
+        """
         self._config = config
+        self._cache = cache
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
         self._host: Optional[str] = None
+        self._api_url: Optional[str] = None
+        self._owns_session = session is None
+        self._session = session if session is not None else create_session()
+        self._auth = HTTPDigestAuth(config.hub_serial_number, config.api_key)
+        self._instrumentation = (
+            instrumentation if instrumentation is not None else NULL_INSTRUMENTATION
+        )
 
     def connect(self) -> None:
+        with self._instrumentation.timed("connect_seconds", api="myenergi"):
+            self._connect()
+
+    def _connect(self) -> None:
         # We need to determine the hostname to connect to - for a description of the protocol, see
         # https://myenergi.info/update-to-active-server-redirects-t2980.html
-        url = DIRECTOR_URL
+        url = self._config.director_url
         attempt = 0
         while attempt < MAX_ASN_REDIRECTS:
-            r = requests.get(
-                url,
-                auth=HTTPDigestAuth(
-                    self._config.hub_serial_number, self._config.api_key
-                ),
-                timeout=30,
+            attempt += 1
+            r = self._scheduler.send(
+                url, partial(self._session.get, url, auth=self._auth, timeout=30)
             )
             asn = r.headers.get(ASN_HEADER, None)
             if asn is None:
@@ -126,8 +247,10 @@ def connect(self) -> None:
                 raise RuntimeError("Unable to parse host")
             if current_host == asn:
                 self._host = current_host
+                self._api_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
                 break
             # Replace the hostname with ASN and try again
+            self._instrumentation.count("asn_redirects_total", api="myenergi")
             url = parsed_url._replace(
                 netloc=parsed_url.netloc.replace(current_host, asn)
             ).geturl()
@@ -139,33 +262,141 @@ def get_data(
         self,
         start: pendulum.DateTime,
         end: pendulum.DateTime,
+        *,
+        workers: int = 1,
+        max_buffered_days: Optional[int] = None,
     ) -> Generator[ZappiUsageByMinuteRecordRaw, None, None]:
-        assert self.is_connected
+        """
+        Gets the 1-minute usage records in the range [`start`, `end`), in chronological order.
 
-        zappi_id = self._config.hub_serial_number
-        sh = 0
-        sm = 0
-        mc = 1440
+        Each day in the range is a separate API call. With `workers` > 1, up to that many days are fetched concurrently;
+        `max_buffered_days` caps how many days can be in flight or waiting to be yielded at once (by default, twice the
+        number of workers).
+        """
+        assert self.is_connected
 
         start_utc = start.set(tz="UTC")
         end_utc = end.set(tz="UTC")
         period = pendulum.interval(start_utc, end_utc)
-        for dt in period.range("days"):
-            path = f"cgi-jday-Z{zappi_id}-{dt.year}-{dt.month}-{dt.day}-{sh}-{sm}-{mc}"
-            url = urlunsplit(("https", self._host, path, "", ""))
-            r = requests.get(
-                url,
-                auth=HTTPDigestAuth(
-                    self._config.hub_serial_number, self._config.api_key
-                ),
-                timeout=30,
-            )
-            results = r.json()
-            for x in results[f"U{zappi_id}"]:
-                rec = _create_usage_record(x)
+        days = ordered_map(
+            self._get_day,
+            period.range("days"),
+            workers=workers,
+            max_buffered=max_buffered_days,
+        )
+        for day in days:
+            with self._instrumentation.timed("structure_seconds", api="myenergi"):
+                records = [_create_usage_record(x) for x in day]
+            for rec in records:
                 if rec.interval_start >= start_utc and rec.interval_start < end_utc:
                     yield rec
 
+    def get_data_array(
+        self,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        *,
+        workers: int = 1,
+        max_buffered_days: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Gets the same records as `get_data`, as a single structured array of `ZAPPI_USAGE_DTYPE` sorted by
+        `interval_start`. `workers` and `max_buffered_days` are as for `get_data`.
+        """
+        assert self.is_connected
+
+        start_utc = start.set(tz="UTC")
+        end_utc = end.set(tz="UTC")
+        start_ts = int(start_utc.timestamp())
+        end_ts = int(end_utc.timestamp())
+        period = pendulum.interval(start_utc, end_utc)
+        days = ordered_map(
+            self._get_day,
+            period.range("days"),
+            workers=workers,
+            max_buffered=max_buffered_days,
+        )
+        arrays: list[np.ndarray] = []
+        for day in days:
+            with self._instrumentation.timed("structure_seconds", api="myenergi"):
+                arr = decode_usage_records(day)
+            ts = arr["interval_start"]
+            arrays.append(arr[(ts >= start_ts) & (ts < end_ts)])
+        if not arrays:
+            return np.zeros(0, dtype=ZAPPI_USAGE_DTYPE)
+        return np.concatenate(arrays)
+
+    def get_data_frame(
+        self,
+        start: pendulum.DateTime,
+        end: pendulum.DateTime,
+        *,
+        workers: int = 1,
+        max_buffered_days: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Gets the same records as `get_data_array`, as a DataFrame with a tz-aware (UTC) `interval_start` column.
+        """
+        arr = self.get_data_array(
+            start, end, workers=workers, max_buffered_days=max_buffered_days
+        )
+        return usage_array_to_frame(arr)
+
+    def get_day_array(self, day: datetime.date) -> np.ndarray:
+        """
+        Gets all the 1-minute usage records for a single (UTC) day with one API call, as a structured array of
+        `ZAPPI_USAGE_DTYPE` sorted by `interval_start`.
+        """
+        assert self.is_connected
+
+        day_start = pendulum.datetime(day.year, day.month, day.day, tz="UTC")
+        arr = decode_usage_records(self._get_day(day_start))
+        ts = arr["interval_start"]
+        start_ts = int(day_start.timestamp())
+        return arr[(ts >= start_ts) & (ts < start_ts + _SECONDS_PER_DAY)]
+
+    def _get_day(self, dt: pendulum.DateTime) -> list[dict[str, int]]:
+        zappi_id = self._config.hub_serial_number
+        url = f"{self._api_url}/{_day_path(zappi_id, dt)}"
+        if self._cache is not None:
+            day_end = pendulum.datetime(dt.year, dt.month, dt.day, tz="UTC").add(days=1)
+            fetched = False
+
+            def fetch() -> Any:
+                nonlocal fetched
+                fetched = True
+                return self._fetch(url)
+
+            results = self._cache.get_or_fetch(url, fetch, day_end)
+            self._instrumentation.count(
+                "cache_lookups_total",
+                api="myenergi",
+                result="miss" if fetched else "hit",
+            )
+        else:
+            results = self._fetch(url)
+        records = results[f"U{zappi_id}"]
+        self._instrumentation.count("pages_total", api="myenergi")
+        self._instrumentation.count("records_total", len(records), api="myenergi")
+        return records
+
+    def _fetch(self, url: str) -> Any:
+        started = time.perf_counter()
+        r = self._scheduler.send(
+            url, partial(self._session.get, url, auth=self._auth, timeout=30)
+        )
+        record_http_response(
+            self._instrumentation, "myenergi", r, time.perf_counter() - started
+        )
+        r.raise_for_status()
+        with self._instrumentation.timed("json_decode_seconds", api="myenergi"):
+            return r.json()
+
+    def close(self) -> None:
+        """Closes the reader's HTTP session, unless it was supplied by the caller."""
+        if self._owns_session:
+            self._session.close()
+
     @property
     def is_connected(self) -> bool:
         return self._host is not None
@@ -0,0 +1,242 @@
+import datetime
+import json
+import time
+from typing import Optional, Self
+
+import fastparquet
+import numpy as np
+import pandas as pd
+from attrs import define, field, validators
+from octopus_stats.concurrency import ordered_map
+from octopus_stats.instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from octopus_stats.rollups import RollupSettings, RollupStore
+from octopus_stats.storage_manager import StorageManager
+
+from zappi_stats.zappi_api_reader import (
+    ZAPPI_USAGE_DTYPE,
+    MyenergiApiConfig,
+    ZappiApiReader,
+    usage_array_to_frame,
+)
+
+_DAYS_MANIFEST = "_days.json"
+
+ENERGY_COLUMNS = ("imp", "gep", "exp", "h1b", "h2b", "h3b", "h1d", "h2d", "h3d")
+"""Columns of 1-minute energy (in joules), which are summed by the rollups"""
+
+
+@define(kw_only=True, frozen=True)
+class ZappiExporterSettings:
+    storage: StorageManager
+    start_date: datetime.date
+    """First (UTC) day to export"""
+    base_dir: str = "zappi"
+    """Directory under which each device's data is stored, in `{base_dir}/{serial}/YYYY/mm/dd.parquet`"""
+    settle_time: datetime.timedelta = datetime.timedelta(hours=1)
+    """How long after the end of a day it must be fetched for its data to be considered complete"""
+    workers: int = field(default=4, validator=[validators.ge(1)])
+    """Maximum number of days to fetch concurrently"""
+    instrumentation: Instrumentation = NULL_INSTRUMENTATION
+    """Receives the export's measurements, and those of the reader if the exporter creates it"""
+    rollups: bool = True
+    """Whether to keep hourly, daily and monthly rollups (by UTC time) of each device's energy up to date"""
+
+
+@define(kw_only=True)
+class DayStatus:
+    fetched_at: datetime.datetime
+    """When the day's data was fetched"""
+    records: int
+    complete: bool
+    """Whether the day had settled when it was fetched, so that its data will not change"""
+
+
+@define(kw_only=True)
+class DaysManifest:
+    """Per-day export state for a single device, keyed by ISO date."""
+
+    days: dict[str, DayStatus] = field(factory=dict)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "days": {
+                    day: {
+                        "fetched_at": status.fetched_at.isoformat(),
+                        "records": status.records,
+                        "complete": status.complete,
+                    }
+                    for (day, status) in sorted(self.days.items())
+                }
+            },
+            indent=2,
+        )
+
+    @classmethod
+    def from_json(cls, content: str) -> Self:
+        data = json.loads(content)
+        return cls(
+            days={
+                day: DayStatus(
+                    fetched_at=datetime.datetime.fromisoformat(status["fetched_at"]),
+                    records=status["records"],
+                    complete=status["complete"],
+                )
+                for (day, status) in data.get("days", {}).items()
+            }
+        )
+
+
+class ZappiExporter:
+    """
+    Exports Zappi 1-minute data to a store, one file per device and (UTC) day.
+
+    The exporter keeps track of which days are complete, i.e. were fetched after they had settled. Each export fetches
+    only the days that are missing or partial, including the current day, which is always partial.
+    """
+
+    def __init__(
+        self,
+        config: MyenergiApiConfig,
+        settings: ZappiExporterSettings,
+        reader: Optional[ZappiApiReader] = None,
+    ) -> None:
+        self._config = config
+        self._settings = settings
+        self._storage = settings.storage
+        self._reader = reader
+        self._owns_reader = reader is None
+        self._rollups = (
+            RollupStore(
+                settings.storage,
+                RollupSettings(
+                    base_dir=f"{self._device_dir()}/rollups",
+                    time_column="interval_start",
+                    value_columns=ENERGY_COLUMNS,
+                ),
+            )
+            if settings.rollups
+            else None
+        )
+
+    @property
+    def rollups(self) -> Optional[RollupStore]:
+        return self._rollups
+
+    def export(self, end_date: Optional[datetime.date] = None) -> list[datetime.date]:
+        """
+        Fetches and stores every missing or partial day from the configured start date up to `end_date` (default:
+        today), and returns the days that were fetched. A reader created by the exporter is closed afterwards.
+        """
+        days = self.find_days_to_fetch(end_date)
+        if not days:
+            return []
+
+        try:
+            self._export_days(days)
+        finally:
+            if self._owns_reader and self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        return days
+
+    def _export_days(self, days: list[datetime.date]) -> None:
+        started = time.perf_counter()
+        instrumentation = self._settings.instrumentation
+        reader = self._get_reader()
+
+        def fetch_day(
+            day: datetime.date,
+        ) -> tuple[datetime.date, datetime.datetime, np.ndarray]:
+            fetched_at = datetime.datetime.now(datetime.UTC)
+            return (day, fetched_at, reader.get_day_array(day))
+
+        if self._rollups is not None:
+            self._rollups.mark_dirty(days)
+        manifest = self._load_manifest()
+        fetched = ordered_map(fetch_day, days, workers=self._settings.workers)
+        for day, fetched_at, arr in fetched:
+            with instrumentation.timed("export_write_seconds", exporter="zappi"):
+                self._write_day(day, arr)
+            instrumentation.count("export_records_total", len(arr), exporter="zappi")
+            manifest.days[day.isoformat()] = DayStatus(
+                fetched_at=fetched_at,
+                records=len(arr),
+                complete=fetched_at >= self._day_end(day) + self._settings.settle_time,
+            )
+            self._save_manifest(manifest)
+        if self._rollups is not None:
+            with instrumentation.timed("rollup_seconds", exporter="zappi"):
+                self._rollups.refresh(self._load_days)
+        instrumentation.observe(
+            "export_seconds", time.perf_counter() - started, exporter="zappi"
+        )
+
+    def find_days_to_fetch(
+        self, end_date: Optional[datetime.date] = None
+    ) -> list[datetime.date]:
+        """Gets the days from the configured start date up to `end_date` (default: today) that are missing or partial."""
+        if end_date is None:
+            end_date = datetime.datetime.now(datetime.UTC).date()
+        manifest = self._load_manifest()
+        days: list[datetime.date] = []
+        day = self._settings.start_date
+        while day <= end_date:
+            status = manifest.days.get(day.isoformat())
+            if status is None or not status.complete:
+                days.append(day)
+            day += datetime.timedelta(days=1)
+        return days
+
+    def day_path(self, day: datetime.date) -> str:
+        return f"{self._device_dir()}/{day:%Y/%m/%d}.parquet"
+
+    def _write_day(self, day: datetime.date, arr: np.ndarray) -> None:
+        fastparquet.write(
+            self.day_path(day),
+            usage_array_to_frame(arr),
+            compression="SNAPPY",
+            open_with=self._storage.open_file,
+        )
+
+    def _load_days(self, days: list[datetime.date]) -> pd.DataFrame:
+        """Reads back the stored data of `days`, for the rollups."""
+        frames = [
+            fastparquet.ParquetFile(path, open_with=self._storage.open_file).to_pandas()
+            for day in days
+            if self._storage.file_exists(path := self.day_path(day))
+        ]
+        if not frames:
+            return usage_array_to_frame(np.zeros(0, dtype=ZAPPI_USAGE_DTYPE))
+        return pd.concat(frames, ignore_index=True)
+
+    def _load_manifest(self) -> DaysManifest:
+        try:
+            content = self._storage.read_file_contents(self._manifest_path())
+        except FileNotFoundError:
+            return DaysManifest()
+        return DaysManifest.from_json(content)
+
+    def _save_manifest(self, manifest: DaysManifest) -> None:
+        self._storage.write_file_contents(self._manifest_path(), manifest.to_json())
+
+    def _manifest_path(self) -> str:
+        return f"{self._device_dir()}/{_DAYS_MANIFEST}"
+
+    def _device_dir(self) -> str:
+        return f"{self._settings.base_dir}/{self._config.hub_serial_number}"
+
+    def _get_reader(self) -> ZappiApiReader:
+        if self._reader is None:
+            self._reader = ZappiApiReader(
+                self._config, instrumentation=self._settings.instrumentation
+            )
+        if not self._reader.is_connected:
+            self._reader.connect()
+        return self._reader
+
+    @staticmethod
+    def _day_end(day: datetime.date) -> datetime.datetime:
+        return datetime.datetime.combine(
+            day + datetime.timedelta(days=1), datetime.time(), tzinfo=datetime.UTC
+        )
@@ -0,0 +1,141 @@
+"""Generated, realistic inputs for the benchmarks."""
+
+import datetime
+from collections import defaultdict
+from io import BytesIO
+from typing import Any, BinaryIO, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+from octopus_stats.storage_manager import StorageManager
+
+_OCTO_PAGE_SIZE = 200
+_ZAPPI_FIELDS = ["imp", "gep", "exp", "h1b", "h2b", "h3b", "h1d", "h2d", "h3d"]
+
+
+def octopus_pages(
+    days: int, start: datetime.date = datetime.date(2021, 1, 1)
+) -> list[list[dict[str, Any]]]:
+    """
+    Generates the `results` of consumption pages covering `days` days of half-hourly records, as the API returns them:
+    200 records per page, with timestamps in UK local time (so including the clock changes).
+    """
+    starts = pd.date_range(
+        pd.Timestamp(start, tz="Europe/London"),
+        periods=days * 48,
+        freq="30min",
+    )
+    rng = np.random.default_rng(42)
+    consumption = np.round(rng.gamma(2.0, 0.15, len(starts)), 3)
+    records = [
+        {
+            "consumption": float(c),
+            "interval_start": s.isoformat(),
+            "interval_end": (s + pd.Timedelta(minutes=30)).isoformat(),
+        }
+        for (s, c) in zip(starts, consumption, strict=True)
+    ]
+    return [
+        records[i : i + _OCTO_PAGE_SIZE]
+        for i in range(0, len(records), _OCTO_PAGE_SIZE)
+    ]
+
+
+class FakeConsumptionApi:
+    """Stands in for `OctoAPIReader._call_api_raw`, serving pre-generated pages linked by `next` URLs."""
+
+    def __init__(self, pages: list[list[dict[str, Any]]]) -> None:
+        self._pages = pages
+
+    def __call__(self, url: str) -> dict[str, Any]:
+        page = int(parse_qs(urlsplit(url).query).get("page", ["0"])[0])
+        more = page + 1 < len(self._pages)
+        return {
+            "results": self._pages[page],
+            "next": f"https://api.octopus.energy/v1/next/?page={page + 1}"
+            if more
+            else None,
+        }
+
+
+def zappi_days(
+    days: int, start: datetime.date = datetime.date(2023, 1, 1)
+) -> list[list[dict[str, int]]]:
+    """
+    Generates the 1-minute records of `days` `cgi-jday` responses. As in real responses, zero-valued fields (including
+    the hour and minute of the first records of the day) are omitted.
+    """
+    rng = np.random.default_rng(42)
+    result: list[list[dict[str, int]]] = []
+    for i in range(days):
+        day = start + datetime.timedelta(days=i)
+        energy = rng.integers(0, 60_000, (1440, len(_ZAPPI_FIELDS)))
+        energy[energy < 20_000] = 0
+        volts = rng.integers(2300, 2500, 1440)
+        records: list[dict[str, int]] = []
+        for minute in range(1440):
+            rec = {"yr": day.year, "mon": day.month, "dom": day.day}
+            (hr, mn) = divmod(minute, 60)
+            if hr:
+                rec["hr"] = hr
+            if mn:
+                rec["min"] = mn
+            for key, value in zip(_ZAPPI_FIELDS, energy[minute], strict=True):
+                if value:
+                    rec[key] = int(value)
+            rec["v1"] = int(volts[minute])
+            rec["frq"] = 5000
+            records.append(rec)
+        result.append(records)
+    return result
+
+
+class MemoryStorageManager(StorageManager):
+    """An in-memory store, indexed by directory so that listing a directory doesn't scan every file."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._files: dict[str, bytes] = {}
+        self._dirs: defaultdict[str, set[str]] = defaultdict(set)
+
+    def read_file_contents(self, filepath: str) -> str:
+        return self._read(filepath).decode("utf-8")
+
+    def read_bytes(
+        self, filepath: str, offset: int = 0, length: Optional[int] = None
+    ) -> bytes:
+        content = self._read(filepath)
+        if offset < 0:
+            offset = max(len(content) + offset, 0)
+        return content[offset:] if length is None else content[offset : offset + length]
+
+    def get_file_size(self, filepath: str) -> int:
+        return len(self._read(filepath))
+
+    def open_file(self, filepath: str, mode: str = "rb") -> BinaryIO:
+        if mode != "rb":
+            raise NotImplementedError("Binary writes are not supported")
+        return BytesIO(self._read(filepath))
+
+    def make_dirs(self, dirpath: str) -> None:
+        pass
+
+    def write_file_contents(self, filepath: str, content: str) -> None:
+        self._files[filepath] = content.encode("utf-8")
+        parts = filepath.split("/")
+        for i in range(len(parts)):
+            self._dirs["/".join(parts[:i])].add(filepath)
+
+    def get_directory_listing(self, dirpath: str) -> list[str]:
+        return sorted(self._dirs.get(dirpath.rstrip("/"), ()))
+
+    def delete(self, filepath: str) -> None:
+        self._files.pop(filepath, None)
+        for paths in self._dirs.values():
+            paths.discard(filepath)
+
+    def _read(self, filepath: str) -> bytes:
+        if filepath not in self._files:
+            raise FileNotFoundError(filepath)
+        return self._files[filepath]
@@ -0,0 +1,100 @@
+"""Measures benchmarks, and saves and compares their results."""
+
+import datetime
+import gc
+import json
+import platform
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from attrs import asdict, define
+
+
+@define(kw_only=True)
+class BenchmarkResult:
+    name: str
+    records: int
+    """Number of records processed by each run"""
+    seconds: float
+    """Fastest run time"""
+    records_per_second: float
+    peak_bytes: int
+    """Peak memory allocated by a run, as traced by `tracemalloc`"""
+
+
+def measure(name: str, run: Callable[[], int], *, repeat: int = 3) -> BenchmarkResult:
+    """
+    Times `repeat` calls of `run`, which returns the number of records it processed, and then makes one more call with
+    memory tracing enabled (which slows it down) to find the peak memory use.
+    """
+    best = float("inf")
+    records = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        records = run()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name,
+        records=records,
+        seconds=best,
+        records_per_second=records / best if best else 0.0,
+        peak_bytes=peak,
+    )
+
+
+def save_results(path: Path, results: list[BenchmarkResult], scale: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = {
+        "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": scale,
+        "results": [asdict(r) for r in results],
+    }
+    path.write_text(json.dumps(content, indent=2), encoding="utf-8")
+
+
+def load_results(path: Path) -> tuple[str, list[BenchmarkResult]]:
+    """Loads the scale and results of a run saved by `save_results`."""
+    content = json.loads(path.read_text(encoding="utf-8"))
+    return (content["scale"], [BenchmarkResult(**r) for r in content["results"]])
+
+
+def find_regressions(
+    baseline: list[BenchmarkResult],
+    current: list[BenchmarkResult],
+    *,
+    threshold: float = 0.2,
+) -> list[str]:
+    """
+    Compares `current` with `baseline`, and describes each benchmark whose throughput has dropped, or whose peak memory
+    has grown, by more than `threshold` (as a fraction of the baseline).
+    """
+    previous = {r.name: r for r in baseline}
+    regressions: list[str] = []
+    for result in current:
+        before = previous.get(result.name)
+        if before is None:
+            continue
+        if result.records_per_second < before.records_per_second * (1 - threshold):
+            regressions.append(
+                f"{result.name}: {result.records_per_second:,.0f} records/s, was "
+                f"{before.records_per_second:,.0f}"
+            )
+        if result.peak_bytes > before.peak_bytes * (1 + threshold):
+            regressions.append(
+                f"{result.name}: peak {result.peak_bytes:,} bytes, was {before.peak_bytes:,}"
+            )
+    return regressions
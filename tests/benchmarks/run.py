@@ -0,0 +1,60 @@
+"""
+Runs the benchmark suite and saves the results as JSON, optionally comparing them with an earlier run, e.g.
+
+    poetry run benchmark --output results/after.json --baseline results/before.json
+"""
+
+import argparse
+import datetime
+import sys
+from pathlib import Path
+from typing import Optional
+
+from tests.benchmarks.harness import find_regressions, load_results, save_results
+from tests.benchmarks.suite import BENCHMARKS, SCALES, run_suite
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=list(SCALES), default="full")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Fractional slowdown or memory growth that counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(SCALES[args.scale], names=args.only, repeat=args.repeat)
+    for r in results:
+        print(  # noqa: T201
+            f"{r.name:<36} {r.records:>10,} records {r.records_per_second:>14,.0f}/s "
+            f"peak {r.peak_bytes / 2**20:>8.1f} MiB"
+        )
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.datetime.now(datetime.UTC).strftime("%Y%m%dT%H%M%SZ")
+        output = Path("benchmark-results") / f"{timestamp}.json"
+    save_results(output, results, args.scale)
+    print(f"Saved results to {output}")  # noqa: T201
+
+    if args.baseline is not None:
+        (baseline_scale, baseline) = load_results(args.baseline)
+        if baseline_scale != args.scale:
+            sys.exit(
+                f"The baseline was run at scale {baseline_scale}, not {args.scale}"
+            )
+        regressions = find_regressions(baseline, results, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")  # noqa: T201
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
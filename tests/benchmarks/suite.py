@@ -0,0 +1,192 @@
+"""The benchmarks of the parsing and transform hot paths."""
+
+import datetime
+import itertools
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from typing import Optional
+
+import pendulum
+import pytz
+from attrs import frozen
+from octopus_stats.consumption_frame import build_consumption_frame
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from octopus_stats.octo_exporter import (
+    MANIFEST_PATH,
+    ExportManifest,
+    OctoExporter,
+    OctoExporterSettings,
+)
+from octopus_stats.parquet_writer import ParquetWriterSettings, PartitionedParquetWriter
+from octopus_stats.storage_manager import StorageManager
+from zappi_stats.zappi_api_reader import _create_usage_record, decode_usage_records
+
+from tests.benchmarks.fixtures import (
+    FakeConsumptionApi,
+    MemoryStorageManager,
+    octopus_pages,
+    zappi_days,
+)
+from tests.benchmarks.harness import BenchmarkResult, measure
+
+
+@frozen(kw_only=True)
+class Scale:
+    octopus_days: int
+    """Days of half-hourly consumption for the Octopus benchmarks"""
+    zappi_days: int
+    """Days of 1-minute records for the Zappi benchmarks"""
+    manifest_partitions: int
+    """Partitions listed in the exporter's manifest"""
+    dataset_days: int
+    """Days of half-hourly consumption in the exporter's dataset, from which its manifest is rebuilt when missing"""
+
+
+SCALES = {
+    "full": Scale(
+        octopus_days=3 * 365,
+        zappi_days=30,
+        manifest_partitions=5 * 365,
+        dataset_days=365,
+    ),
+    "smoke": Scale(
+        octopus_days=7, zappi_days=1, manifest_partitions=10, dataset_days=3
+    ),
+}
+
+Benchmark = Callable[[Scale, Path], Callable[[], int]]
+"""Sets up a benchmark at a scale, in a scratch directory, and returns a function that runs it once"""
+
+
+def octo_structure_records(scale: Scale, _: Path) -> Callable[[], int]:
+    """`OctoAPIReader.get_consumption`, i.e. structuring raw results into `ConsumptionRecord`s"""
+    reader = OctoAPIReader(OctoAPIConfig(api_key="1234"))
+    reader._call_api_raw = FakeConsumptionApi(octopus_pages(scale.octopus_days))  # type: ignore[method-assign]
+    start = pendulum.datetime(2021, 1, 1, tz="UTC")
+
+    def run() -> int:
+        records = reader.get_consumption(
+            start=start,
+            end=start.add(days=scale.octopus_days),
+            mpan="12345",
+            serial_number="123456",
+        )
+        return sum(1 for _ in records)
+
+    return run
+
+
+def octo_build_frame(scale: Scale, _: Path) -> Callable[[], int]:
+    """`build_consumption_frame`, which builds the frames that the exporter and `download` write"""
+    pages = octopus_pages(scale.octopus_days)
+
+    def run() -> int:
+        return len(build_consumption_frame(pages))
+
+    return run
+
+
+def octo_write_parquet(scale: Scale, scratch: Path) -> Callable[[], int]:
+    """`PartitionedParquetWriter`, writing a consumption frame to a dataset partitioned by local date"""
+    frame = build_consumption_frame(octopus_pages(scale.octopus_days))
+    runs = itertools.count()
+
+    def run() -> int:
+        run_dir = scratch / f"parquet-{next(runs)}"
+        run_dir.mkdir()
+        storage = FileStorageManager(FileStorageSettings(base_dir=str(run_dir)))
+        with PartitionedParquetWriter(storage, ParquetWriterSettings()) as writer:
+            writer.write(frame)
+        return len(frame)
+
+    return run
+
+
+def zappi_create_usage_record(scale: Scale, _: Path) -> Callable[[], int]:
+    """`_create_usage_record`, i.e. one record object per minute"""
+    days = zappi_days(scale.zappi_days)
+
+    def run() -> int:
+        return sum(len([_create_usage_record(r) for r in day]) for day in days)
+
+    return run
+
+
+def zappi_decode_usage_records(scale: Scale, _: Path) -> Callable[[], int]:
+    """`decode_usage_records`, the vectorised alternative to `_create_usage_record`"""
+    days = zappi_days(scale.zappi_days)
+
+    def run() -> int:
+        return sum(len(decode_usage_records(day)) for day in days)
+
+    return run
+
+
+def exporter_next_start_date_manifest(scale: Scale, _: Path) -> Callable[[], int]:
+    """`OctoExporter._get_next_start_date` with a large manifest"""
+    storage = MemoryStorageManager()
+    first = datetime.date(2020, 1, 1)
+    partitions = [
+        f"date_local={first + datetime.timedelta(days=i):%Y-%m-%d}"
+        for i in range(scale.manifest_partitions)
+    ]
+    manifest = ExportManifest(
+        watermark=datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC),
+        partitions=partitions,
+    )
+    storage.write_file_contents(MANIFEST_PATH, manifest.to_json())
+    exporter = _create_exporter(storage)
+
+    def run() -> int:
+        assert exporter._get_next_start_date() is not None
+        return len(partitions)
+
+    return run
+
+
+def exporter_next_start_date_rebuild(scale: Scale, scratch: Path) -> Callable[[], int]:
+    """`OctoExporter._get_next_start_date` without a manifest, so that it has to rebuild it from the dataset"""
+    run_dir = scratch / "rebuild"
+    run_dir.mkdir()
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(run_dir)))
+    with PartitionedParquetWriter(storage, ParquetWriterSettings()) as writer:
+        writer.write(build_consumption_frame(octopus_pages(scale.dataset_days)))
+    exporter = _create_exporter(storage)
+
+    def run() -> int:
+        storage.delete(MANIFEST_PATH)
+        assert exporter._get_next_start_date() is not None
+        return scale.dataset_days * 48
+
+    return run
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    "octo_structure_records": octo_structure_records,
+    "octo_build_frame": octo_build_frame,
+    "octo_write_parquet": octo_write_parquet,
+    "zappi_create_usage_record": zappi_create_usage_record,
+    "zappi_decode_usage_records": zappi_decode_usage_records,
+    "exporter_next_start_date_manifest": exporter_next_start_date_manifest,
+    "exporter_next_start_date_rebuild": exporter_next_start_date_rebuild,
+}
+
+
+def run_suite(
+    scale: Scale, *, names: Optional[list[str]] = None, repeat: int = 3
+) -> list[BenchmarkResult]:
+    """Runs the named benchmarks (by default, all of them) at `scale`."""
+    results: list[BenchmarkResult] = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in names or list(BENCHMARKS):
+            run = BENCHMARKS[name](scale, Path(scratch))
+            results.append(measure(name, run, repeat=repeat))
+    return results
+
+
+def _create_exporter(storage: StorageManager) -> OctoExporter:
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    settings = OctoExporterSettings(storage=storage, tz=pytz.timezone("Europe/London"))
+    return OctoExporter(config, settings)
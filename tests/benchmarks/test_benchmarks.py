@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import attrs
+
+from tests.benchmarks.harness import find_regressions, load_results, save_results
+from tests.benchmarks.suite import BENCHMARKS, SCALES, run_suite
+
+
+def test_suite_runs_at_smoke_scale(tmp_path: Path) -> None:
+    # *** ACT ***
+    results = run_suite(SCALES["smoke"], repeat=1)
+    save_results(tmp_path / "results.json", results, "smoke")
+    (scale, loaded) = load_results(tmp_path / "results.json")
+
+    # *** ASSERT ***
+    assert [r.name for r in results] == list(BENCHMARKS)
+    assert all(r.records > 0 and r.records_per_second > 0 for r in results)
+    assert all(r.peak_bytes > 0 for r in results)
+    assert scale == "smoke"
+    assert loaded == results
+
+
+def test_find_regressions() -> None:
+    # *** ARRANGE ***
+    baseline = run_suite(SCALES["smoke"], names=["octo_build_frame"], repeat=1)
+    slower = attrs.evolve(
+        baseline[0], records_per_second=baseline[0].records_per_second / 2
+    )
+    bigger = attrs.evolve(baseline[0], peak_bytes=baseline[0].peak_bytes * 2)
+
+    # *** ACT / ASSERT ***
+    assert find_regressions(baseline, baseline) == []
+    assert "records/s" in find_regressions(baseline, [slower])[0]
+    assert "peak" in find_regressions(baseline, [bigger])[0]
@@ -0,0 +1,495 @@
+"""
+A local stand-in for the Octopus and myenergi APIs, for end-to-end and load tests of the readers and exporters.
+
+The server implements just enough of each API for the readers: the Octopus `consumption/` endpoint with its `next`
+page links and the `accounts/` endpoint, and the myenergi director's ASN redirect and the `cgi-jday` endpoint. The data
+is generated on the fly, deterministically, so the volume served is bounded only by the configured period. Latency,
+server errors and throttling (429s) can be injected into any response.
+
+The server listens on a single port on 127.0.0.1, and tells the two APIs apart by the URL: the Octopus API is under
+`/v1/`, and requests to `localhost` are the myenergi director, which redirects hubs to `127.0.0.1`.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import TracebackType
+from typing import Any, Optional, Self
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from zoneinfo import ZoneInfo
+
+from attrs import define, evolve, field, frozen, validators
+from octopus_stats.octo_api_reader import OctoAPIConfig
+from zappi_stats.zappi_api_reader import ASN_HEADER, MyenergiApiConfig
+
+_INTERVAL = datetime.timedelta(minutes=30)
+_LONDON = ZoneInfo("Europe/London")
+_REALM = "MyEnergi Telemetry"
+_API_HOST = "127.0.0.1"
+_DIRECTOR_HOST = "localhost"
+_CONSUMPTION_PATH = re.compile(
+    r"/v1/electricity-meter-points/(\w+)/meters/(\w+)/consumption/?"
+)
+_ACCOUNT_PATH = re.compile(r"/v1/accounts/([\w-]+)/?")
+_DAY_PATH = re.compile(r"/cgi-jday-Z(\d+)-(\d+)-(\d+)-(\d+)-(\d+)-(\d+)-(\d+)")
+_DIGEST_FIELD = re.compile(r'(\w+)=(?:"([^"]*)"|([^,\s]*))')
+_ZAPPI_FIELDS = ["imp", "gep", "exp", "h1d", "h1b"]
+
+
+@frozen(kw_only=True)
+class FakeApiSettings:
+    latency: datetime.timedelta = datetime.timedelta(0)
+    """Delay added to every response"""
+    latency_jitter: datetime.timedelta = datetime.timedelta(0)
+    """Maximum extra delay, chosen uniformly at random for each response"""
+    error_rate: float = field(
+        default=0.0, validator=[validators.ge(0), validators.le(1)]
+    )
+    """Fraction of authenticated requests that fail with a 500"""
+    throttle_rate: float = field(
+        default=0.0, validator=[validators.ge(0), validators.le(1)]
+    )
+    """Fraction of authenticated requests that are throttled with a 429"""
+    retry_after: Optional[datetime.timedelta] = datetime.timedelta(seconds=1)
+    """`Retry-After` of throttled responses; `None` to leave the header out"""
+    data_start: datetime.datetime = datetime.datetime(2023, 1, 1, tzinfo=datetime.UTC)
+    """Start of the data served by both APIs, on a half-hour boundary; also the start of the account's agreement"""
+    data_end: Optional[datetime.datetime] = None
+    """End of the data served by both APIs (default: the last whole half-hour before each request)"""
+    max_page_size: int = field(default=25_000, validator=[validators.ge(1)])
+    """Maximum number of consumption records per page, whatever the client asks for"""
+    zappi_records_per_day: int = field(
+        default=1440, validator=[validators.ge(0), validators.le(1440)]
+    )
+    """Number of 1-minute records served for each day, from midnight"""
+    seed: int = 0
+    """Seed for the choice of injected failures and latency jitter"""
+    octopus_api_key: str = "sk_test_fake"
+    account_number: str = "A-FAKE0001"
+    mpan: str = "1900000000001"
+    serial_number: str = "20L0000001"
+    other_meters: tuple[tuple[str, str], ...] = ()
+    """Further (mpan, serial number) pairs on the account, listed before the default meter above"""
+    hub_serial_number: str = "10000001"
+    myenergi_api_key: str = "fake-api-key"
+    check_auth: bool = True
+    """Whether to require Basic (Octopus) and Digest (myenergi) authentication"""
+
+
+@define(kw_only=True)
+class FakeApiStats:
+    requests: int = 0
+    """Requests received, including those that failed"""
+    records: int = 0
+    """Consumption and 1-minute records served"""
+    errors: int = 0
+    """Injected 500s"""
+    throttled: int = 0
+    """Injected 429s"""
+    unauthorized: int = 0
+    """401s, including the challenges that start each Digest authentication"""
+
+
+class FakeApiServer:
+    """
+    Serves both APIs from a background thread. Use it as a context manager, and point the readers at it with
+    `octopus_config` and `myenergi_config`.
+    """
+
+    def __init__(self, settings: Optional[FakeApiSettings] = None) -> None:
+        self.settings = settings if settings is not None else FakeApiSettings()
+        self._stats = FakeApiStats()
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.settings.seed)
+        self._httpd: Optional[_FakeHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._httpd = _FakeHTTPServer(self)
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="fake-api-server",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self._httpd = None
+        self._thread = None
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.stop()
+
+    @property
+    def port(self) -> int:
+        if self._httpd is None:
+            raise RuntimeError("The server is not running")
+        return self._httpd.server_address[1]
+
+    @property
+    def octopus_base_url(self) -> str:
+        return f"http://{_API_HOST}:{self.port}/v1/"
+
+    @property
+    def director_url(self) -> str:
+        return f"http://{_DIRECTOR_HOST}:{self.port}/"
+
+    def octopus_config(self, *, use_account: bool = False) -> OctoAPIConfig:
+        """A config for the server's meter, or for its account if `use_account` (so that the meter is looked up)."""
+        if use_account:
+            return OctoAPIConfig(
+                api_key=self.settings.octopus_api_key,
+                account_number=self.settings.account_number,
+                base_url=self.octopus_base_url,
+            )
+        return OctoAPIConfig(
+            api_key=self.settings.octopus_api_key,
+            mpan=self.settings.mpan,
+            serial_number=self.settings.serial_number,
+            base_url=self.octopus_base_url,
+        )
+
+    def myenergi_config(self) -> MyenergiApiConfig:
+        return MyenergiApiConfig(
+            hub_serial_number=self.settings.hub_serial_number,
+            api_key=self.settings.myenergi_api_key,
+            director_url=self.director_url,
+        )
+
+    @property
+    def stats(self) -> FakeApiStats:
+        """A snapshot of the statistics so far."""
+        with self._lock:
+            return evolve(self._stats)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = FakeApiStats()
+
+    def _count(self, **increments: int) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _data_end(self) -> datetime.datetime:
+        if self.settings.data_end is not None:
+            return self.settings.data_end
+        now = datetime.datetime.now(datetime.UTC)
+        return now - (now - self.settings.data_start) % _INTERVAL
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, api: FakeApiServer) -> None:
+        super().__init__((_API_HOST, 0), _Handler)
+        self.api = api
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep connections alive, as the real APIs do, so that the readers' connection pools are exercised
+    protocol_version = "HTTP/1.1"
+    server: _FakeHTTPServer
+
+    def do_GET(self) -> None:
+        api = self.server.api
+        api._count(requests=1)
+        delay = (
+            api.settings.latency + api.settings.latency_jitter * api._random()
+        ).total_seconds()
+        if delay > 0:
+            time.sleep(delay)
+
+        url = urlsplit(self.path)
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        if url.path.startswith("/v1/"):
+            self._handle_octopus(api, url.path, dict(parse_qsl(url.query)))
+        else:
+            self._handle_myenergi(api, host, url.path)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _handle_octopus(
+        self, api: FakeApiServer, path: str, query: dict[str, str]
+    ) -> None:
+        settings = api.settings
+        if settings.check_auth and not self._has_basic_auth(settings.octopus_api_key):
+            api._count(unauthorized=1)
+            self._send_json(
+                401, {"detail": "Authentication credentials were not provided."}
+            )
+            return
+        if self._inject_failure(api):
+            return
+
+        if m := _CONSUMPTION_PATH.fullmatch(path):
+            if m.groups() not in _meters(settings):
+                self._send_json(404, {"detail": "Not found."})
+                return
+            self._send_consumption_page(api, path, query)
+        elif m := _ACCOUNT_PATH.fullmatch(path):
+            if m.group(1) != settings.account_number:
+                self._send_json(404, {"detail": "Not found."})
+                return
+            self._send_json(200, _account(settings))
+        else:
+            self._send_json(404, {"detail": "Not found."})
+
+    def _handle_myenergi(self, api: FakeApiServer, host: str, path: str) -> None:
+        settings = api.settings
+        headers = {ASN_HEADER: _API_HOST}
+        if settings.check_auth and not self._has_digest_auth(
+            settings.hub_serial_number, settings.myenergi_api_key
+        ):
+            api._count(unauthorized=1)
+            nonce = f"{random.getrandbits(128):032x}"
+            challenge = (
+                f'Digest realm="{_REALM}", nonce="{nonce}", qop="auth", algorithm=MD5'
+            )
+            self._send_json(401, {}, {**headers, "WWW-Authenticate": challenge})
+            return
+        if self._inject_failure(api, headers):
+            return
+
+        # The director only ever redirects; the API host serves the data
+        m = _DAY_PATH.fullmatch(path)
+        if host == _DIRECTOR_HOST or m is None:
+            self._send_json(200, {}, headers)
+            return
+        (serial, year, month, day) = (m.group(1), *map(int, m.groups()[1:4]))
+        if serial != settings.hub_serial_number:
+            self._send_json(404, {}, headers)
+            return
+        records = _zappi_day(settings, api._data_end(), datetime.date(year, month, day))
+        api._count(records=len(records))
+        self._send_json(200, {f"U{serial}": records}, headers)
+
+    def _send_consumption_page(
+        self, api: FakeApiServer, path: str, query: dict[str, str]
+    ) -> None:
+        settings = api.settings
+        period_from = _parse_datetime(query.get("period_from"))
+        period_to = _parse_datetime(query.get("period_to"))
+        first = settings.data_start
+        if period_from is not None and period_from > first:
+            first += math.ceil((period_from - first) / _INTERVAL) * _INTERVAL
+        end = api._data_end()
+        if period_to is not None:
+            end = min(end, period_to)
+        count = max(math.ceil((end - first) / _INTERVAL), 0)
+
+        page_size = min(int(query.get("page_size", 100)), settings.max_page_size)
+        page = int(query.get("page", 1))
+        ascending = query.get("order_by") == "period"
+        indices = range((page - 1) * page_size, min(page * page_size, count))
+        results = [
+            _consumption_record(first + (i if ascending else count - 1 - i) * _INTERVAL)
+            for i in indices
+        ]
+        next_url = None
+        if page * page_size < count:
+            host = self.headers.get("Host")
+            next_url = f"http://{host}{path}?{urlencode({**query, 'page': page + 1})}"
+        api._count(records=len(results))
+        self._send_json(
+            200,
+            {
+                "count": count,
+                "next": next_url,
+                "previous": None,
+                "results": results,
+            },
+        )
+
+    def _inject_failure(
+        self, api: FakeApiServer, headers: Optional[dict[str, str]] = None
+    ) -> bool:
+        """Responds with an injected 429 or 500 (and returns `True`), according to the configured rates."""
+        settings = api.settings
+        roll = api._random()
+        if roll < settings.throttle_rate:
+            api._count(throttled=1)
+            headers = dict(headers or {})
+            if settings.retry_after is not None:
+                headers["Retry-After"] = str(
+                    math.ceil(settings.retry_after.total_seconds())
+                )
+            self._send_json(429, {"detail": "Request was throttled."}, headers)
+            return True
+        if roll < settings.throttle_rate + settings.error_rate:
+            api._count(errors=1)
+            self._send_json(500, {"detail": "Server error."}, headers)
+            return True
+        return False
+
+    def _has_basic_auth(self, api_key: str) -> bool:
+        expected = base64.b64encode(f"{api_key}:".encode()).decode()
+        return self.headers.get("Authorization") == f"Basic {expected}"
+
+    def _has_digest_auth(self, username: str, password: str) -> bool:
+        authorization = self.headers.get("Authorization") or ""
+        if not authorization.startswith("Digest "):
+            return False
+        fields = {
+            m.group(1): m.group(2) if m.group(2) is not None else m.group(3)
+            for m in _DIGEST_FIELD.finditer(authorization[len("Digest ") :])
+        }
+        if fields.get("username") != username or fields.get("uri") != self.path:
+            return False
+        ha1 = _md5(f"{username}:{fields.get('realm')}:{password}")
+        ha2 = _md5(f"GET:{fields['uri']}")
+        if fields.get("qop") == "auth":
+            expected = _md5(
+                f"{ha1}:{fields.get('nonce')}:{fields.get('nc')}:{fields.get('cnonce')}:auth:{ha2}"
+            )
+        else:
+            expected = _md5(f"{ha1}:{fields.get('nonce')}:{ha2}")
+        return fields.get("response") == expected
+
+    def _send_json(
+        self, status: int, body: Any, headers: Optional[dict[str, str]] = None
+    ) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    dt = datetime.datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.UTC)
+
+
+def _to_local_iso(dt: datetime.datetime) -> str:
+    """Formats `dt` as the Octopus API does: in UK local time, with `Z` rather than `+00:00` outside summer time."""
+    return dt.astimezone(_LONDON).isoformat().replace("+00:00", "Z")
+
+
+def _consumption_record(start: datetime.datetime) -> dict[str, Any]:
+    slot = int(start.timestamp()) // 1800
+    return {
+        "consumption": round(0.05 + (slot * 7919 % 1000) / 2000, 3),
+        "interval_start": _to_local_iso(start),
+        "interval_end": _to_local_iso(start + _INTERVAL),
+    }
+
+
+def _zappi_day(
+    settings: FakeApiSettings, data_end: datetime.datetime, day: datetime.date
+) -> list[dict[str, int]]:
+    """
+    Generates a day's 1-minute records, within the served period. As in real responses, zero-valued fields (including
+    the hour and minute of the first records of the day) are left out.
+    """
+    rng = random.Random(day.toordinal() * 1_000_003 + settings.seed)
+    midnight = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.UTC)
+    records: list[dict[str, int]] = []
+    for minute in range(settings.zappi_records_per_day):
+        start = midnight + datetime.timedelta(minutes=minute)
+        if start < settings.data_start or start >= data_end:
+            continue
+        rec = {"yr": day.year, "mon": day.month, "dom": day.day}
+        (hr, mn) = divmod(minute, 60)
+        if hr:
+            rec["hr"] = hr
+        if mn:
+            rec["min"] = mn
+        for key in _ZAPPI_FIELDS:
+            if (value := rng.randrange(-30_000, 60_000)) > 0:
+                rec[key] = value
+        rec["v1"] = rng.randrange(2300, 2500)
+        rec["frq"] = 5000
+        records.append(rec)
+    return records
+
+
+def _meters(settings: FakeApiSettings) -> list[tuple[str, str]]:
+    return [*settings.other_meters, (settings.mpan, settings.serial_number)]
+
+
+def _account(settings: FakeApiSettings) -> dict[str, Any]:
+    serial_numbers: dict[str, list[str]] = {}
+    for mpan, serial_number in _meters(settings):
+        serial_numbers.setdefault(mpan, []).append(serial_number)
+    return {
+        "number": settings.account_number,
+        "properties": [
+            {
+                "id": 1000001,
+                "moved_in_at": settings.data_start.isoformat(),
+                "moved_out_at": None,
+                "address_line_1": "1 Test Street",
+                "address_line_2": "",
+                "address_line_3": "",
+                "town": "TESTTOWN",
+                "county": "",
+                "postcode": "TE1 1ST",
+                "electricity_meter_points": [
+                    {
+                        "mpan": mpan,
+                        "profile_class": 1,
+                        "consumption_standard": 2900,
+                        "meters": [
+                            {
+                                "serial_number": serial_number,
+                                "registers": [
+                                    {
+                                        "identifier": "1",
+                                        "rate": "STANDARD",
+                                        "is_settlement_register": True,
+                                    }
+                                ],
+                            }
+                            for serial_number in serials
+                        ],
+                        "agreements": [
+                            {
+                                "tariff_code": "E-1R-AGILE-FLEX-22-11-25-C",
+                                "valid_from": settings.data_start.isoformat(),
+                                "valid_to": None,
+                            }
+                        ],
+                    }
+                    for (mpan, serials) in serial_numbers.items()
+                ],
+            }
+        ],
+    }
+
+
+def _md5(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()  # noqa: S324
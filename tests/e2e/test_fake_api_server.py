@@ -0,0 +1,165 @@
+import datetime
+import itertools
+from collections.abc import Generator
+from pathlib import Path
+
+import pendulum
+import pytest
+import pytz
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.octo_api_reader import OctoAPIReader
+from octopus_stats.octo_exporter import OctoExporter, OctoExporterSettings
+from zappi_stats.zappi_api_reader import ZappiApiReader
+
+from tests.e2e.fake_api_server import FakeApiServer, FakeApiSettings
+from tests.e2e.throughput import TARGETS, LoadTestScale, run_load_test
+from tests.octopus_stats.conftest import create_fast_scheduler
+
+_DATA_START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+_DATA_END = datetime.datetime(2024, 1, 11, tzinfo=datetime.UTC)
+
+
+@pytest.fixture()
+def server() -> Generator[FakeApiServer, None, None]:
+    settings = FakeApiSettings(
+        data_start=_DATA_START, data_end=_DATA_END, max_page_size=100
+    )
+    with FakeApiServer(settings) as server:
+        yield server
+
+
+def test_octo_reader_follows_pages(server: FakeApiServer) -> None:
+    # *** ARRANGE ***
+    sut = OctoAPIReader(server.octopus_config(), scheduler=create_fast_scheduler())
+
+    # *** ACT ***
+    records = list(
+        sut.get_consumption(
+            start=pendulum.instance(_DATA_START),
+            end=pendulum.instance(_DATA_END),
+            mpan=server.settings.mpan,
+            serial_number=server.settings.serial_number,
+        )
+    )
+
+    # *** ASSERT ***
+    assert len(records) == 10 * 48
+    assert records[0].interval_start == _DATA_START
+    assert all(
+        a.interval_end == b.interval_start for (a, b) in itertools.pairwise(records)
+    )
+    assert server.stats.requests == 5
+
+
+def test_octo_reader_is_rejected_without_the_api_key(server: FakeApiServer) -> None:
+    # *** ARRANGE ***
+    config = server.octopus_config()
+    sut = OctoAPIReader(
+        type(config)(
+            api_key="wrong", mpan="1234", serial_number="5678", base_url=config.base_url
+        ),
+        scheduler=create_fast_scheduler(),
+    )
+
+    # *** ACT / ASSERT ***
+    with pytest.raises(Exception, match="401"):
+        list(
+            sut.get_consumption(
+                start=pendulum.instance(_DATA_START), mpan="1234", serial_number="5678"
+            )
+        )
+
+
+def test_zappi_reader_follows_director(server: FakeApiServer) -> None:
+    # *** ARRANGE ***
+    sut = ZappiApiReader(server.myenergi_config(), scheduler=create_fast_scheduler())
+
+    # *** ACT ***
+    sut.connect()
+    arr = sut.get_data_array(
+        pendulum.instance(_DATA_START), pendulum.instance(_DATA_START).add(days=2)
+    )
+
+    # *** ASSERT ***
+    assert sut.connected_host == "127.0.0.1"
+    assert len(arr) == 2 * 1440
+    assert server.stats.unauthorized > 0
+
+
+def test_exporter_finds_meter_from_account(
+    server: FakeApiServer, tmp_path: Path
+) -> None:
+    # *** ARRANGE ***
+    config = server.octopus_config(use_account=True)
+    settings = OctoExporterSettings(
+        storage=FileStorageManager(FileStorageSettings(base_dir=str(tmp_path))),
+        tz=pytz.timezone("Europe/London"),
+    )
+    sut = OctoExporter(
+        config, settings, OctoAPIReader(config, scheduler=create_fast_scheduler())
+    )
+
+    # *** ACT ***
+    sut.export(full=True)
+
+    # *** ASSERT ***
+    assert server.stats.records == 10 * 48
+    assert len(list(tmp_path.glob("consumption.parquet/date_local=*"))) == 10
+
+
+def test_readers_recover_from_injected_failures() -> None:
+    # *** ARRANGE ***
+    settings = FakeApiSettings(
+        data_start=_DATA_START,
+        data_end=_DATA_END,
+        max_page_size=48,
+        error_rate=0.2,
+        throttle_rate=0.2,
+        retry_after=datetime.timedelta(0),
+        zappi_records_per_day=60,
+        seed=1,
+    )
+
+    # *** ACT ***
+    with FakeApiServer(settings) as server:
+        octo = OctoAPIReader(server.octopus_config(), scheduler=create_fast_scheduler())
+        records = list(
+            octo.get_consumption(
+                start=pendulum.instance(_DATA_START),
+                mpan=settings.mpan,
+                serial_number=settings.serial_number,
+            )
+        )
+        zappi = ZappiApiReader(
+            server.myenergi_config(), scheduler=create_fast_scheduler()
+        )
+        zappi.connect()
+        arr = zappi.get_data_array(
+            pendulum.instance(_DATA_START), pendulum.instance(_DATA_END), workers=4
+        )
+        stats = server.stats
+
+    # *** ASSERT ***
+    assert len(records) == 10 * 48
+    assert len(arr) == 10 * 60
+    assert stats.errors > 0
+    assert stats.throttled > 0
+
+
+def test_load_test_reports_every_target() -> None:
+    # *** ARRANGE ***
+    scale = LoadTestScale(octopus_days=3, zappi_days=2, workers=2)
+
+    # *** ACT ***
+    results = run_load_test(
+        "clean",
+        server_settings=FakeApiSettings(zappi_records_per_day=60),
+        scale=scale,
+    )
+
+    # *** ASSERT ***
+    assert [r.target for r in results] == list(TARGETS)
+    assert all(r.records > 0 and r.records_per_second > 0 for r in results)
+    by_target = {r.target: r.records for r in results}
+    assert by_target["octo_reader"] == by_target["octo_exporter"] == 3 * 48
+    assert by_target["zappi_reader"] == by_target["zappi_exporter"] == 2 * 60
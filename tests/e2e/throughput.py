@@ -0,0 +1,287 @@
+"""
+Measures download throughput of the readers and exporters against the local stand-in API server, e.g.
+
+    poetry run load-test --scenario flaky --octopus-days 90 --output results/flaky.json
+"""
+
+import argparse
+import datetime
+import json
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Optional
+
+import pendulum
+import pytz
+from attrs import asdict, define, evolve, frozen
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.octo_api_reader import OctoAPIReader
+from octopus_stats.octo_exporter import OctoExporter, OctoExporterSettings
+from octopus_stats.request_scheduler import RequestScheduler, RequestSchedulerSettings
+from zappi_stats.zappi_api_reader import ZappiApiReader
+from zappi_stats.zappi_exporter import ZappiExporter, ZappiExporterSettings
+
+from tests.e2e.fake_api_server import FakeApiServer, FakeApiSettings
+
+SCENARIOS = {
+    "clean": FakeApiSettings(),
+    "latency": FakeApiSettings(
+        latency=datetime.timedelta(milliseconds=50),
+        latency_jitter=datetime.timedelta(milliseconds=50),
+    ),
+    "flaky": FakeApiSettings(
+        latency=datetime.timedelta(milliseconds=20),
+        latency_jitter=datetime.timedelta(milliseconds=20),
+        error_rate=0.05,
+        throttle_rate=0.05,
+        retry_after=None,
+    ),
+}
+
+# The real APIs' rate limits would dominate the results, so the readers are given much higher ones
+DEFAULT_SCHEDULER = RequestSchedulerSettings(
+    requests_per_second=1000.0,
+    burst=100,
+    backoff_base=datetime.timedelta(milliseconds=50),
+)
+
+
+@frozen(kw_only=True)
+class LoadTestScale:
+    octopus_days: int = 90
+    """Days of half-hourly consumption to download"""
+    zappi_days: int = 7
+    """Days of 1-minute records to download"""
+    workers: int = 4
+    """Concurrent requests, for the targets that make them"""
+
+
+@define(kw_only=True)
+class ThroughputResult:
+    scenario: str
+    target: str
+    records: int
+    """Records downloaded"""
+    requests: int
+    """Requests received by the server, including failed ones and authentication challenges"""
+    errors: int
+    throttled: int
+    seconds: float
+    records_per_second: float
+
+
+@frozen(kw_only=True)
+class _Context:
+    server: FakeApiServer
+    scale: LoadTestScale
+    scheduler: RequestSchedulerSettings
+    scratch: Path
+
+
+Target = Callable[[_Context], int]
+"""Downloads from the server once, and returns the number of records downloaded"""
+
+
+def octo_reader(ctx: _Context) -> int:
+    """`OctoAPIReader.get_consumption`, following the `next` links page by page"""
+    (start, end) = _octopus_period(ctx)
+    reader = OctoAPIReader(
+        ctx.server.octopus_config(), scheduler=RequestScheduler(ctx.scheduler)
+    )
+    try:
+        records = reader.get_consumption(
+            start=start,
+            end=end,
+            mpan=ctx.server.settings.mpan,
+            serial_number=ctx.server.settings.serial_number,
+        )
+        return sum(1 for _ in records)
+    finally:
+        reader.close()
+
+
+def octo_reader_sharded(ctx: _Context) -> int:
+    """`OctoAPIReader.get_consumption_sharded`, paging through weekly windows concurrently"""
+    (start, end) = _octopus_period(ctx)
+    reader = OctoAPIReader(
+        ctx.server.octopus_config(), scheduler=RequestScheduler(ctx.scheduler)
+    )
+    try:
+        records = reader.get_consumption_sharded(
+            start=start,
+            end=end,
+            mpan=ctx.server.settings.mpan,
+            serial_number=ctx.server.settings.serial_number,
+            window=datetime.timedelta(days=7),
+            workers=ctx.scale.workers,
+        )
+        return sum(1 for _ in records)
+    finally:
+        reader.close()
+
+
+def zappi_reader(ctx: _Context) -> int:
+    """`ZappiApiReader.get_data_array`, fetching days concurrently"""
+    end = pendulum.instance(_data_end())
+    reader = ZappiApiReader(
+        ctx.server.myenergi_config(), scheduler=RequestScheduler(ctx.scheduler)
+    )
+    try:
+        reader.connect()
+        arr = reader.get_data_array(
+            end.subtract(days=ctx.scale.zappi_days), end, workers=ctx.scale.workers
+        )
+        return len(arr)
+    finally:
+        reader.close()
+
+
+def octo_exporter(ctx: _Context) -> int:
+    """A full `OctoExporter` export of the account, into a fresh directory"""
+    config = ctx.server.octopus_config(use_account=True)
+    reader = OctoAPIReader(config, scheduler=RequestScheduler(ctx.scheduler))
+    settings = OctoExporterSettings(
+        storage=_create_storage(ctx.scratch / "octopus"),
+        tz=pytz.timezone("Europe/London"),
+    )
+    try:
+        OctoExporter(config, settings, reader).export(full=True)
+    finally:
+        reader.close()
+    # The exporter doesn't report how many records it wrote, but writes every one it downloads
+    return ctx.server.stats.records
+
+
+def zappi_exporter(ctx: _Context) -> int:
+    """A `ZappiExporter` export of every day, into a fresh directory"""
+    last_day = _data_end().date() - datetime.timedelta(days=1)
+    config = ctx.server.myenergi_config()
+    reader = ZappiApiReader(config, scheduler=RequestScheduler(ctx.scheduler))
+    settings = ZappiExporterSettings(
+        storage=_create_storage(ctx.scratch / "zappi"),
+        start_date=last_day - datetime.timedelta(days=ctx.scale.zappi_days - 1),
+        workers=ctx.scale.workers,
+    )
+    try:
+        ZappiExporter(config, settings, reader).export(last_day)
+    finally:
+        reader.close()
+    return ctx.server.stats.records
+
+
+TARGETS: dict[str, Target] = {
+    "octo_reader": octo_reader,
+    "octo_reader_sharded": octo_reader_sharded,
+    "zappi_reader": zappi_reader,
+    "octo_exporter": octo_exporter,
+    "zappi_exporter": zappi_exporter,
+}
+
+
+def run_load_test(
+    scenario: str,
+    *,
+    server_settings: Optional[FakeApiSettings] = None,
+    scale: Optional[LoadTestScale] = None,
+    scheduler: RequestSchedulerSettings = DEFAULT_SCHEDULER,
+    names: Optional[list[str]] = None,
+) -> list[ThroughputResult]:
+    """
+    Runs the named targets (by default, all of them) once each against a server configured as in `scenario`, or with
+    `server_settings` if given. Each target starts with a fresh scheduler and store, and its own server statistics.
+    """
+    scale = scale if scale is not None else LoadTestScale()
+    settings = server_settings if server_settings is not None else SCENARIOS[scenario]
+    (data_start, data_end) = _data_period(scale)
+    settings = evolve(settings, data_start=data_start, data_end=data_end)
+
+    results: list[ThroughputResult] = []
+    with tempfile.TemporaryDirectory() as scratch, FakeApiServer(settings) as server:
+        for name in names or list(TARGETS):
+            target_dir = Path(scratch) / name
+            target_dir.mkdir()
+            ctx = _Context(
+                server=server, scale=scale, scheduler=scheduler, scratch=target_dir
+            )
+            server.reset_stats()
+            start = time.perf_counter()
+            records = TARGETS[name](ctx)
+            seconds = time.perf_counter() - start
+            stats = server.stats
+            results.append(
+                ThroughputResult(
+                    scenario=scenario,
+                    target=name,
+                    records=records,
+                    requests=stats.requests,
+                    errors=stats.errors,
+                    throttled=stats.throttled,
+                    seconds=seconds,
+                    records_per_second=records / seconds if seconds else 0.0,
+                )
+            )
+    return results
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scenario", choices=list(SCENARIOS), nargs="+", default=list(SCENARIOS)
+    )
+    parser.add_argument("--only", nargs="+", choices=list(TARGETS))
+    parser.add_argument(
+        "--octopus-days", type=int, default=LoadTestScale().octopus_days
+    )
+    parser.add_argument("--zappi-days", type=int, default=LoadTestScale().zappi_days)
+    parser.add_argument("--workers", type=int, default=LoadTestScale().workers)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args(argv)
+
+    scale = LoadTestScale(
+        octopus_days=args.octopus_days,
+        zappi_days=args.zappi_days,
+        workers=args.workers,
+    )
+    results: list[ThroughputResult] = []
+    for scenario in args.scenario:
+        results.extend(run_load_test(scenario, scale=scale, names=args.only))
+    for r in results:
+        print(  # noqa: T201
+            f"{r.scenario:<8} {r.target:<20} {r.records:>9,} records "
+            f"{r.records_per_second:>10,.0f}/s {r.requests:>6,} requests "
+            f"({r.errors} errors, {r.throttled} throttled)"
+        )
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(
+            json.dumps([asdict(r) for r in results], indent=2), encoding="utf-8"
+        )
+
+
+def _data_period(scale: LoadTestScale) -> tuple[datetime.datetime, datetime.datetime]:
+    """The period served, which covers the longest download of any target, and ends at the start of today (UTC)."""
+    end = _data_end()
+    days = max(scale.octopus_days, scale.zappi_days)
+    return (end - datetime.timedelta(days=days), end)
+
+
+def _data_end() -> datetime.datetime:
+    today = datetime.datetime.now(datetime.UTC).date()
+    return datetime.datetime.combine(today, datetime.time(), tzinfo=datetime.UTC)
+
+
+def _octopus_period(ctx: _Context) -> tuple[pendulum.DateTime, pendulum.DateTime]:
+    end = pendulum.instance(_data_end())
+    return (end.subtract(days=ctx.scale.octopus_days), end)
+
+
+def _create_storage(path: Path) -> FileStorageManager:
+    path.mkdir()
+    return FileStorageManager(FileStorageSettings(base_dir=str(path)))
+
+
+if __name__ == "__main__":
+    main()
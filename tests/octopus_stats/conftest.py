@@ -0,0 +1,50 @@
+import datetime
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+from octopus_stats.consumption_frame import build_consumption_frame
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.parquet_writer import ParquetWriterSettings, PartitionedParquetWriter
+from octopus_stats.request_scheduler import RequestScheduler, RequestSchedulerSettings
+from octopus_stats.storage_manager import StorageManager
+
+
+def consumption_days(
+    day: datetime.date, days: int, consumption: float = 0.5
+) -> pd.DataFrame:
+    """A consumption frame of the half-hours of `days` days from the start of `day` (UTC), each consuming the same."""
+    start = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.UTC)
+    interval = datetime.timedelta(minutes=30)
+    results: list[dict[str, Any]] = [
+        {
+            "consumption": consumption,
+            "interval_start": (start + i * interval).isoformat(),
+            "interval_end": (start + (i + 1) * interval).isoformat(),
+        }
+        for i in range(days * 48)
+    ]
+    return build_consumption_frame([results])
+
+
+def append_to_dataset(storage: StorageManager, consumption: pd.DataFrame) -> None:
+    """Appends the consumption to the exported dataset, as an export would."""
+    with PartitionedParquetWriter(storage, ParquetWriterSettings()) as writer:
+        writer.write(consumption)
+
+
+def create_fast_scheduler() -> RequestScheduler:
+    # Don't let rate limits or backoff slow the tests down
+    return RequestScheduler(
+        RequestSchedulerSettings(
+            requests_per_second=10_000,
+            burst=100,
+            backoff_base=datetime.timedelta(milliseconds=1),
+        )
+    )
+
+
+@pytest.fixture()
+def storage(tmp_path: Path) -> FileStorageManager:
+    return FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
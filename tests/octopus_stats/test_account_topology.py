@@ -0,0 +1,154 @@
+import datetime
+from pathlib import Path
+from typing import Any
+
+import pendulum
+import pytest
+import time_machine
+from octopus_stats.account_topology import (
+    AccountTopology,
+    TopologyCache,
+    TopologyCacheSettings,
+)
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+
+_ACCOUNT = {
+    "number": "A-1234",
+    "properties": [
+        {
+            "id": 1,
+            "electricity_meter_points": [
+                {
+                    "mpan": "1000",
+                    "meters": [{"serial_number": "S1"}],
+                    "agreements": [
+                        {
+                            "tariff_code": "E-1R-OLD",
+                            "valid_from": "2020-01-01T00:00:00Z",
+                            "valid_to": "2022-01-01T00:00:00Z",
+                        }
+                    ],
+                }
+            ],
+        },
+        {
+            "id": 2,
+            "electricity_meter_points": [
+                {
+                    "mpan": "2000",
+                    "meters": [{"serial_number": "S2"}, {"serial_number": "S3"}],
+                    "agreements": [
+                        {
+                            "tariff_code": "E-1R-NEW",
+                            "valid_from": "2022-01-01T00:00:00Z",
+                            "valid_to": None,
+                        }
+                    ],
+                }
+            ],
+        },
+    ],
+}
+
+
+@pytest.fixture()
+def fake_account_api(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    fetched: list[str] = []
+
+    def fake_call_api_raw(_self: OctoAPIReader, url: str) -> Any:
+        fetched.append(url)
+        if "/accounts/" in url:
+            return _ACCOUNT
+        return {"results": [], "next": None}
+
+    monkeypatch.setattr(OctoAPIReader, "_call_api_raw", fake_call_api_raw)
+    return fetched
+
+
+def test_topology_from_api() -> None:
+    # *** ACT ***
+    sut = AccountTopology.from_api(_ACCOUNT, datetime.datetime.now(datetime.UTC))
+
+    # *** ASSERT ***
+    assert [mp.mpan for mp in sut.meter_points] == ["1000", "2000"]
+    assert sut.default_meter == ("2000", "S3")
+    meter_point = sut.find_meter_point("1000")
+    assert meter_point is not None
+    assert meter_point.agreements[0].tariff_code == "E-1R-OLD"
+    assert meter_point.agreements[0].valid_to == datetime.datetime(
+        2022, 1, 1, tzinfo=datetime.UTC
+    )
+
+
+@time_machine.travel("2024-01-10 12:00 +0000", tick=False)
+def test_repeated_consumption_calls_fetch_account_once(
+    fake_account_api: list[str],
+) -> None:
+    # *** ARRANGE ***
+    sut = OctoAPIReader(OctoAPIConfig(api_key="1234"))
+
+    # *** ACT ***
+    for day in range(1, 4):
+        list(
+            sut.get_consumption(
+                start=pendulum.datetime(2024, 1, day, tz="UTC"),
+                end=pendulum.datetime(2024, 1, day + 1, tz="UTC"),
+                account_number="A-1234",
+            )
+        )
+
+    # *** ASSERT ***
+    account_calls = [url for url in fake_account_api if "/accounts/" in url]
+    assert len(account_calls) == 1
+    assert all(
+        "/electricity-meter-points/2000/meters/S3/" in url
+        for url in fake_account_api
+        if "/accounts/" not in url
+    )
+
+
+@time_machine.travel("2024-01-10 12:00 +0000", tick=False)
+def test_topology_expires_and_can_be_invalidated(fake_account_api: list[str]) -> None:
+    # *** ARRANGE ***
+    cache = TopologyCache(TopologyCacheSettings(ttl=datetime.timedelta(hours=1)))
+    sut = OctoAPIReader(OctoAPIConfig(api_key="1234"), topology_cache=cache)
+
+    # *** ACT ***
+    sut.get_account_topology("A-1234")
+    sut.get_account_topology("A-1234")
+    with time_machine.travel("2024-01-10 13:00 +0000", tick=False):
+        sut.get_account_topology("A-1234")
+    sut.invalidate_topology("A-1234")
+    sut.get_account_topology("A-1234")
+    sut.get_account_topology("A-1234", refresh=True)
+
+    # *** ASSERT ***
+    assert len(fake_account_api) == 4
+
+
+def test_topology_persists_to_disk(tmp_path: Path, fake_account_api: list[str]) -> None:
+    # *** ARRANGE ***
+    settings = TopologyCacheSettings(cache_dir=str(tmp_path))
+    first = OctoAPIReader(
+        OctoAPIConfig(api_key="1234"), topology_cache=TopologyCache(settings)
+    )
+    expected = first.get_account_topology("A-1234")
+
+    # *** ACT ***
+    second = OctoAPIReader(
+        OctoAPIConfig(api_key="1234"), topology_cache=TopologyCache(settings)
+    )
+    actual = second.get_account_topology("A-1234")
+
+    # *** ASSERT ***
+    assert actual == expected
+    assert len(fake_account_api) == 1
+
+
+def test_record_classes_still_importable_from_reader() -> None:
+    # *** ACT ***
+    from octopus_stats import octo_api_models, octo_api_reader
+
+    # *** ASSERT ***
+    for name in ["Account", "Agreement", "ElectricityMeterPoint", "Property"]:
+        assert getattr(octo_api_reader, name) is getattr(octo_api_models, name)
@@ -0,0 +1,200 @@
+import asyncio
+import datetime
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+import pendulum
+import pytest
+from octopus_stats.async_octo_api_reader import AsyncOctoAPIReader
+from octopus_stats.octo_api_reader import OctoAPIConfig
+from octopus_stats.request_scheduler import RequestScheduler, RequestSchedulerSettings
+from octopus_stats.response_cache import ResponseCache, ResponseCacheSettings
+
+
+class FakeOctopusApi:
+    """
+    Serves one page per day of consumption for any meter, after a short delay, keeping track of how many requests are
+    running at once.
+    """
+
+    def __init__(self, delay: float = 0.01) -> None:
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        params = request.url.params
+        period_from = datetime.datetime.fromisoformat(params["period_from"])
+        period_to = datetime.datetime.fromisoformat(params["period_to"])
+        day = period_from + datetime.timedelta(days=int(params.get("page", "0")))
+        results = [
+            {
+                "consumption": float(day.day),
+                "interval_start": day.isoformat(),
+                "interval_end": (day + datetime.timedelta(minutes=30)).isoformat(),
+            }
+        ]
+        more = day + datetime.timedelta(days=1) < period_to
+        next_url = (
+            str(
+                request.url.copy_merge_params(
+                    {"page": int(params.get("page", "0")) + 1}
+                )
+            )
+            if more
+            else None
+        )
+        return httpx.Response(200, json={"results": results, "next": next_url})
+
+
+class ThreadRecordingCache(ResponseCache):
+    """Records the threads that the cache is used on."""
+
+    def __init__(self, settings: ResponseCacheSettings) -> None:
+        super().__init__(settings)
+        self.threads: set[int] = set()
+
+    def get(self, url: str) -> Optional[Any]:
+        self.threads.add(threading.get_ident())
+        return super().get(url)
+
+    def put(self, url: str, body: Any, period_end: Optional[datetime.datetime]) -> None:
+        self.threads.add(threading.get_ident())
+        super().put(url, body, period_end)
+
+
+def _create_reader(
+    client: httpx.AsyncClient,
+    max_concurrency: int = 4,
+    cache: Optional[ResponseCache] = None,
+) -> AsyncOctoAPIReader:
+    config = OctoAPIConfig(api_key="1234")
+    # Don't let rate limits slow the tests down
+    scheduler = RequestScheduler(
+        RequestSchedulerSettings(requests_per_second=10_000, burst=100)
+    )
+    return AsyncOctoAPIReader(
+        config,
+        client=client,
+        max_concurrency=max_concurrency,
+        scheduler=scheduler,
+        cache=cache,
+    )
+
+
+def test_get_consumption_follows_pages() -> None:
+    # *** ARRANGE ***
+    api = FakeOctopusApi()
+
+    async def read() -> list[float]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client)
+            return [
+                r.consumption
+                async for r in sut.get_consumption(
+                    start=pendulum.datetime(2024, 1, 1, tz="UTC"),
+                    end=pendulum.datetime(2024, 1, 4, tz="UTC"),
+                    mpan="12345",
+                    serial_number="123456",
+                )
+            ]
+
+    # *** ACT ***
+    consumption = asyncio.run(read())
+
+    # *** ASSERT ***
+    assert consumption == [1.0, 2.0, 3.0]
+
+
+def test_uses_cache_off_event_loop(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    api = FakeOctopusApi()
+    cache = ThreadRecordingCache(ResponseCacheSettings(cache_dir=str(tmp_path)))
+    loop_threads: set[int] = set()
+
+    async def read() -> list[float]:
+        loop_threads.add(threading.get_ident())
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client, cache=cache)
+            return [
+                r.consumption
+                async for r in sut.get_consumption(
+                    start=pendulum.datetime(2024, 1, 1, tz="UTC"),
+                    end=pendulum.datetime(2024, 1, 3, tz="UTC"),
+                    mpan="12345",
+                    serial_number="123456",
+                )
+            ]
+
+    # *** ACT ***
+    fetched = asyncio.run(read())
+    cached = asyncio.run(read())
+
+    # *** ASSERT ***
+    assert fetched == cached == [1.0, 2.0]
+    assert cache.stats.hits == 2
+    assert cache.threads
+    assert not cache.threads & loop_threads
+
+
+def test_concurrent_meters_share_limit() -> None:
+    # *** ARRANGE ***
+    api = FakeOctopusApi()
+
+    async def read_meter(sut: AsyncOctoAPIReader, mpan: str) -> int:
+        records = sut.get_consumption(
+            start=pendulum.datetime(2024, 1, 1, tz="UTC"),
+            end=pendulum.datetime(2024, 1, 6, tz="UTC"),
+            mpan=mpan,
+            serial_number="123456",
+        )
+        return len([r async for r in records])
+
+    async def read() -> list[int]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client, max_concurrency=3)
+            return await asyncio.gather(
+                *(read_meter(sut, f"mpan{i}") for i in range(10))
+            )
+
+    # *** ACT ***
+    counts = asyncio.run(read())
+
+    # *** ASSERT ***
+    assert counts == [5] * 10
+    assert api.max_in_flight == 3
+
+
+def test_cancellation_cancels_request() -> None:
+    # *** ARRANGE ***
+    api = FakeOctopusApi(delay=10)
+
+    async def read() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client)
+            records = sut.get_consumption(mpan="12345", serial_number="123456")
+            task = asyncio.ensure_future(anext(records))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    # *** ACT ***
+    asyncio.run(asyncio.wait_for(read(), timeout=5))
+
+    # *** ASSERT ***
+    assert api.cancelled == 1
+    assert api.in_flight == 0
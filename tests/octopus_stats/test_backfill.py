@@ -0,0 +1,176 @@
+import datetime
+import threading
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from octopus_stats.backfill import (
+    BackfillChunk,
+    BackfillScheduler,
+    BackfillSettings,
+    consumption_backfill_job,
+)
+from octopus_stats.compaction import CompactionSettings
+from octopus_stats.consumption_query import ConsumptionQuery, ConsumptionStore
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.octo_api_reader import OctoAPIReader
+
+from tests.e2e.fake_api_server import FakeApiServer, FakeApiSettings
+from tests.octopus_stats.conftest import create_fast_scheduler
+
+_START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+_ONE_DAY = datetime.timedelta(days=1)
+
+
+class Crash(BaseException):
+    """Stands in for the process dying: not an error that the scheduler handles."""
+
+
+class RecordingJob:
+    """Records the chunks it runs, and fails or crashes on those it is told to."""
+
+    def __init__(
+        self,
+        failures: dict[str, int] | None = None,
+        crash_on: datetime.datetime | None = None,
+    ) -> None:
+        self.failures = dict(failures or {})
+        self.crash_on = crash_on
+        self.runs: list[tuple[str, datetime.datetime]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, chunk: BackfillChunk) -> int:
+        with self._lock:
+            self.runs.append((chunk.source, chunk.start))
+            if chunk.start == self.crash_on:
+                raise Crash
+            if self.failures.get(chunk.source, 0) > 0:
+                self.failures[chunk.source] -= 1
+                raise OSError(f"Cannot read {chunk.source}")
+        return (chunk.end - chunk.start) // datetime.timedelta(minutes=30)
+
+
+def _settings(tmp_path: Path, **kwargs: int) -> BackfillSettings:
+    return BackfillSettings(
+        checkpoint_path=str(tmp_path / "backfill.json"),
+        chunk_length=datetime.timedelta(days=7),
+        **kwargs,
+    )
+
+
+def test_runs_every_chunk_of_every_source(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    sut = BackfillScheduler(_settings(tmp_path))
+    chunks = sut.plan(["meter-a", "meter-b"], _START, _START + 30 * _ONE_DAY)
+    job = RecordingJob()
+
+    # *** ACT ***
+    stats = sut.run(job)
+
+    # *** ASSERT ***
+    assert len(chunks) == 2 * 5
+    assert [c.end - c.start for c in chunks[:5]] == [7 * _ONE_DAY] * 4 + [2 * _ONE_DAY]
+    assert sorted(job.runs) == sorted((c.source, c.start) for c in chunks)
+    assert (stats.done, stats.failed, stats.skipped) == (10, 0, 0)
+    assert stats.records == 2 * 30 * 48
+    # The checkpoint survives the scheduler, and planning again adds nothing
+    resumed = BackfillScheduler(_settings(tmp_path))
+    assert {c.state for c in resumed.chunks} == {"done"}
+    assert len(resumed.plan(["meter-a"], _START, _START + 30 * _ONE_DAY)) == 10
+
+
+def test_resumes_unfinished_chunks_after_crash(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    crashed = BackfillScheduler(_settings(tmp_path, workers=1))
+    crashed.plan(["hub"], _START, _START + 35 * _ONE_DAY)
+    with pytest.raises(Crash):
+        crashed.run(RecordingJob(crash_on=_START + 14 * _ONE_DAY))
+    sut = BackfillScheduler(_settings(tmp_path, workers=2))
+    job = RecordingJob()
+
+    # *** ACT ***
+    states = [c.state for c in sut.chunks]
+    stats = sut.run(job)
+
+    # *** ASSERT ***
+    assert states == ["done", "done", "running", "pending", "pending"]
+    assert sorted(start for (_, start) in job.runs) == [
+        _START + days * _ONE_DAY for days in (14, 21, 28)
+    ]
+    assert (stats.done, stats.skipped) == (3, 2)
+    assert [c.attempts for c in sut.chunks] == [1, 1, 2, 1, 1]
+
+
+def test_retries_failed_chunks_within_budget(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    sut = BackfillScheduler(_settings(tmp_path, max_attempts=3))
+    sut.plan(["flaky", "broken", "fine"], _START, _START + 7 * _ONE_DAY)
+    job = RecordingJob(failures={"flaky": 2, "broken": 10})
+
+    # *** ACT ***
+    stats = sut.run(job)
+    rerun = sut.run(job)
+    sut.reset_failed()
+    after_reset = sut.run(job)
+
+    # *** ASSERT ***
+    assert (stats.done, stats.failed, stats.retries) == (2, 1, 4)
+    chunks = {c.source: c for c in BackfillScheduler(_settings(tmp_path)).chunks}
+    assert (chunks["flaky"].state, chunks["flaky"].attempts) == ("done", 3)
+    assert chunks["broken"].state == "failed"
+    assert chunks["broken"].error == "OSError: Cannot read broken"
+    assert (rerun.done, rerun.failed, rerun.skipped) == (0, 0, 3)
+    assert (after_reset.failed, after_reset.retries) == (1, 2)
+    # The reset gave it a fresh budget, which it used up too
+    assert chunks["broken"].attempts == 3
+
+
+@pytest.fixture()
+def server() -> Generator[FakeApiServer, None, None]:
+    settings = FakeApiSettings(
+        data_start=_START,
+        data_end=_START + 10 * _ONE_DAY,
+        other_meters=(("1900000000002", "20L0000002"),),
+    )
+    with FakeApiServer(settings) as server:
+        yield server
+
+
+def test_backfills_consumption_of_each_meter(
+    server: FakeApiServer, tmp_path: Path
+) -> None:
+    # *** ARRANGE ***
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    reader = OctoAPIReader(
+        server.octopus_config(),
+        scheduler=create_fast_scheduler(),
+    )
+    meters = ["1900000000001/20L0000001", "1900000000002/20L0000002"]
+    settings = BackfillSettings(
+        checkpoint_path=str(tmp_path / "backfill.json"),
+        chunk_length=datetime.timedelta(days=3),
+    )
+    sut = BackfillScheduler(settings)
+    sut.plan(meters, _START, _START + 10 * _ONE_DAY)
+
+    # *** ACT ***
+    stats = sut.run(consumption_backfill_job(reader, storage))
+
+    # *** ASSERT ***
+    assert (stats.done, stats.records) == (8, 2 * 10 * 48)
+    query = ConsumptionQuery(
+        start=_START,
+        end=_START + 10 * _ONE_DAY,
+        columns=["start_utc", "total_consumed_kwh"],
+    )
+    for meter in meters:
+        (mpan, serial_number) = meter.split("/")
+        store = ConsumptionStore(
+            storage,
+            CompactionSettings(
+                dataset_path=f"mpan={mpan}/serial={serial_number}/consumption.parquet"
+            ),
+        )
+        consumption = store.read(query)
+        assert len(consumption) == 10 * 48
+        assert consumption["start_utc"].is_unique
@@ -0,0 +1,159 @@
+import datetime
+from collections.abc import Generator
+from pathlib import Path
+
+import fastparquet
+import pandas as pd
+import pytest
+import pytz
+from octopus_stats.compaction import CompactionSettings, Compactor
+from octopus_stats.file_storage_manager import FileStorageManager
+from octopus_stats.octo_api_reader import OctoAPIReader
+from octopus_stats.octo_exporter import OctoExporter, OctoExporterSettings
+
+from tests.e2e.fake_api_server import FakeApiServer, FakeApiSettings
+from tests.octopus_stats.conftest import (
+    append_to_dataset,
+    consumption_days,
+    create_fast_scheduler,
+)
+
+_ONE_DAY = datetime.timedelta(days=1)
+
+
+def _read_compacted(storage: FileStorageManager, path: str) -> pd.DataFrame:
+    return fastparquet.ParquetFile(path, open_with=storage.open_file).to_pandas()
+
+
+def _daily_dates(tmp_path: Path) -> list[str]:
+    daily = fastparquet.ParquetFile(str(tmp_path / "consumption.parquet"))
+    return sorted({rg.columns[0].file_path[11:21] for rg in daily.row_groups})
+
+
+def test_compacts_closed_months(storage: FileStorageManager, tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    for day in range(4):
+        append_to_dataset(
+            storage, consumption_days(datetime.date(2024, 1, 30) + day * _ONE_DAY, 1)
+        )
+    # A re-export of the last day of January, which must replace the first
+    append_to_dataset(
+        storage, consumption_days(datetime.date(2024, 1, 31), 1, consumption=1.5)
+    )
+    sut = Compactor(storage, CompactionSettings(row_group_size=50))
+
+    # *** ACT ***
+    stats = sut.compact()
+
+    # *** ASSERT ***
+    state = sut.load_state()
+    assert list(state.periods) == ["2024-01"]
+    assert state.periods["2024-01"].replaced == []
+    path = state.periods["2024-01"].path
+    assert path == "consumption_compacted.parquet/period_local=2024-01/part.1.parquet"
+    compacted = fastparquet.ParquetFile(path, open_with=storage.open_file)
+    assert [rg.num_rows for rg in compacted.row_groups] == [48, 48]
+    assert compacted.statistics["min"]["start_utc"][0] == pd.Timestamp("2024-01-30")
+    compacted_rows = compacted.to_pandas()
+    assert compacted_rows["start_utc"].is_monotonic_increasing
+    assert not compacted_rows["start_utc"].duplicated().any()
+    last_day = compacted_rows[compacted_rows["date_local"] == "2024-01-31"]
+    assert (last_day["total_consumed_kwh"] == 1.5).all()
+    assert stats.periods_compacted == 1
+    assert stats.files_replaced == 3
+    assert stats.rows_read == 3 * 48
+    assert stats.rows_written == 2 * 48
+    assert stats.files_deleted == 3
+    assert _daily_dates(tmp_path) == ["2024-02-01", "2024-02-02"]
+    assert not list(tmp_path.glob("consumption.parquet/date_local=2024-01-*/*"))
+
+
+def test_leaves_open_period_alone(storage: FileStorageManager) -> None:
+    # *** ARRANGE ***
+    append_to_dataset(storage, consumption_days(datetime.date(2024, 1, 1), 3))
+    sut = Compactor(storage, CompactionSettings(granularity="year"))
+
+    # *** ACT ***
+    stats = sut.compact()
+
+    # *** ASSERT ***
+    assert stats.periods_compacted == 0
+    assert sut.load_state().periods == {}
+    assert not storage.file_exists(sut.state_path)
+
+
+def test_interrupted_cleanup_is_finished_by_next_run(
+    storage: FileStorageManager, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # *** ARRANGE ***
+    append_to_dataset(storage, consumption_days(datetime.date(2024, 1, 30), 4))
+    sut = Compactor(storage, CompactionSettings())
+
+    def fail(filepath: str) -> None:
+        raise OSError(f"Cannot delete {filepath}")
+
+    monkeypatch.setattr(storage, "delete", fail)
+    with pytest.raises(OSError, match="Cannot delete"):
+        sut.compact()
+    interrupted = sut.load_state()
+    monkeypatch.undo()
+
+    # *** ACT ***
+    stats = sut.compact()
+
+    # *** ASSERT ***
+    # The compaction was committed, and its replaced files already dropped from the daily dataset
+    assert len(interrupted.periods["2024-01"].replaced) == 2
+    assert _daily_dates(tmp_path) == ["2024-02-01", "2024-02-02"]
+    assert stats.files_deleted == 2
+    assert stats.periods_compacted == 0
+    assert sut.load_state().periods["2024-01"].replaced == []
+    assert not list(tmp_path.glob("consumption.parquet/date_local=2024-01-*/*"))
+
+
+@pytest.fixture()
+def server() -> Generator[FakeApiServer, None, None]:
+    settings = FakeApiSettings(
+        data_start=datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC),
+        data_end=datetime.datetime(2024, 2, 2, tzinfo=datetime.UTC),
+    )
+    with FakeApiServer(settings) as server:
+        yield server
+
+
+def test_export_continues_after_compaction(
+    server: FakeApiServer, storage: FileStorageManager, tmp_path: Path
+) -> None:
+    # *** ARRANGE ***
+    config = server.octopus_config(use_account=True)
+    exporter = OctoExporter(
+        config,
+        OctoExporterSettings(storage=storage, tz=pytz.timezone("Europe/London")),
+        OctoAPIReader(config, scheduler=create_fast_scheduler()),
+    )
+    exporter.export(full=True)
+    watermark = exporter._load_manifest().watermark  # type: ignore[union-attr]
+    sut = Compactor(storage, CompactionSettings())
+    sut.compact()
+
+    # *** ACT ***
+    # A full re-export writes January again, as late data for a compacted period
+    exporter.export(full=True)
+    stats = sut.compact()
+
+    # *** ASSERT ***
+    manifest = exporter._load_manifest()
+    assert manifest is not None
+    assert manifest.watermark == watermark
+    assert manifest.partitions == ["date_local=2024-02-01", "period_local=2024-01"]
+    assert exporter._get_next_start_date() == watermark
+    state = sut.load_state()
+    assert state.generation == 2
+    assert stats.rows_read == 2 * 31 * 48
+    compacted_rows = _read_compacted(storage, state.periods["2024-01"].path)
+    assert len(compacted_rows) == 31 * 48
+    assert not compacted_rows["start_utc"].duplicated().any()
+    assert [p.name for p in tmp_path.glob("consumption_compacted.parquet/*/*")] == [
+        "part.2.parquet"
+    ]
+    assert _daily_dates(tmp_path) == ["2024-02-01"]
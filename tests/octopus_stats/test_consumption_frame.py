@@ -0,0 +1,85 @@
+import datetime
+from typing import Any
+
+import pandas as pd
+from octopus_stats.consumption_frame import build_consumption_frame
+
+# Half-hour intervals spanning the end of British Summer Time, in the format returned by the consumption API
+_RESULTS: list[dict[str, Any]] = [
+    {
+        "consumption": 0.25,
+        "interval_start": "2023-10-29T00:30:00+01:00",
+        "interval_end": "2023-10-29T01:00:00+01:00",
+    },
+    {
+        "consumption": 0.5,
+        "interval_start": "2023-10-29T01:00:00+01:00",
+        "interval_end": "2023-10-29T01:30:00+01:00",
+    },
+    {
+        "consumption": 0.125,
+        "interval_start": "2023-10-29T01:30:00+01:00",
+        "interval_end": "2023-10-29T01:00:00Z",
+    },
+    {
+        "consumption": 1.0,
+        "interval_start": "2023-10-29T01:00:00Z",
+        "interval_end": "2023-10-29T01:30:00Z",
+    },
+]
+
+
+def _expected_frame(results: list[dict[str, Any]]) -> pd.DataFrame:
+    """Builds the expected frame one record at a time, the way the download script used to."""
+    rows: list[dict[str, Any]] = []
+    for r in results:
+        start = datetime.datetime.fromisoformat(r["interval_start"])
+        end = datetime.datetime.fromisoformat(r["interval_end"])
+        rows.append(
+            {
+                "start_utc": start.astimezone(datetime.UTC),
+                "end_utc": end.astimezone(datetime.UTC),
+                "total_consumed_kwh": r["consumption"],
+                "start_local": start.replace(tzinfo=None),
+                "end_local": end.replace(tzinfo=None),
+                "start_utc_offset": start.utcoffset(),
+                "end_utc_offset": end.utcoffset(),
+            }
+        )
+    frame = pd.DataFrame(rows)
+    frame["duration"] = frame["end_utc"] - frame["start_utc"]
+    frame["date_local"] = frame["start_local"].dt.normalize()
+    frame["dayofyear_local"] = frame["start_local"].dt.dayofyear
+    frame["dayofweek_local"] = frame["start_local"].dt.dayofweek
+    frame["hourofday_local"] = frame["start_local"].dt.hour
+    return frame
+
+
+def test_build_consumption_frame_matches_per_record_conversion() -> None:
+    # *** ARRANGE ***
+    pages = [_RESULTS[:2], _RESULTS[2:]]
+
+    # *** ACT ***
+    frame = build_consumption_frame(pages)
+
+    # *** ASSERT ***
+    pd.testing.assert_frame_equal(frame, _expected_frame(_RESULTS))
+
+
+def test_build_consumption_frame_offsets_across_dst_change() -> None:
+    # *** ACT ***
+    frame = build_consumption_frame([_RESULTS])
+
+    # *** ASSERT ***
+    assert list(frame["start_utc_offset"].dt.total_seconds()) == [3600, 3600, 3600, 0]
+    assert list(frame["duration"].dt.total_seconds()) == [1800] * 4
+    assert list(frame["hourofday_local"]) == [0, 1, 1, 1]
+
+
+def test_build_consumption_frame_empty() -> None:
+    # *** ACT ***
+    frame = build_consumption_frame([[]])
+
+    # *** ASSERT ***
+    assert frame.empty
+    assert "hourofday_local" in frame.columns
@@ -0,0 +1,104 @@
+import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from octopus_stats.compaction import CompactionSettings, Compactor
+from octopus_stats.consumption_query import ConsumptionQuery, ConsumptionStore
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+
+from tests.octopus_stats.conftest import append_to_dataset, consumption_days
+
+_UTC = datetime.UTC
+
+
+@pytest.fixture()
+def storage(tmp_path: Path) -> FileStorageManager:
+    """A store holding January to mid-April 2024, with January to March compacted."""
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    append_to_dataset(storage, consumption_days(datetime.date(2024, 1, 1), 105))
+    Compactor(storage, CompactionSettings()).compact()
+    return storage
+
+
+def test_prunes_files_and_row_groups_outside_range(storage: FileStorageManager) -> None:
+    # *** ARRANGE ***
+    sut = ConsumptionStore(storage)
+    query = ConsumptionQuery(
+        start=datetime.datetime(2024, 2, 10, tzinfo=_UTC),
+        end=datetime.datetime(2024, 2, 17, tzinfo=_UTC),
+        columns=["total_consumed_kwh"],
+    )
+
+    # *** ACT ***
+    consumption = sut.read(query)
+
+    # *** ASSERT ***
+    assert list(consumption.columns) == ["total_consumed_kwh"]
+    assert len(consumption) == 7 * 48
+    # Only February's compacted file, and the daily dataset's metadata, are opened
+    assert sut.stats.files_opened == 2
+    assert sut.stats.files_pruned == 2
+    assert sut.stats.row_groups_read == 1
+    # Every day of April, still in the daily dataset
+    assert sut.stats.row_groups_pruned == 14
+
+
+def test_reads_across_compacted_and_daily_data(storage: FileStorageManager) -> None:
+    # *** ARRANGE ***
+    # A late re-export of a compacted day, which must win over the compacted data
+    append_to_dataset(
+        storage, consumption_days(datetime.date(2024, 3, 31), 1, consumption=1.5)
+    )
+    sut = ConsumptionStore(storage)
+    query = ConsumptionQuery(
+        start=datetime.datetime(2024, 3, 31, tzinfo=_UTC),
+        end=datetime.datetime(2024, 4, 2, tzinfo=_UTC),
+    )
+
+    # *** ACT ***
+    consumption = sut.read(query)
+
+    # *** ASSERT ***
+    assert len(consumption) == 2 * 48
+    assert consumption["start_utc"].is_monotonic_increasing
+    assert consumption["start_utc"].iloc[0] == pd.Timestamp("2024-03-31", tz="UTC")
+    by_day = consumption.groupby("date_local")["total_consumed_kwh"]
+    assert by_day.min().tolist() == [1.5, 0.5]
+    assert by_day.max().tolist() == [1.5, 0.5]
+    assert consumption["date_local"].dtype == "datetime64[ns]"
+
+
+def test_iterates_chunks_of_a_meter(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    meter = "mpan=1900000000001/serial=20L0000001"
+    (tmp_path / meter).mkdir(parents=True)
+    meter_storage = FileStorageManager(
+        FileStorageSettings(base_dir=str(tmp_path / meter))
+    )
+    append_to_dataset(meter_storage, consumption_days(datetime.date(2024, 1, 1), 5))
+    sut = ConsumptionStore(
+        FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    )
+    query = ConsumptionQuery(
+        start=datetime.datetime(2024, 1, 2, 12, tzinfo=_UTC),
+        columns=["date_local", "total_consumed_kwh"],
+        meter=meter,
+    )
+
+    # *** ACT ***
+    chunks = list(sut.iter_chunks(query))
+
+    # *** ASSERT ***
+    assert [len(c) for c in chunks] == [24, 48, 48, 48]
+    assert all(list(c.columns) == ["date_local", "total_consumed_kwh"] for c in chunks)
+
+
+def test_rejects_naive_bounds(storage: FileStorageManager) -> None:
+    # *** ARRANGE ***
+    sut = ConsumptionStore(storage)
+    query = ConsumptionQuery(start=datetime.datetime(2024, 2, 10))  # noqa: DTZ001
+
+    # *** ACT / ASSERT ***
+    with pytest.raises(ValueError, match="timezone-aware"):
+        sut.read(query)
@@ -0,0 +1,165 @@
+import datetime
+import json
+import os
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from octopus_stats import fan_out_exporter
+from octopus_stats.fan_out_exporter import (
+    FanOutExporter,
+    FanOutExporterSettings,
+    MeterExportJob,
+    MeterExportResult,
+    load_configs,
+)
+from octopus_stats.octo_api_reader import OctoAPIConfig
+from octopus_stats.request_scheduler import RequestSchedulerSettings
+
+from tests.e2e.fake_api_server import FakeApiServer, FakeApiSettings
+
+_OTHER_METERS = (("1900000000002", "20L0000002"), ("1900000000002", "20L0000003"))
+
+
+@pytest.fixture()
+def server() -> Generator[FakeApiServer, None, None]:
+    settings = FakeApiSettings(
+        data_start=datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC),
+        data_end=datetime.datetime(2024, 1, 3, tzinfo=datetime.UTC),
+        other_meters=_OTHER_METERS,
+    )
+    with FakeApiServer(settings) as server:
+        yield server
+
+
+def _create_settings(base_dir: Path) -> FanOutExporterSettings:
+    return FanOutExporterSettings(
+        base_dir=str(base_dir),
+        workers=2,
+        full=True,
+        # Don't let rate limits slow the tests down
+        scheduler=RequestSchedulerSettings(requests_per_second=10_000, burst=100),
+    )
+
+
+def test_discover_finds_every_meter_round_robin(
+    server: FakeApiServer, tmp_path: Path
+) -> None:
+    # *** ARRANGE ***
+    single_meter = OctoAPIConfig(
+        api_key=server.settings.octopus_api_key,
+        mpan="1900000000009",
+        serial_number="20L0000009",
+        base_url=server.octopus_base_url,
+    )
+    sut = FanOutExporter(
+        [server.octopus_config(use_account=True), single_meter],
+        _create_settings(tmp_path),
+    )
+
+    # *** ACT ***
+    (jobs, failures) = sut.discover()
+
+    # *** ASSERT ***
+    assert [(j.config.mpan, j.config.serial_number) for j in jobs] == [
+        _OTHER_METERS[0],
+        ("1900000000009", "20L0000009"),
+        _OTHER_METERS[1],
+        (server.settings.mpan, server.settings.serial_number),
+    ]
+    assert jobs[0].output_dir == str(
+        tmp_path / "account=A-FAKE0001/mpan=1900000000002/serial=20L0000002"
+    )
+    assert failures == []
+
+
+def test_export_isolates_failures(server: FakeApiServer, tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    missing_account = OctoAPIConfig(
+        api_key=server.settings.octopus_api_key,
+        account_number="A-MISSING",
+        base_url=server.octopus_base_url,
+    )
+    missing_meter = OctoAPIConfig(
+        api_key=server.settings.octopus_api_key,
+        mpan=server.settings.mpan,
+        serial_number="BAD0000001",
+        base_url=server.octopus_base_url,
+    )
+    sut = FanOutExporter(
+        [server.octopus_config(use_account=True), missing_account, missing_meter],
+        _create_settings(tmp_path),
+    )
+
+    # *** ACT ***
+    results = sut.export()
+
+    # *** ASSERT ***
+    succeeded = [r for r in results if r.ok]
+    failed = {(r.account_number, r.serial_number): r.error for r in results if not r.ok}
+    assert len(succeeded) == 3
+    assert all(r.records == 2 * 48 for r in succeeded)
+    assert failed.keys() == {("A-MISSING", None), (None, "BAD0000001")}
+    assert "404" in failed[("A-MISSING", None)]
+    assert len(list(tmp_path.glob("account=A-FAKE0001/*/*/consumption.parquet"))) == 3
+
+
+def _export_or_crash(job: MeterExportJob) -> MeterExportResult:
+    """Stands in for `export_meter`, killing its worker process for the meters with serial number `CRASH`."""
+    if job.config.serial_number == "CRASH":
+        os._exit(1)
+    return MeterExportResult(
+        account_number=None,
+        mpan=job.config.mpan,
+        serial_number=job.config.serial_number,
+        records=48,
+    )
+
+
+def test_export_isolates_worker_process_dying(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # *** ARRANGE ***
+    # Forked workers inherit the stand-in
+    monkeypatch.setattr(fan_out_exporter, "export_meter", _export_or_crash)
+    settings = FanOutExporterSettings(
+        base_dir=str(tmp_path), workers=2, start_method="fork"
+    )
+    serial_numbers = ["S1", "CRASH", "S3", "S4", "S5", "S6"]
+    configs = [
+        OctoAPIConfig(api_key="1234", mpan=str(1000 + i), serial_number=serial)
+        for (i, serial) in enumerate(serial_numbers)
+    ]
+    sut = FanOutExporter(configs, settings)
+
+    # *** ACT ***
+    results = sut.export()
+
+    # *** ASSERT ***
+    assert [r.serial_number for r in results] == serial_numbers
+    failed = [r for r in results if not r.ok]
+    assert [r.serial_number for r in failed] == ["CRASH"]
+    assert "BrokenProcessPool" in (failed[0].error or "")
+    assert all(r.records == 48 for r in results if r.ok)
+
+
+def test_load_configs(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    path = tmp_path / "accounts.json"
+    path.write_text(
+        json.dumps(
+            [
+                {"api_key": "key-1", "account_number": "A-0001"},
+                {"api_key": "key-2", "mpan": "1000", "serial_number": "S1"},
+            ]
+        )
+    )
+
+    # *** ACT ***
+    configs = load_configs(str(path))
+
+    # *** ASSERT ***
+    assert configs == [
+        OctoAPIConfig(api_key="key-1", account_number="A-0001"),
+        OctoAPIConfig(api_key="key-2", mpan="1000", serial_number="S1"),
+    ]
@@ -1,7 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
 from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.storage_manager import StorageManager
 
 
 @pytest.fixture(autouse=True)
@@ -51,3 +53,114 @@ def test_get_directory_listing_subdir() -> None:
 
     # *** ASSERT ***
     assert files == ["2023/12/21/21-00", "2023/12/21/23-30"]
+
+
+def test_write_file_contents(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    settings = FileStorageSettings(base_dir=str(tmp_path))
+    sut = FileStorageManager(settings)
+
+    # *** ACT ***
+    sut.write_file_contents("a/b/file.json", "first")
+    sut.write_file_contents("a/b/file.json", "second")
+
+    # *** ASSERT ***
+    assert sut.read_file_contents("a/b/file.json") == "second"
+    assert sut.get_directory_listing("a/b") == ["a/b/file.json"]
+
+
+def test_concurrent_writes_are_atomic(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    sut = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    contents = [str(i) * 100_000 for i in range(8)]
+
+    # *** ACT ***
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(20):
+            list(pool.map(lambda c: sut.write_file_contents("file.json", c), contents))
+
+    # *** ASSERT ***
+    assert sut.read_file_contents("file.json") in contents
+    assert [p.name for p in tmp_path.iterdir()] == ["file.json"]
+
+
+def test_read_missing_file(tmp_path: Path) -> None:
+    settings = FileStorageSettings(base_dir=str(tmp_path))
+    sut = FileStorageManager(settings)
+
+    with pytest.raises(FileNotFoundError):
+        sut.read_file_contents("missing.json")
+
+
+@pytest.fixture()
+def binary_storage(tmp_path: Path) -> FileStorageManager:
+    tmp_path.joinpath("data.bin").write_bytes(bytes(range(256)) * 4)
+    tmp_path.joinpath("empty.bin").write_bytes(b"")
+    return FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+
+
+def test_read_bytes_ranges(binary_storage: FileStorageManager) -> None:
+    # *** ACT ***
+    whole = binary_storage.read_bytes("data.bin")
+    middle = binary_storage.read_bytes("data.bin", 10, 5)
+    footer = binary_storage.read_bytes("data.bin", -8)
+    past_start = binary_storage.read_bytes("data.bin", -5000, 2)
+
+    # *** ASSERT ***
+    assert len(whole) == 1024
+    assert middle == bytes([10, 11, 12, 13, 14])
+    assert footer == bytes(range(248, 256))
+    assert past_start == bytes([0, 1])
+    assert binary_storage.get_file_size("data.bin") == 1024
+
+
+def test_iter_file_chunks(binary_storage: FileStorageManager) -> None:
+    # *** ACT ***
+    chunks = list(binary_storage.iter_file_chunks("data.bin", chunk_size=300))
+    ranged = list(
+        binary_storage.iter_file_chunks("data.bin", chunk_size=4, offset=-10, length=6)
+    )
+
+    # *** ASSERT ***
+    assert [len(c) for c in chunks] == [300, 300, 300, 124]
+    assert b"".join(chunks) == binary_storage.read_bytes("data.bin")
+    assert ranged == [bytes([246, 247, 248, 249]), bytes([250, 251])]
+
+
+def test_move(binary_storage: FileStorageManager) -> None:
+    # *** ARRANGE ***
+    content = binary_storage.read_bytes("data.bin")
+
+    # *** ACT ***
+    binary_storage.move("data.bin", "a/moved.bin")
+    # The default implementation copies and deletes
+    StorageManager.move(binary_storage, "a/moved.bin", "empty.bin")
+
+    # *** ASSERT ***
+    assert binary_storage.read_bytes("empty.bin") == content
+    assert not binary_storage.file_exists("data.bin")
+    assert not binary_storage.file_exists("a/moved.bin")
+    with pytest.raises(FileNotFoundError):
+        StorageManager.move(binary_storage, "data.bin", "empty.bin")
+    assert binary_storage.read_bytes("empty.bin") == content
+
+
+def test_map_file(binary_storage: FileStorageManager) -> None:
+    # *** ACT ***
+    with binary_storage.map_file("data.bin") as view:
+        footer = bytes(view[-4:])
+        size = len(view)
+    with binary_storage.map_file("empty.bin") as empty_view:
+        empty_size = len(empty_view)
+
+    # *** ASSERT ***
+    assert footer == bytes([252, 253, 254, 255])
+    assert size == 1024
+    assert empty_size == 0
+
+
+def test_binary_reads_require_relative_paths(
+    binary_storage: FileStorageManager,
+) -> None:
+    with pytest.raises(ValueError, match="relative"):
+        binary_storage.read_bytes(str(binary_storage.basepath / "data.bin"))
@@ -0,0 +1,61 @@
+from typing import Any
+
+import pytest
+import requests
+from octopus_stats.http_session import HttpSessionSettings, create_session
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from requests.adapters import HTTPAdapter
+
+
+class FakeResponse:
+    status_code = 200
+    headers: dict[str, str] = {}  # noqa: RUF012
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Any:
+        return {"results": [], "next": None}
+
+
+def test_create_session_sizes_pools() -> None:
+    # *** ARRANGE ***
+    settings = HttpSessionSettings(pool_connections=2, pool_maxsize=16)
+
+    # *** ACT ***
+    session = create_session(settings)
+
+    # *** ASSERT ***
+    adapter = session.get_adapter("https://api.octopus.energy/v1/")
+    assert isinstance(adapter, HTTPAdapter)
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 16
+
+
+def test_create_session_rejects_empty_pool() -> None:
+    with pytest.raises(ValueError, match="pool_maxsize"):
+        HttpSessionSettings(pool_maxsize=0)
+
+
+def test_reader_reuses_session_and_auth(monkeypatch: pytest.MonkeyPatch) -> None:
+    # *** ARRANGE ***
+    session = create_session()
+    calls: list[tuple[str, Any]] = []
+
+    def fake_get(url: str, **kwargs: Any) -> FakeResponse:
+        calls.append((url, kwargs["auth"]))
+        return FakeResponse()
+
+    monkeypatch.setattr(session, "get", fake_get)
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    sut = OctoAPIReader(config, session=session)
+
+    # *** ACT ***
+    sut._call_api_raw("https://api.octopus.energy/v1/a/")
+    sut._call_api_raw("https://api.octopus.energy/v1/b/")
+    sut.close()
+
+    # *** ASSERT ***
+    assert len(calls) == 2
+    assert calls[0][1] is calls[1][1]
+    assert isinstance(session, requests.Session)
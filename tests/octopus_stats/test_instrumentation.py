@@ -0,0 +1,168 @@
+import datetime
+import json
+import logging
+from collections.abc import Generator
+from pathlib import Path
+
+import pendulum
+import pytest
+import pytz
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.instrumentation import NULL_INSTRUMENTATION, MetricsRecorder
+from octopus_stats.instrumented_storage_manager import InstrumentedStorageManager
+from octopus_stats.octo_api_reader import OctoAPIReader
+from octopus_stats.octo_exporter import OctoExporter, OctoExporterSettings
+from octopus_stats.response_cache import ResponseCache, ResponseCacheSettings
+from zappi_stats.zappi_api_reader import ZappiApiReader
+
+from tests.e2e.fake_api_server import FakeApiServer, FakeApiSettings
+from tests.octopus_stats.conftest import create_fast_scheduler
+
+_DATA_START = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+_DATA_END = datetime.datetime(2024, 1, 3, tzinfo=datetime.UTC)
+
+
+@pytest.fixture()
+def server() -> Generator[FakeApiServer, None, None]:
+    settings = FakeApiSettings(
+        data_start=_DATA_START,
+        data_end=_DATA_END,
+        max_page_size=48,
+        zappi_records_per_day=60,
+    )
+    with FakeApiServer(settings) as server:
+        yield server
+
+
+def test_null_instrumentation_keeps_nothing() -> None:
+    # *** ACT ***
+    NULL_INSTRUMENTATION.count("requests_total", api="octopus")
+    with NULL_INSTRUMENTATION.timed("structure_seconds"):
+        pass
+
+    # *** ASSERT ***
+    assert not NULL_INSTRUMENTATION.enabled
+
+
+def test_recorder_exports_prometheus_text(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    sut = MetricsRecorder()
+
+    # *** ACT ***
+    sut.count("http_requests_total", api="octopus", status="200")
+    sut.count("http_requests_total", 2, api="octopus", status="200")
+    sut.count("http_requests_total", api='my"api', status="500")
+    sut.observe("http_request_seconds", 0.25, api="octopus")
+    sut.observe("http_request_seconds", 0.5, api="octopus")
+    sut.write_prometheus(str(tmp_path / "metrics.prom"))
+
+    # *** ASSERT ***
+    assert (tmp_path / "metrics.prom").read_text() == (
+        "# TYPE octopus_stats_http_requests_total counter\n"
+        'octopus_stats_http_requests_total{api="my\\"api",status="500"} 1\n'
+        'octopus_stats_http_requests_total{api="octopus",status="200"} 3\n'
+        "# TYPE octopus_stats_http_request_seconds summary\n"
+        'octopus_stats_http_request_seconds_count{api="octopus"} 2\n'
+        'octopus_stats_http_request_seconds_sum{api="octopus"} 0.75\n'
+    )
+    assert sut.summary("http_request_seconds", api="octopus").maximum == 0.5
+    assert list(tmp_path.iterdir()) == [tmp_path / "metrics.prom"]
+
+
+def test_recorder_logs_structured_records(caplog: pytest.LogCaptureFixture) -> None:
+    # *** ARRANGE ***
+    logger = logging.getLogger("test_instrumentation")
+    sut = MetricsRecorder(event_logger=logger)
+
+    # *** ACT ***
+    with caplog.at_level(logging.DEBUG, logger="test_instrumentation"):
+        sut.count("pages_total", api="octopus")
+        with sut.timed("structure_seconds", api="octopus"):
+            pass
+        sut.log_summary(logger)
+
+    # *** ASSERT ***
+    records = [json.loads(r.getMessage()) for r in caplog.records]
+    assert records[0] == {
+        "event": "count",
+        "metric": "pages_total",
+        "api": "octopus",
+        "value": 1,
+    }
+    assert records[1]["event"] == "observe"
+    assert records[2] == {"metric": "pages_total", "api": "octopus", "value": 1}
+    assert records[3]["metric"] == "structure_seconds"
+    assert records[3]["count"] == 1
+
+
+def test_exporter_reports_requests_stages_and_storage(
+    server: FakeApiServer, tmp_path: Path
+) -> None:
+    # *** ARRANGE ***
+    recorder = MetricsRecorder()
+    config = server.octopus_config(use_account=True)
+    storage = InstrumentedStorageManager(
+        FileStorageManager(FileStorageSettings(base_dir=str(tmp_path))), recorder
+    )
+    settings = OctoExporterSettings(
+        storage=storage, tz=pytz.timezone("Europe/London"), instrumentation=recorder
+    )
+    reader = OctoAPIReader(
+        config, scheduler=create_fast_scheduler(), instrumentation=recorder
+    )
+
+    # *** ACT ***
+    OctoExporter(config, settings, reader).export(full=True)
+
+    # *** ASSERT ***
+    # One request for the account, and two pages of consumption
+    assert recorder.counter("http_requests_total", api="octopus", status="200") == 3
+    assert recorder.counter("http_response_bytes_total", api="octopus") > 0
+    assert recorder.counter("pages_total", api="octopus") == 2
+    assert recorder.counter("records_total", api="octopus") == 96
+    assert recorder.counter("export_records_total", exporter="octopus") == 96
+    assert recorder.counter("stage_items_total", exporter="octopus", stage="fetch") == 2
+    assert recorder.summary("export_seconds", exporter="octopus").count == 1
+    assert recorder.counter("storage_bytes_total", op="write") > 0
+    assert recorder.summary("storage_seconds", op="open_file").count > 0
+
+
+def test_readers_report_cache_lookups_and_records(
+    server: FakeApiServer, tmp_path: Path
+) -> None:
+    # *** ARRANGE ***
+    recorder = MetricsRecorder()
+    cache = ResponseCache(ResponseCacheSettings(cache_dir=str(tmp_path)))
+    octo = OctoAPIReader(
+        server.octopus_config(),
+        cache=cache,
+        scheduler=create_fast_scheduler(),
+        instrumentation=recorder,
+    )
+    zappi = ZappiApiReader(
+        server.myenergi_config(),
+        scheduler=create_fast_scheduler(),
+        instrumentation=recorder,
+    )
+    (start, end) = (pendulum.instance(_DATA_START), pendulum.instance(_DATA_END))
+
+    # *** ACT ***
+    for _ in range(2):
+        list(
+            octo.get_consumption(
+                start=start,
+                end=end,
+                mpan=server.settings.mpan,
+                serial_number=server.settings.serial_number,
+            )
+        )
+    zappi.connect()
+    zappi.get_data_array(start, end)
+
+    # *** ASSERT ***
+    assert recorder.counter("cache_lookups_total", api="octopus", result="miss") == 2
+    assert recorder.counter("cache_lookups_total", api="octopus", result="hit") == 2
+    assert recorder.summary("structure_seconds", api="octopus").count == 4
+    assert recorder.counter("asn_redirects_total", api="myenergi") == 1
+    assert recorder.summary("connect_seconds", api="myenergi").count == 1
+    assert recorder.counter("records_total", api="myenergi") == 2 * 60
@@ -1,6 +1,10 @@
+import datetime
 import os
+from typing import Any
 
 import pendulum
+import pytest
+from furl import furl  # type: ignore[reportMissingTypeStubs]
 from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
 
 account_number = os.environ.get("OCTOPUS_ACCOUNT_NUMBER", None)
@@ -23,3 +27,86 @@ def test_read_accounts() -> None:
     reader = OctoAPIReader(config)
     x = reader.get_account(account_number) # type: ignore
     print(x)
+
+
+def fake_consumption_api(url: str) -> dict[str, Any]:
+    """
+    Serves half-hourly consumption pages for the requested period. Deliberately includes the interval that starts at
+    `period_to`, so that callers have to cope with overlapping results at the edges of a query.
+    """
+    f = furl(url)
+    period_from = datetime.datetime.fromisoformat(f.args["period_from"])
+    period_to = datetime.datetime.fromisoformat(f.args["period_to"])
+    page = int(f.args.get("page", "1"))
+    page_size = int(f.args["page_size"])
+    interval = datetime.timedelta(minutes=30)
+    starts: list[datetime.datetime] = []
+    t = period_from
+    while t <= period_to:
+        starts.append(t)
+        t += interval
+    page_starts = starts[(page - 1) * page_size : page * page_size]
+    results = [
+        {
+            "consumption": round(s.timestamp() / 1e9, 6),
+            "interval_start": s.isoformat().replace("+00:00", "Z"),
+            "interval_end": (s + interval).isoformat().replace("+00:00", "Z"),
+        }
+        for s in page_starts
+    ]
+    more = page * page_size < len(starts)
+    return {
+        "results": results,
+        "next": f.copy().set({**f.args, "page": str(page + 1)}).url if more else None,
+    }
+
+
+@pytest.fixture()
+def fake_reader(monkeypatch: pytest.MonkeyPatch) -> OctoAPIReader:
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    reader = OctoAPIReader(config)
+    monkeypatch.setattr(reader, "_call_api_raw", fake_consumption_api)
+    return reader
+
+
+def test_get_consumption_sharded_matches_serial(fake_reader: OctoAPIReader) -> None:
+    # *** ARRANGE ***
+    start = pendulum.datetime(2023, 1, 1, tz="UTC")
+    end = pendulum.datetime(2023, 3, 1, tz="UTC")
+    expected = [
+        r
+        for r in fake_reader.get_consumption(
+            start=start, end=end, mpan="12345", serial_number="123456"
+        )
+        if r.interval_start < end
+    ]
+
+    # *** ACT ***
+    records = list(
+        fake_reader.get_consumption_sharded(
+            start=start,
+            end=end,
+            mpan="12345",
+            serial_number="123456",
+            window=datetime.timedelta(days=7),
+            workers=3,
+        )
+    )
+
+    # *** ASSERT ***
+    assert len(records) == 59 * 48
+    assert records == expected
+
+
+def test_get_consumption_sharded_rejects_partial_interval_window(
+    fake_reader: OctoAPIReader,
+) -> None:
+    with pytest.raises(ValueError, match="half-hours"):
+        next(
+            fake_reader.get_consumption_sharded(
+                start=pendulum.datetime(2023, 1, 1, tz="UTC"),
+                mpan="12345",
+                serial_number="123456",
+                window=datetime.timedelta(minutes=45),
+            )
+        )
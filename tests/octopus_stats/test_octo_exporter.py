@@ -1,10 +1,20 @@
-from datetime import datetime
-from pathlib import PurePosixPath
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Optional
 
+import fastparquet
+import pandas as pd
+import pendulum
 import pytest
 import pytz
 import time_machine
+from octopus_stats import octo_exporter
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
 from octopus_stats.octo_exporter import (
+    MANIFEST_PATH,
+    ExportManifest,
     OctoAPIConfig,
     OctoExporter,
     OctoExporterSettings,
@@ -18,21 +28,47 @@ def __init__(self, files: dict[str, str]) -> None:
         self._files = files
         self._all_files = [PurePosixPath(f) for f in self._files]
 
+        self.listing_calls = 0
+
     def read_file_contents(self, filepath: str) -> str:
+        if filepath not in self._files:
+            raise FileNotFoundError(filepath)
         return self._files[filepath]
 
+    def read_bytes(
+        self, filepath: str, offset: int = 0, length: Optional[int] = None
+    ) -> bytes:
+        content = self.read_file_contents(filepath).encode("utf-8")
+        if offset < 0:
+            offset = max(len(content) + offset, 0)
+        return content[offset:] if length is None else content[offset : offset + length]
+
+    def get_file_size(self, filepath: str) -> int:
+        return len(self.read_file_contents(filepath).encode("utf-8"))
+
+    def open_file(self, filepath: str, mode: str = "rb") -> BinaryIO:
+        if mode != "rb":
+            raise NotImplementedError("Binary writes are not supported")
+        return BytesIO(self.read_file_contents(filepath).encode("utf-8"))
+
+    def make_dirs(self, dirpath: str) -> None:
+        pass
+
+    def write_file_contents(self, filepath: str, content: str) -> None:
+        self._files[filepath] = content
+
     def get_directory_listing(self, dirpath: str) -> list[str]:
+        self.listing_calls += 1
         return [f.as_posix() for f in self._all_files if f.is_relative_to(dirpath)]
 
+    def delete(self, filepath: str) -> None:
+        self._files.pop(filepath, None)
+
 
 @time_machine.travel("2023-12-03 03:00 +0000")
-def test_gets_correct_start_date_recent() -> None:
+def test_gets_correct_start_date_no_files() -> None:
     # *** ARRANGE ***
-    files = {
-        "2023/11/29/23-30": "",
-        "2023/11/30/23-30": "",
-        "2023/12/01/20-00": "",
-    }
+    files: dict[str, str] = {}
     sm = FakeStorageManager(files)
     settings = OctoExporterSettings(storage=sm, tz=pytz.timezone("Europe/London"))
     config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
@@ -42,15 +78,16 @@ def test_gets_correct_start_date_recent() -> None:
     x = sut._get_next_start_date()
 
     # *** ASSERT ***
-    expected = datetime(2023, 12, 1, 20, 0, tzinfo=pytz.timezone("Europe/London"))
-    assert x == pytest.approx(expected, abs=10)
+    assert x is None
+
 
 @time_machine.travel("2023-12-03 03:00 +0000")
-def test_gets_correct_start_date_no_files() -> None:
+def test_gets_start_date_from_manifest_without_listing() -> None:
     # *** ARRANGE ***
-    files: dict[str, str] = {}
-    sm = FakeStorageManager(files)
-    settings = OctoExporterSettings(storage=sm, tz=pytz.timezone("Europe/London"))
+    watermark = datetime(2023, 6, 1, 12, 30, tzinfo=pytz.UTC)
+    manifest = ExportManifest(watermark=watermark, partitions=["date_local=2023-06-01"])
+    sm = FakeStorageManager({MANIFEST_PATH: manifest.to_json()})
+    settings = OctoExporterSettings(storage=sm, tz=pytz.UTC)
     config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
     sut = OctoExporter(config, settings)
 
@@ -58,4 +95,258 @@ def test_gets_correct_start_date_no_files() -> None:
     x = sut._get_next_start_date()
 
     # *** ASSERT ***
-    assert x is None
+    assert x == watermark
+    assert sm.listing_calls == 0
+
+
+def test_record_partitions_advances_watermark() -> None:
+    # *** ARRANGE ***
+    sm = FakeStorageManager({})
+    settings = OctoExporterSettings(storage=sm, tz=pytz.UTC)
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    sut = OctoExporter(config, settings)
+    later = datetime(2023, 12, 3, 23, 30, tzinfo=pytz.UTC)
+    earlier = datetime(2023, 12, 1, 23, 30, tzinfo=pytz.UTC)
+
+    # *** ACT ***
+    sut._record_partitions(["date_local=2023-12-02", "date_local=2023-12-03"], later)
+    sut._record_partitions(["date_local=2023-12-01", "date_local=2023-12-02"], earlier)
+
+    # *** ASSERT ***
+    manifest = sut._load_manifest()
+    assert manifest is not None
+    assert manifest.watermark == later
+    assert manifest.partitions == [
+        "date_local=2023-12-01",
+        "date_local=2023-12-02",
+        "date_local=2023-12-03",
+    ]
+
+
+def test_storage_manager_default_chunking() -> None:
+    # *** ARRANGE ***
+    sut = FakeStorageManager({"a.txt": "0123456789"})
+
+    # *** ACT ***
+    chunks = list(sut.iter_file_chunks("a.txt", chunk_size=4, offset=-7))
+
+    # *** ASSERT ***
+    assert chunks == [b"3456", b"789"]
+
+
+class FakeReader:
+    """Serves half-hourly consumption pages between fixed dates, starting wherever it is asked to."""
+
+    def __init__(self, first: datetime, last: datetime, page_size: int = 48) -> None:
+        self._first = first
+        self._last = last
+        self._page_size = page_size
+        self.starts: list[Optional[pendulum.DateTime]] = []
+        self.closed = False
+        self.fail_at: Optional[datetime] = None
+
+    def close(self) -> None:
+        self.closed = True
+
+    def get_consumption_pages(
+        self, *, start: Optional[pendulum.DateTime] = None, **_: Any
+    ) -> Iterator[list[dict[str, Any]]]:
+        self.starts.append(start)
+        interval = timedelta(minutes=30)
+        t = max(start, self._first) if start else self._first
+        page: list[dict[str, Any]] = []
+        while t < self._last:
+            if self.fail_at is not None and t >= self.fail_at:
+                raise OSError("API unavailable")
+            page.append(
+                {
+                    "consumption": 0.5,
+                    "interval_start": t.isoformat(),
+                    "interval_end": (t + interval).isoformat(),
+                }
+            )
+            if len(page) == self._page_size:
+                yield page
+                page = []
+            t += interval
+        if page:
+            yield page
+
+
+def _create_exporter(tmp_path: Path, reader: FakeReader) -> OctoExporter:
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    settings = OctoExporterSettings(storage=storage, tz=pytz.UTC, queue_size=2)
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    return OctoExporter(config, settings, reader)  # type: ignore[arg-type]
+
+
+def _read_dataset(tmp_path: Path) -> pd.DataFrame:
+    return fastparquet.ParquetFile(str(tmp_path / "consumption.parquet")).to_pandas()
+
+
+@time_machine.travel("2024-01-10 03:00 +0000")
+def test_export_pipeline_writes_dataset_and_manifest(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 8, tzinfo=UTC)
+    )
+    sut = _create_exporter(tmp_path, reader)
+
+    # *** ACT ***
+    stats = sut.export()
+
+    # *** ASSERT ***
+    assert [s.name for s in stats] == ["fetch", "transform", "write"]
+    assert [s.items for s in stats] == [7, 7, 7]
+    written = _read_dataset(tmp_path)
+    assert len(written) == 7 * 48
+    manifest = sut._load_manifest()
+    assert manifest is not None
+    assert manifest.watermark == datetime(2024, 1, 8, tzinfo=UTC)
+    assert manifest.partitions[0] == "date_local=2024-01-01"
+    assert len(manifest.partitions) == 7
+
+
+@time_machine.travel("2024-01-10 03:00 +0000")
+def test_export_resumes_from_watermark(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 3, tzinfo=UTC)
+    )
+    sut = _create_exporter(tmp_path, reader)
+    sut.export()
+    reader._last = datetime(2024, 1, 5, tzinfo=UTC)
+
+    # *** ACT ***
+    sut.export()
+
+    # *** ASSERT ***
+    assert reader.starts[0] is None
+    assert reader.starts[1] == datetime(2024, 1, 3, tzinfo=UTC)
+    written = _read_dataset(tmp_path)
+    assert len(written) == 4 * 48
+    assert not written["start_utc"].duplicated().any()
+
+
+@time_machine.travel("2024-01-10 03:00 +0000")
+def test_export_rebuilds_missing_manifest_from_dataset(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 3, 12, tzinfo=UTC)
+    )
+    sut = _create_exporter(tmp_path, reader)
+    sut.export()
+    (tmp_path / MANIFEST_PATH).unlink()
+    reader._last = datetime(2024, 1, 5, tzinfo=UTC)
+
+    # *** ACT ***
+    rebuilt = sut.rebuild_manifest()
+    sut.export()
+
+    # *** ASSERT ***
+    assert rebuilt.watermark == datetime(2024, 1, 3, 12, tzinfo=UTC)
+    assert rebuilt.partitions == [
+        "date_local=2024-01-01",
+        "date_local=2024-01-02",
+        "date_local=2024-01-03",
+    ]
+    assert reader.starts[1] == rebuilt.watermark
+    written = _read_dataset(tmp_path)
+    assert len(written) == 4 * 48
+    assert not written["start_utc"].duplicated().any()
+
+
+@time_machine.travel("2024-01-10 03:00 +0000")
+def test_full_export_replaces_dataset(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 3, tzinfo=UTC)
+    )
+    sut = _create_exporter(tmp_path, reader)
+    sut.export()
+    reader._first = datetime(2024, 1, 2, tzinfo=UTC)
+
+    # *** ACT ***
+    sut.export(full=True)
+
+    # *** ASSERT ***
+    assert reader.starts == [None, None]
+    written = _read_dataset(tmp_path)
+    assert len(written) == 48
+    assert not written["start_utc"].duplicated().any()
+    manifest = sut._load_manifest()
+    assert manifest is not None
+    assert manifest.partitions == ["date_local=2024-01-02"]
+    assert manifest.watermark == datetime(2024, 1, 3, tzinfo=UTC)
+    assert sut.rollups is not None
+    assert [d.day for d in sut.rollups.read("day")["period_start"]] == [2]
+    assert not list((tmp_path / "consumption.parquet.staging").rglob("*.parquet"))
+
+
+@time_machine.travel("2024-01-10 03:00 +0000")
+def test_failed_full_export_keeps_dataset(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC),
+        datetime(2024, 1, 3, tzinfo=UTC),
+        page_size=8,
+    )
+    sut = _create_exporter(tmp_path, reader)
+    sut.export()
+    exported = _read_dataset(tmp_path)
+    manifest = sut._load_manifest()
+    reader.fail_at = datetime(2024, 1, 2, 12, tzinfo=UTC)
+
+    # *** ACT ***
+    with pytest.raises(OSError, match="API unavailable"):
+        sut.export(full=True)
+
+    # *** ASSERT ***
+    pd.testing.assert_frame_equal(_read_dataset(tmp_path), exported)
+    assert sut._load_manifest() == manifest
+    assert sut.rollups is not None
+    assert list(sut.rollups.read("day")["records"]) == [48, 48]
+
+
+def test_export_closes_reader_it_creates(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 2, tzinfo=UTC)
+    )
+    monkeypatch.setattr(octo_exporter, "OctoAPIReader", lambda *_, **__: reader)
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    settings = OctoExporterSettings(storage=storage, tz=pytz.UTC)
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    sut = OctoExporter(config, settings)
+
+    # *** ACT ***
+    sut.export()
+
+    # *** ASSERT ***
+    assert reader.closed
+
+
+@time_machine.travel("2024-01-10 03:00 +0000")
+def test_export_keeps_rollups_up_to_date(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader(
+        datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 1, 3, 12, tzinfo=UTC)
+    )
+    sut = _create_exporter(tmp_path, reader)
+    sut.export()
+    reader._last = datetime(2024, 1, 5, tzinfo=UTC)
+
+    # *** ACT ***
+    sut.export()
+
+    # *** ASSERT ***
+    assert sut.rollups is not None
+    assert sut.rollups.dirty == []
+    daily = sut.rollups.read("day")
+    assert [d.day for d in daily["period_start"]] == [1, 2, 3, 4]
+    assert list(daily["records"]) == [48, 48, 48, 48]
+    assert list(daily["total_consumed_kwh"]) == [24.0, 24.0, 24.0, 24.0]
+    assert len(sut.rollups.read("hour")) == 4 * 24
+    assert list(sut.rollups.read("month")["records"]) == [4 * 48]
@@ -0,0 +1,95 @@
+import datetime
+from pathlib import Path
+from typing import BinaryIO
+
+import fastparquet
+import pytest
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.parquet_writer import (
+    ParquetWriterSettings,
+    PartitionedParquetWriter,
+)
+
+from tests.octopus_stats.conftest import consumption_days
+
+
+class CountingStorageManager(FileStorageManager):
+    """Counts the files opened for writing, by name."""
+
+    def __init__(self, settings: FileStorageSettings) -> None:
+        super().__init__(settings)
+        self.writes: dict[str, int] = {}
+
+    def open_file(self, filepath: str, mode: str = "rb") -> BinaryIO:
+        if "w" in mode:
+            name = Path(filepath).name
+            self.writes[name] = self.writes.get(name, 0) + 1
+        return super().open_file(filepath, mode)
+
+
+@pytest.fixture()
+def storage(tmp_path: Path) -> CountingStorageManager:
+    return CountingStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+
+
+def test_buffers_until_flush_threshold(storage: CountingStorageManager) -> None:
+    # *** ARRANGE ***
+    settings = ParquetWriterSettings(dataset_path="ds.parquet", flush_rows=100)
+    sut = PartitionedParquetWriter(storage, settings)
+
+    # *** ACT ***
+    sut.write(consumption_days(datetime.date(2024, 1, 1), 1))
+    buffered = sut.buffered_rows
+    sut.write(consumption_days(datetime.date(2024, 1, 2), 2))
+
+    # *** ASSERT ***
+    assert buffered == 48
+    assert sut.buffered_rows == 0
+    assert sut.stats.flushes == 1
+    assert sut.stats.partitions_written == 3
+    assert storage.writes["_metadata"] == 1
+
+
+def test_appends_across_flushes(storage: CountingStorageManager) -> None:
+    # *** ARRANGE ***
+    settings = ParquetWriterSettings(
+        dataset_path="ds.parquet", compression="ZSTD", row_group_size=20
+    )
+
+    # *** ACT ***
+    with PartitionedParquetWriter(storage, settings) as sut:
+        sut.write(consumption_days(datetime.date(2024, 1, 1), 2))
+        sut.flush()
+        sut.write(consumption_days(datetime.date(2024, 1, 3), 1))
+        sut.write(consumption_days(datetime.date(2024, 1, 4), 1))
+
+    # *** ASSERT ***
+    assert sut.stats.flushes == 2
+    assert storage.writes["_metadata"] == 2
+    pf = fastparquet.ParquetFile(str(storage.basepath / "ds.parquet"))
+    written = pf.to_pandas()
+    assert len(written) == 4 * 48
+    assert written["start_utc"].is_monotonic_increasing
+    assert max(rg.num_rows for rg in pf.row_groups) == 20
+    codecs = {c.meta_data.codec for rg in pf.row_groups for c in rg.columns}
+    assert codecs == {fastparquet.parquet_thrift.CompressionCodec.ZSTD}
+
+
+def _fail_after_writing(sut: PartitionedParquetWriter) -> None:
+    with sut:
+        sut.write(consumption_days(datetime.date(2024, 1, 1), 1))
+        raise RuntimeError
+
+
+def test_discards_buffer_on_error(storage: CountingStorageManager) -> None:
+    # *** ARRANGE ***
+    settings = ParquetWriterSettings(dataset_path="ds.parquet")
+    sut = PartitionedParquetWriter(storage, settings)
+
+    # *** ACT ***
+    with pytest.raises(RuntimeError):
+        _fail_after_writing(sut)
+
+    # *** ASSERT ***
+    assert sut.stats.flushes == 0
+    assert not storage.file_exists("ds.parquet/_metadata")
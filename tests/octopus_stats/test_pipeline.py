@@ -0,0 +1,61 @@
+import time
+from collections.abc import Iterator
+
+import pytest
+from octopus_stats.pipeline import run_pipeline
+
+
+def test_runs_stages_in_order() -> None:
+    # *** ARRANGE ***
+    output: list[int] = []
+
+    # *** ACT ***
+    stats = run_pipeline(
+        ("source", range(10)),
+        [("double", lambda x: x * 2), ("collect", output.append)],
+        queue_size=2,
+    )
+
+    # *** ASSERT ***
+    assert output == [x * 2 for x in range(10)]
+    assert [s.name for s in stats] == ["source", "double", "collect"]
+    assert [s.items for s in stats] == [10, 10, 10]
+
+
+def test_slow_stage_applies_backpressure() -> None:
+    # *** ARRANGE ***
+    def slow_sink(_: int) -> None:
+        time.sleep(0.01)
+
+    # *** ACT ***
+    stats = run_pipeline(
+        ("source", range(20)),
+        [("identity", lambda x: x), ("sink", slow_sink)],
+        queue_size=1,
+    )
+
+    # *** ASSERT ***
+    (source, identity, sink) = stats
+    assert identity.blocked_seconds > 0.05
+    assert sink.busy_seconds >= 0.2
+    assert sink.starved_seconds < sink.busy_seconds
+
+
+def test_stage_error_stops_pipeline() -> None:
+    # *** ARRANGE ***
+    produced: list[int] = []
+
+    def source() -> Iterator[int]:
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    def fail(x: int) -> int:
+        if x == 3:
+            raise KeyError(x)
+        return x
+
+    # *** ACT / ASSERT ***
+    with pytest.raises(KeyError):
+        run_pipeline(("source", source()), [("fail", fail)], queue_size=2)
+    assert len(produced) < 10
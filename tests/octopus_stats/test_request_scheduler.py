@@ -0,0 +1,188 @@
+import asyncio
+import datetime
+from typing import Any, Optional
+
+import httpx
+import pytest
+import requests
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from octopus_stats.request_scheduler import (
+    RequestScheduler,
+    RequestSchedulerSettings,
+    _parse_retry_after,
+)
+
+_URL = "https://api.example.com/v1/x/"
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps on it."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: Optional[dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def _create_scheduler(clock: FakeClock, **kwargs: Any) -> RequestScheduler:
+    settings = RequestSchedulerSettings(**kwargs)
+    return RequestScheduler(settings, clock=clock, sleep=clock.sleep)
+
+
+def test_retries_server_errors_with_backoff() -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    sut = _create_scheduler(clock, backoff_base=datetime.timedelta(seconds=1))
+    responses = [FakeResponse(500), FakeResponse(502), FakeResponse(200)]
+
+    # *** ACT ***
+    response = sut.send(_URL, lambda: responses.pop(0))
+
+    # *** ASSERT ***
+    assert response.status_code == 200
+    assert len(clock.sleeps) == 2
+    assert 0 <= clock.sleeps[0] <= 1
+    assert 0 <= clock.sleeps[1] <= 2
+    assert (sut.stats.requests, sut.stats.retries, sut.stats.failures) == (3, 2, 0)
+
+
+def test_honors_retry_after() -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    sut = _create_scheduler(clock)
+    responses = [FakeResponse(429, {"Retry-After": "7"}), FakeResponse(200)]
+
+    # *** ACT ***
+    response = sut.send(_URL, lambda: responses.pop(0))
+
+    # *** ASSERT ***
+    assert response.status_code == 200
+    assert clock.sleeps == [7.0]
+    assert sut.stats.throttled == 1
+
+
+def test_gives_up_after_max_retries() -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    sut = _create_scheduler(clock, max_retries=2)
+    calls: list[int] = []
+
+    def send() -> FakeResponse:
+        calls.append(1)
+        return FakeResponse(503)
+
+    # *** ACT ***
+    response = sut.send(_URL, send)
+
+    # *** ASSERT ***
+    assert response.status_code == 503
+    assert len(calls) == 3
+    assert sut.stats.failures == 1
+
+
+def test_retries_connection_errors() -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    sut = _create_scheduler(clock, max_retries=1)
+
+    def send() -> FakeResponse:
+        raise requests.ConnectionError
+
+    # *** ACT / ASSERT ***
+    with pytest.raises(requests.ConnectionError):
+        sut.send(_URL, send)
+    assert sut.stats.requests == 2
+
+
+def test_paces_requests_per_host() -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    sut = _create_scheduler(clock, requests_per_second=2, burst=1)
+
+    # *** ACT ***
+    for _ in range(5):
+        sut.send(_URL, lambda: FakeResponse(200))
+    sut.send("https://other.example.com/", lambda: FakeResponse(200))
+
+    # *** ASSERT ***
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_adapts_concurrency_to_throttling() -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    sut = _create_scheduler(clock, max_concurrency=8, max_retries=0)
+
+    # *** ACT ***
+    sut.send(_URL, lambda: FakeResponse(429))
+    after_throttle = sut.concurrency_limit(_URL)
+    for _ in range(4):
+        sut.send(_URL, lambda: FakeResponse(200))
+    after_successes = sut.concurrency_limit(_URL)
+
+    # *** ASSERT ***
+    assert after_throttle == 4
+    assert after_successes == 5
+
+
+def test_send_async_retries() -> None:
+    # *** ARRANGE ***
+    sut = RequestScheduler(
+        RequestSchedulerSettings(backoff_base=datetime.timedelta(milliseconds=1))
+    )
+    responses = [httpx.Response(503), httpx.Response(200)]
+
+    async def send() -> httpx.Response:
+        return responses.pop(0)
+
+    # *** ACT ***
+    response = asyncio.run(sut.send_async(_URL, send))
+
+    # *** ASSERT ***
+    assert response.status_code == 200
+    assert sut.stats.retries == 1
+
+
+def test_parse_retry_after_http_date() -> None:
+    when = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=120)
+    value = when.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+    assert _parse_retry_after(value) == pytest.approx(120, abs=2)
+    assert _parse_retry_after("garbage") is None
+
+
+def test_reader_retries_throttled_request(monkeypatch: pytest.MonkeyPatch) -> None:
+    # *** ARRANGE ***
+    clock = FakeClock()
+    scheduler = _create_scheduler(clock)
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    sut = OctoAPIReader(config, scheduler=scheduler)
+    statuses = [429, 200]
+
+    def fake_get(_url: str, **_kwargs: Any) -> requests.Response:
+        r = requests.Response()
+        r.status_code = statuses.pop(0)
+        r.headers["Retry-After"] = "3"
+        r._content = b'{"number": "A-1234", "properties": []}'
+        return r
+
+    monkeypatch.setattr(sut._session, "get", fake_get)
+
+    # *** ACT ***
+    account = sut.get_account("A-1234")
+
+    # *** ASSERT ***
+    assert account.number == "A-1234"
+    assert clock.sleeps == [3.0]
@@ -0,0 +1,134 @@
+import datetime
+import os
+from pathlib import Path
+from typing import Any
+
+import pendulum
+import pytest
+import time_machine
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from octopus_stats.response_cache import (
+    ResponseCache,
+    ResponseCacheSettings,
+    normalize_url,
+)
+
+_URL = "https://api.octopus.energy/v1/x/?b=2&a=1"
+
+
+def test_normalize_url_sorts_params() -> None:
+    assert normalize_url("HTTPS://API.example.com/v1/x/?b=2&a=1#frag") == (
+        "https://api.example.com/v1/x/?a=1&b=2"
+    )
+
+
+@time_machine.travel("2024-01-10 12:00 +0000", tick=False)
+def test_closed_period_is_immutable(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    sut = ResponseCache(ResponseCacheSettings(cache_dir=str(tmp_path)))
+    period_end = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+    # *** ACT ***
+    sut.put(_URL, {"results": [1]}, period_end)
+    with time_machine.travel("2030-01-01 00:00 +0000"):
+        body = sut.get("https://api.octopus.energy/v1/x/?a=1&b=2")
+
+    # *** ASSERT ***
+    assert body == {"results": [1]}
+    assert sut.stats.hits == 1
+
+
+@time_machine.travel("2024-01-10 12:00 +0000", tick=False)
+def test_recent_period_expires(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    sut = ResponseCache(ResponseCacheSettings(cache_dir=str(tmp_path)))
+    period_end = datetime.datetime(2024, 1, 10, tzinfo=datetime.UTC)
+
+    # *** ACT ***
+    sut.put(_URL, {"results": [1]}, period_end)
+    fresh = sut.get(_URL)
+    with time_machine.travel("2024-01-10 12:16 +0000"):
+        stale = sut.get(_URL)
+
+    # *** ASSERT ***
+    assert fresh == {"results": [1]}
+    assert stale is None
+    assert (sut.stats.hits, sut.stats.misses) == (1, 1)
+    assert sut.size == 0
+
+
+def test_evicts_least_recently_used(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    period_end = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+    sut = ResponseCache(ResponseCacheSettings(cache_dir=str(tmp_path), max_bytes=250))
+    sut.put("https://x/1", "a" * 50, period_end)
+    sut.put("https://x/2", "b" * 50, period_end)
+    # Backdate both entries, so that the access below is unambiguously the most recent
+    for url in ["https://x/1", "https://x/2"]:
+        os.utime(sut._path_for(normalize_url(url)), (1_000_000, 1_000_000))
+    assert sut.get("https://x/1") is not None
+
+    # *** ACT ***
+    sut.put("https://x/3", "c" * 50, period_end)
+
+    # *** ASSERT ***
+    assert sut.stats.evictions == 1
+    assert sut.get("https://x/1") is not None
+    assert sut.get("https://x/2") is None
+    assert sut.get("https://x/3") is not None
+    assert sut.size <= 250
+
+
+def test_entry_evicted_while_read_is_a_hit(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # *** ARRANGE ***
+    period_end = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+    sut = ResponseCache(ResponseCacheSettings(cache_dir=str(tmp_path)))
+    sut.put(_URL, {"results": [1]}, period_end)
+    utime = os.utime
+
+    def evict_then_utime(path: Path) -> None:
+        # Another thread evicts the entry between its read and the recording of the access
+        path.unlink()
+        utime(path)
+
+    monkeypatch.setattr(os, "utime", evict_then_utime)
+
+    # *** ACT ***
+    body = sut.get(_URL)
+
+    # *** ASSERT ***
+    assert body == {"results": [1]}
+    assert sut.stats.hits == 1
+
+
+def test_reader_uses_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # *** ARRANGE ***
+    cache = ResponseCache(ResponseCacheSettings(cache_dir=str(tmp_path)))
+    config = OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    fetched: list[str] = []
+
+    def fake_fetch(url: str) -> Any:
+        fetched.append(url)
+        return {"results": [], "next": None}
+
+    def read() -> None:
+        sut = OctoAPIReader(config, cache=cache)
+        monkeypatch.setattr(sut, "_fetch", fake_fetch)
+        list(
+            sut.get_consumption(
+                start=pendulum.datetime(2023, 1, 1, tz="UTC"),
+                end=pendulum.datetime(2023, 1, 2, tz="UTC"),
+                mpan="12345",
+                serial_number="123456",
+            )
+        )
+
+    # *** ACT ***
+    read()
+    read()
+
+    # *** ASSERT ***
+    assert len(fetched) == 1
+    assert cache.stats.hits == 1
@@ -0,0 +1,119 @@
+import datetime
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from octopus_stats.rollups import RollupSettings, RollupStore
+
+
+class FakeSource:
+    """Raw half-hourly data by local wall-clock time, one value per day, that records the days loaded."""
+
+    def __init__(self, consumption: dict[datetime.date, float]) -> None:
+        self.consumption = consumption
+        self.loads: list[list[datetime.date]] = []
+
+    def load(self, days: list[datetime.date]) -> pd.DataFrame:
+        self.loads.append(days)
+        starts = [
+            pd.Timestamp(day) + pd.Timedelta(minutes=30 * i)
+            for day in days
+            if day in self.consumption
+            for i in range(48)
+        ]
+        return pd.DataFrame(
+            {
+                "start_local": pd.Series(starts, dtype="datetime64[ns]"),
+                "kwh": [self.consumption[s.date()] for s in starts],
+            }
+        )
+
+
+def _day(month: int, day: int) -> datetime.date:
+    return datetime.date(2024, month, day)
+
+
+@pytest.fixture()
+def sut(tmp_path: Path) -> RollupStore:
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    return RollupStore(
+        storage, RollupSettings(time_column="start_local", value_columns=["kwh"])
+    )
+
+
+def test_refresh_aggregates_dirty_days(sut: RollupStore, tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    days = [_day(1, 30), _day(1, 31), _day(2, 1), _day(2, 2)]
+    source = FakeSource(dict.fromkeys(days, 0.5))
+    sut.mark_dirty(days)
+
+    # *** ACT ***
+    refreshed = sut.refresh(source.load)
+
+    # *** ASSERT ***
+    assert refreshed == days
+    assert source.loads == [days[:2], days[2:]]
+    assert sut.dirty == []
+    hourly = sut.read("hour")
+    assert len(hourly) == 4 * 24
+    assert (hourly["records"] == 2).all()
+    assert (hourly["kwh"] == 1.0).all()
+    daily = sut.read("day")
+    assert list(daily["period_start"].dt.date) == days
+    assert (daily["kwh"] == 24.0).all()
+    monthly = sut.read("month")
+    assert list(monthly["period_start"]) == [
+        pd.Timestamp("2024-01-01"),
+        pd.Timestamp("2024-02-01"),
+    ]
+    assert list(monthly["records"]) == [96, 96]
+    assert sorted(p.name for p in (tmp_path / "rollups/hour").iterdir()) == [
+        "2024-01.parquet",
+        "2024-02.parquet",
+    ]
+
+
+def test_refresh_reaggregates_only_changed_days(sut: RollupStore) -> None:
+    # *** ARRANGE ***
+    days = [_day(1, 30), _day(1, 31), _day(2, 1), _day(2, 2)]
+    source = FakeSource(dict.fromkeys(days, 0.5))
+    sut.mark_dirty(days)
+    sut.refresh(source.load)
+    source.consumption[_day(2, 1)] = 1.5
+    source.loads.clear()
+    sut.mark_dirty([_day(2, 1)])
+
+    # *** ACT ***
+    sut.refresh(source.load)
+
+    # *** ASSERT ***
+    assert source.loads == [[_day(2, 1)]]
+    daily = sut.read("day", start=_day(2, 1), end=_day(2, 3))
+    assert list(daily["kwh"]) == [72.0, 24.0]
+    assert list(sut.read("month")["kwh"]) == [48.0, 96.0]
+    assert len(sut.read("hour", start=_day(1, 31), end=_day(2, 1))) == 24
+
+
+def test_interrupted_refresh_is_finished_by_next_one(sut: RollupStore) -> None:
+    # *** ARRANGE ***
+    days = [_day(1, 31), _day(2, 1)]
+    source = FakeSource(dict.fromkeys(days, 0.5))
+    sut.mark_dirty(days)
+
+    def fail_in_february(month_days: list[datetime.date]) -> pd.DataFrame:
+        if month_days[0].month == 2:
+            raise OSError("Cannot read February")
+        return source.load(month_days)
+
+    with pytest.raises(OSError, match="February"):
+        sut.refresh(fail_in_february)
+
+    # *** ACT ***
+    remaining = sut.dirty
+    refreshed = sut.refresh(source.load)
+
+    # *** ASSERT ***
+    assert remaining == [_day(2, 1)]
+    assert refreshed == [_day(2, 1)]
+    assert list(sut.read("day")["period_start"].dt.date) == days
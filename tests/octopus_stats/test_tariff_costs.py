@@ -0,0 +1,214 @@
+import datetime
+import threading
+from typing import Any
+
+import pandas as pd
+import pytest
+from furl import furl  # type: ignore[reportMissingTypeStubs]
+from octopus_stats.consumption_frame import build_consumption_frame
+from octopus_stats.octo_api_models import Agreement
+from octopus_stats.octo_api_reader import OctoAPIConfig, OctoAPIReader
+from octopus_stats.tariff_costs import TariffCostEngine
+
+_FIXED = "E-1R-VAR-22-11-01-C"
+_AGILE = "E-1R-AGILE-FLEX-22-11-25-C"
+_ECONOMY_7 = "E-2R-VAR-22-11-01-C"
+_PRICE_CHANGE = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+_HALF_HOUR = datetime.timedelta(minutes=30)
+
+
+def _rate(
+    value: float,
+    valid_from: datetime.datetime,
+    valid_to: datetime.datetime | None,
+    payment_method: str | None = "DIRECT_DEBIT",
+) -> dict[str, Any]:
+    return {
+        "value_exc_vat": round(value / 1.05, 4),
+        "value_inc_vat": value,
+        "valid_from": valid_from.isoformat().replace("+00:00", "Z"),
+        "valid_to": valid_to.isoformat().replace("+00:00", "Z") if valid_to else None,
+        "payment_method": payment_method,
+    }
+
+
+class FakeTariffApi:
+    """
+    Serves rates for two tariffs, newest first as the API does: a fixed tariff whose unit rate drops from 30p to 25p at
+    the start of 2024 (and is 2p dearer without direct debit), with a 50p standing charge, and an agile tariff whose
+    unit rate is the UTC hour of each half-hour, with a 40p standing charge.
+    """
+
+    def __init__(self) -> None:
+        self.urls: list[str] = []
+
+    def __call__(self, url: str) -> dict[str, Any]:
+        self.urls.append(url)
+        f = furl(url)
+        (tariff_code, rate_type) = f.path.segments[-3:-1]
+        period_from = datetime.datetime.fromisoformat(f.args["period_from"])
+        period_to = datetime.datetime.fromisoformat(f.args["period_to"])
+        if rate_type == "standing-charges":
+            value = 50.0 if tariff_code == _FIXED else 40.0
+            results = [
+                _rate(value, datetime.datetime(2022, 11, 1, tzinfo=datetime.UTC), None)
+            ]
+        elif tariff_code == _FIXED:
+            results = [
+                _rate(25.0, _PRICE_CHANGE, None),
+                _rate(27.0, _PRICE_CHANGE, None, "NON_DIRECT_DEBIT"),
+                _rate(
+                    30.0,
+                    datetime.datetime(2023, 1, 1, tzinfo=datetime.UTC),
+                    _PRICE_CHANGE,
+                ),
+            ]
+        else:
+            results = []
+            t = period_to - _HALF_HOUR
+            while t >= period_from:
+                results.append(_rate(float(t.hour), t, t + _HALF_HOUR, None))
+                t -= _HALF_HOUR
+        return {"results": results, "next": None}
+
+
+def _consumption(start: datetime.datetime, days: int) -> pd.DataFrame:
+    results = [
+        {
+            "consumption": 0.5,
+            "interval_start": (start + i * _HALF_HOUR).isoformat(),
+            "interval_end": (start + (i + 1) * _HALF_HOUR).isoformat(),
+        }
+        for i in range(days * 48)
+    ]
+    return build_consumption_frame([results])
+
+
+@pytest.fixture()
+def api() -> FakeTariffApi:
+    return FakeTariffApi()
+
+
+@pytest.fixture()
+def sut(monkeypatch: pytest.MonkeyPatch, api: FakeTariffApi) -> TariffCostEngine:
+    reader = OctoAPIReader(
+        OctoAPIConfig(api_key="1234", mpan="12345", serial_number="123456")
+    )
+    monkeypatch.setattr(reader, "_call_api_raw", api)
+    return TariffCostEngine(reader)
+
+
+def test_prices_intervals_under_their_agreement_and_rate(sut: TariffCostEngine) -> None:
+    # *** ARRANGE ***
+    switch = datetime.datetime(2024, 1, 2, tzinfo=datetime.UTC)
+    agreements = [
+        Agreement(_FIXED, datetime.datetime(2023, 1, 1, tzinfo=datetime.UTC), switch),
+        Agreement(_AGILE, switch, None),
+    ]
+    consumption = _consumption(datetime.datetime(2023, 12, 31, tzinfo=datetime.UTC), 3)
+
+    # *** ACT ***
+    costs = sut.price(consumption, agreements)
+
+    # *** ASSERT ***
+    days = [costs.iloc[i * 48 : (i + 1) * 48] for i in range(3)]
+    assert list(costs["tariff_code"].unique()) == [_FIXED, _AGILE]
+    assert days[0]["consumption_cost"].sum() == pytest.approx(48 * 0.5 * 30)
+    assert days[1]["consumption_cost"].sum() == pytest.approx(48 * 0.5 * 25)
+    assert days[2]["consumption_cost"].sum() == pytest.approx(0.5 * 2 * sum(range(24)))
+    assert [d["standing_charge_cost"].sum() for d in days] == pytest.approx(
+        [50, 50, 40]
+    )
+    pd.testing.assert_series_equal(
+        costs["cost"],
+        costs["consumption_cost"] + costs["standing_charge_cost"],
+        check_names=False,
+    )
+    assert sut.stats.intervals_priced == 3 * 48
+
+
+def test_leaves_intervals_without_a_rate_unpriced(
+    sut: TariffCostEngine, api: FakeTariffApi
+) -> None:
+    # *** ARRANGE ***
+    agreements = [
+        Agreement(
+            _ECONOMY_7,
+            datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC),
+            datetime.datetime(2024, 1, 2, 12, tzinfo=datetime.UTC),
+        ),
+        Agreement(_FIXED, datetime.datetime(2024, 1, 3, tzinfo=datetime.UTC), None),
+    ]
+    consumption = _consumption(datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC), 3)
+
+    # *** ACT ***
+    costs = sut.price(consumption, agreements)
+
+    # *** ASSERT ***
+    assert costs["tariff_code"].isna().sum() == 24
+    assert costs["cost"].isna().sum() == 2 * 48
+    assert (costs["unit_rate"].iloc[96:] == 25.0).all()
+    assert (sut.stats.intervals_priced, sut.stats.intervals_unpriced) == (48, 96)
+    assert not any(_ECONOMY_7 in url for url in api.urls)
+
+
+def test_reuses_rates_already_fetched(
+    sut: TariffCostEngine, api: FakeTariffApi
+) -> None:
+    # *** ARRANGE ***
+    agreements = [
+        Agreement(_AGILE, datetime.datetime(2023, 1, 1, tzinfo=datetime.UTC), None)
+    ]
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    sut.price(_consumption(start, 7), agreements)
+    fetched = len(api.urls)
+
+    # *** ACT ***
+    for meter_start in (start, start + datetime.timedelta(days=3, hours=5)):
+        sut.price(_consumption(meter_start, 2), agreements)
+    costs = sut.price(_consumption(start + datetime.timedelta(days=6), 2), agreements)
+
+    # *** ASSERT ***
+    assert fetched == 2
+    assert len(api.urls) == 4
+    assert (sut.stats.rate_fetches, sut.stats.rate_cache_hits) == (4, 4)
+    assert costs["unit_rate"].notna().all()
+    # The extended schedule covers the whole period priced so far
+    assert "period_from=2024-01-01" in api.urls[-1]
+
+
+def test_fetches_other_tariffs_while_one_is_fetched(
+    sut: TariffCostEngine, api: FakeTariffApi, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # *** ARRANGE ***
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    consumption = _consumption(start, 1)
+    (fixed, agile) = (
+        [Agreement(tariff_code, start, None)] for tariff_code in (_FIXED, _AGILE)
+    )
+    # The fixed tariff's rates arrive only once the agile tariff has been priced
+    released = threading.Event()
+    waits: list[bool] = []
+
+    def slow_api(url: str) -> dict[str, Any]:
+        if _FIXED in url:
+            waits.append(released.wait(timeout=5))
+        return api(url)
+
+    monkeypatch.setattr(sut._reader, "_call_api_raw", slow_api)
+    pricing = [
+        threading.Thread(target=sut.price, args=(consumption, fixed)) for _ in range(2)
+    ]
+
+    # *** ACT ***
+    for thread in pricing:
+        thread.start()
+    sut.price(consumption, agile)
+    released.set()
+    for thread in pricing:
+        thread.join()
+
+    # *** ASSERT ***
+    assert waits == [True, True]
+    # The threads pricing the fixed tariff shared its fetches
+    assert (sut.stats.rate_fetches, sut.stats.rate_cache_hits) == (4, 2)
@@ -0,0 +1,79 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import download
+import pytest
+from octopus_stats.export_manifest import MANIFEST_PATH, ExportManifest
+
+_SRC_DIR = Path(__file__).parent.parent / "src"
+_HEAVY_MODULES = ["cattrs", "fastparquet", "httpx", "numpy", "pandas", "pendulum"]
+
+
+def _modules_imported_by(code: str) -> list[str]:
+    """Runs `code` in a fresh interpreter, and returns the heavy modules that it imported."""
+    check = (
+        f"import json, sys; {code}; "
+        f"print(json.dumps([m for m in {_HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    env = {**os.environ, "PYTHONPATH": str(_SRC_DIR)}
+    result = subprocess.run(
+        [sys.executable, "-c", check],  # noqa: S603
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_startup_imports_no_heavy_modules(tmp_path: Path) -> None:
+    # *** ACT ***
+    at_startup = _modules_imported_by("import download; download.build_parser()")
+    for_status = _modules_imported_by(
+        f"import download; download.main(['status', '--base-dir', {str(tmp_path)!r}])"
+    )
+    for_reader = _modules_imported_by(
+        "from octopus_stats import OctoAPIConfig, OctoAPIReader; "
+        "OctoAPIReader(OctoAPIConfig(api_key='1234', mpan='12345', serial_number='123456'))"
+    )
+
+    # *** ASSERT ***
+    assert at_startup == []
+    assert for_status == []
+    # The reader needs pandas for its frames, but not cattrs until it structures a record, nor httpx at all
+    assert "cattrs" not in for_reader
+    assert "httpx" not in for_reader
+
+
+def test_status_reports_export_manifest(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    # *** ARRANGE ***
+    manifest = ExportManifest(
+        watermark=datetime.datetime(2024, 1, 2, 23, 30, tzinfo=datetime.UTC),
+        partitions=["date_local=2024-01-01", "date_local=2024-01-02"],
+    )
+    (tmp_path / MANIFEST_PATH).write_text(manifest.to_json(), encoding="utf-8")
+
+    # *** ACT ***
+    download.main(["status", "--base-dir", str(tmp_path)])
+
+    # *** ASSERT ***
+    assert capsys.readouterr().out.splitlines() == [
+        "Watermark: 2024-01-02T23:30:00+00:00",
+        "Partitions: 2",
+        "Latest partition: date_local=2024-01-02",
+    ]
+
+
+def test_rejects_invalid_arguments(capsys: pytest.CaptureFixture[str]) -> None:
+    # *** ACT / ASSERT ***
+    with pytest.raises(SystemExit):
+        download.main(["octo", "--start", "2024-13-01", "--end", "2024-01-02"])
+    assert "not a date" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        download.main([])
@@ -0,0 +1,188 @@
+import datetime
+from pathlib import Path
+from typing import Any
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+import pytest
+from octopus_stats.consumption_frame import build_consumption_frame
+from zappi_stats.alignment import (
+    AlignmentCache,
+    AlignmentCacheSettings,
+    IntervalAligner,
+    align_intervals,
+)
+from zappi_stats.zappi_api_reader import ZAPPI_USAGE_DTYPE, usage_array_to_frame
+
+_JOULES_PER_KWH = 3_600_000
+
+
+_LONDON = ZoneInfo("Europe/London")
+
+
+def _intervals(start: datetime.datetime, count: int) -> pd.DataFrame:
+    """Half-hours from `start`, with UK local times (as the API reports them)."""
+    interval = datetime.timedelta(minutes=30)
+    results: list[dict[str, Any]] = [
+        {
+            "consumption": 1.0,
+            "interval_start": (start + i * interval).astimezone(_LONDON).isoformat(),
+            "interval_end": (start + (i + 1) * interval)
+            .astimezone(_LONDON)
+            .isoformat(),
+        }
+        for i in range(count)
+    ]
+    return build_consumption_frame([results])
+
+
+def _minutes(start: datetime.datetime, count: int) -> np.ndarray:
+    """One record per minute, importing 0.01 kWh into the EV on phase 1 and 0.02 kWh from the grid."""
+    arr = np.zeros(count, dtype=ZAPPI_USAGE_DTYPE)
+    arr["interval_start"] = int(start.timestamp()) + np.arange(count) * 60
+    arr["h1b"] = _JOULES_PER_KWH // 100
+    arr["imp"] = _JOULES_PER_KWH // 50
+    return arr
+
+
+def test_bins_minutes_into_intervals() -> None:
+    # *** ARRANGE ***
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    minutes = _minutes(start, 60)
+    minutes["h2d"][30:] = _JOULES_PER_KWH // 100
+
+    # *** ACT ***
+    aligned = align_intervals(_intervals(start, 2), minutes)
+
+    # *** ASSERT ***
+    assert list(aligned["zappi_minutes"]) == [30, 30]
+    assert list(aligned["coverage"]) == [1.0, 1.0]
+    assert aligned["ev_imported_kwh"].tolist() == pytest.approx([0.3, 0.3])
+    assert aligned["ev_diverted_kwh"].tolist() == pytest.approx([0.0, 0.3])
+    assert aligned["ev_kwh"].tolist() == pytest.approx([0.3, 0.6])
+    assert aligned["grid_import_kwh"].tolist() == pytest.approx([0.6, 0.6])
+    assert aligned["household_kwh"].tolist() == pytest.approx([0.7, 0.7])
+
+
+def test_reports_gaps_and_clock_changes() -> None:
+    # *** ARRANGE ***
+    # The clocks went forward at 01:00 UTC on 31 March 2024, so these are 00:00-02:00 UTC
+    start = datetime.datetime(2024, 3, 31, tzinfo=datetime.UTC)
+    intervals = _intervals(start, 4)
+    # A frame with the first 45 minutes only, and some minutes before the intervals
+    minutes = usage_array_to_frame(_minutes(start - datetime.timedelta(minutes=5), 50))
+
+    # *** ACT ***
+    aligned = align_intervals(intervals, minutes)
+
+    # *** ASSERT ***
+    assert list(aligned["start_local"].dt.hour) == [0, 0, 2, 2]
+    assert list(aligned["zappi_minutes"]) == [30, 15, 0, 0]
+    assert list(aligned["coverage"]) == [1.0, 0.5, 0.0, 0.0]
+    assert aligned["ev_imported_kwh"].tolist()[:2] == pytest.approx([0.3, 0.15])
+    assert aligned["ev_imported_kwh"].isna().tolist() == [False, False, True, True]
+
+
+def test_aligner_matches_align_intervals_across_days() -> None:
+    # *** ARRANGE ***
+    start = datetime.datetime(2024, 1, 1, 22, tzinfo=datetime.UTC)
+    intervals = _intervals(start, 8)
+    minutes = _minutes(start, 4 * 60)
+    sut = IntervalAligner(AlignmentCache())
+
+    # *** ACT ***
+    aligned = sut.align(intervals, minutes[::-1])
+
+    # *** ASSERT ***
+    pd.testing.assert_frame_equal(aligned, align_intervals(intervals, minutes))
+    assert sut.stats.misses == 2
+    assert sut.stats.minutes_matched == 4 * 60
+
+
+def test_aligner_reuses_unchanged_days(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    intervals = _intervals(start, 3 * 48)
+    minutes = _minutes(start, 3 * 1440)
+    settings = AlignmentCacheSettings(cache_dir=str(tmp_path))
+    IntervalAligner(AlignmentCache(settings)).align(intervals, minutes)
+    # The second day's data changes
+    minutes["h1b"][1440:1500] = 0
+    sut = IntervalAligner(AlignmentCache(settings))
+
+    # *** ACT ***
+    aligned = sut.align(intervals, minutes)
+
+    # *** ASSERT ***
+    assert (sut.stats.hits, sut.stats.misses) == (2, 1)
+    assert aligned["ev_imported_kwh"].iloc[48] == 0.0
+    assert aligned["ev_imported_kwh"].iloc[47] == pytest.approx(0.3)
+    assert len(list(tmp_path.glob("*.parquet"))) == 3
+
+
+def test_aligner_matches_align_intervals_across_midnight() -> None:
+    # *** ARRANGE ***
+    # One interval from 23:00 to 23:00 UTC the next day, which starts on one day but ends on the next
+    start = datetime.datetime(2024, 1, 1, 23, tzinfo=datetime.UTC)
+    day = datetime.timedelta(days=1)
+    intervals = build_consumption_frame(
+        [
+            [
+                {
+                    "consumption": 1.0,
+                    "interval_start": start.isoformat(),
+                    "interval_end": (start + day).isoformat(),
+                }
+            ]
+        ]
+    )
+    minutes = _minutes(start, 1440)
+    sut = IntervalAligner()
+
+    # *** ACT ***
+    aligned = sut.align(intervals, minutes)
+
+    # *** ASSERT ***
+    pd.testing.assert_frame_equal(aligned, align_intervals(intervals, minutes))
+    assert list(aligned["zappi_minutes"]) == [1440]
+    assert sut.stats.minutes_matched == 1440
+
+
+def test_cache_hands_out_copies(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    expected = align_intervals(_intervals(start, 48), _minutes(start, 1440))
+    settings = AlignmentCacheSettings(cache_dir=str(tmp_path))
+    stored = expected.copy()
+    AlignmentCache(settings).put("2024-01-01", "inputs", stored)
+    # The first cache holds the day in memory, and the second loads it from disk
+    suts = [AlignmentCache(settings), AlignmentCache(settings)]
+    suts[0].put("2024-01-01", "inputs", stored)
+
+    # *** ACT ***
+    stored["ev_imported_kwh"] *= 2
+    for sut in suts:
+        sut.get("2024-01-01", "inputs")["ev_imported_kwh"] *= 2  # type: ignore[index]
+    results = [sut.get("2024-01-01", "inputs") for sut in suts]
+
+    # *** ASSERT ***
+    for cached in results:
+        pd.testing.assert_frame_equal(cached, expected)
+
+
+def test_aligner_keeps_the_current_columns_of_cached_days() -> None:
+    # *** ARRANGE ***
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    intervals = _intervals(start, 48)
+    minutes = _minutes(start, 1440)
+    sut = IntervalAligner(AlignmentCache())
+    sut.align(intervals, minutes)
+    priced = intervals.assign(cost=np.arange(48.0))
+
+    # *** ACT ***
+    aligned = sut.align(priced, minutes)
+
+    # *** ASSERT ***
+    assert (sut.stats.hits, sut.stats.misses) == (1, 1)
+    pd.testing.assert_frame_equal(aligned, align_intervals(priced, minutes))
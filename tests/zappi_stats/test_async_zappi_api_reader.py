@@ -0,0 +1,141 @@
+import asyncio
+import re
+
+import httpx
+import pendulum
+from octopus_stats.request_scheduler import RequestScheduler, RequestSchedulerSettings
+from zappi_stats.async_zappi_api_reader import AsyncZappiApiReader
+from zappi_stats.zappi_api_reader import ASN_HEADER, MyenergiApiConfig
+
+_DAY_PATH = re.compile(r"/cgi-jday-Z(\d+)-(\d+)-(\d+)-(\d+)-0-0-1440")
+
+
+class FakeMyenergiApi:
+    """
+    Redirects the director to `s18.myenergi.net`, and serves two records per day from there after a short delay,
+    keeping track of how many day requests are running at once.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "director.myenergi.net":
+            return httpx.Response(200, headers={ASN_HEADER: "s18.myenergi.net"})
+        if not (m := _DAY_PATH.fullmatch(request.url.path)):
+            return httpx.Response(200, headers={ASN_HEADER: "s18.myenergi.net"})
+
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        (serial, year, month, day) = (m.group(1), *map(int, m.groups()[1:]))
+        day_fields = {"yr": year, "mon": month, "dom": day}
+        records = [{**day_fields, "imp": day}, {**day_fields, "hr": 12, "imp": day}]
+        return httpx.Response(200, json={f"U{serial}": records})
+
+
+def _create_reader(
+    client: httpx.AsyncClient, max_concurrency: int = 4
+) -> AsyncZappiApiReader:
+    config = MyenergiApiConfig(hub_serial_number="12345678", api_key="abcd")
+    # Don't let rate limits slow the tests down
+    scheduler = RequestScheduler(
+        RequestSchedulerSettings(requests_per_second=10_000, burst=100)
+    )
+    return AsyncZappiApiReader(
+        config, client=client, max_concurrency=max_concurrency, scheduler=scheduler
+    )
+
+
+def test_connect_follows_asn() -> None:
+    # *** ARRANGE ***
+    api = FakeMyenergiApi()
+
+    async def connect() -> str:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client)
+            await sut.connect()
+            return sut.connected_host
+
+    # *** ACT ***
+    host = asyncio.run(connect())
+
+    # *** ASSERT ***
+    assert host == "s18.myenergi.net"
+
+
+def test_get_data_concurrent_preserves_order() -> None:
+    # *** ARRANGE ***
+    api = FakeMyenergiApi()
+
+    async def read() -> list[int]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client, max_concurrency=4)
+            await sut.connect()
+            records = sut.get_data(
+                pendulum.datetime(2024, 1, 1, tz="UTC"),
+                pendulum.datetime(2024, 2, 1, tz="UTC"),
+            )
+            return [r.imp async for r in records]
+
+    # *** ACT ***
+    imp = asyncio.run(read())
+
+    # *** ASSERT ***
+    assert imp == [day for day in range(1, 32) for _ in range(2)]
+    assert 1 < api.max_in_flight <= 4
+
+
+def test_get_data_close_stops_fetching() -> None:
+    # *** ARRANGE ***
+    api = FakeMyenergiApi()
+
+    async def read() -> tuple[int, int]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client, max_concurrency=2)
+            await sut.connect()
+            records = sut.get_data(
+                pendulum.datetime(2024, 1, 1, tz="UTC"),
+                pendulum.datetime(2024, 2, 1, tz="UTC"),
+                max_buffered_days=3,
+            )
+            first = await anext(records)
+            await records.aclose()
+            calls = api.calls
+            await asyncio.sleep(0.05)
+            assert api.calls == calls
+            return (first.imp, calls)
+
+    # *** ACT ***
+    (first, calls) = asyncio.run(read())
+
+    # *** ASSERT ***
+    assert first == 1
+    assert calls <= 4
+
+
+def test_get_data_array() -> None:
+    # *** ARRANGE ***
+    api = FakeMyenergiApi()
+
+    async def read() -> list[int]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(api)) as client:
+            sut = _create_reader(client)
+            await sut.connect()
+            arr = await sut.get_data_array(
+                pendulum.datetime(2024, 1, 1, 6, tz="UTC"),
+                pendulum.datetime(2024, 1, 4, 6, tz="UTC"),
+            )
+            return list(arr["imp"])
+
+    # *** ACT ***
+    imp = asyncio.run(read())
+
+    # *** ASSERT ***
+    assert imp == [1, 2, 2, 3, 3, 4]
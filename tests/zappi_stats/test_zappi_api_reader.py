@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+
+import pendulum
+from zappi_stats.zappi_api_reader import (
+    ZAPPI_USAGE_DTYPE,
+    MyenergiApiConfig,
+    ZappiApiReader,
+    _create_usage_record,
+    decode_usage_records,
+)
+
+
+class FakeDayFetcher:
+    """
+    Stands in for `ZappiApiReader._get_day`, returning two records per day after a random delay and keeping track of
+    how many calls are running at once.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    def __call__(self, dt: pendulum.DateTime) -> list[dict[str, int]]:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(random.uniform(0, 0.02))  # noqa: S311
+        with self._lock:
+            self.in_flight -= 1
+        day = {"yr": dt.year, "mon": dt.month, "dom": dt.day}
+        return [{**day, "imp": dt.day}, {**day, "hr": 12, "imp": dt.day}]
+
+
+def _create_reader(fetcher: FakeDayFetcher) -> ZappiApiReader:
+    config = MyenergiApiConfig(hub_serial_number="12345678", api_key="abcd")
+    reader = ZappiApiReader(config)
+    reader._host = "s18.myenergi.net"
+    reader._get_day = fetcher  # type: ignore[method-assign]
+    return reader
+
+
+def test_get_data_serial() -> None:
+    # *** ARRANGE ***
+    fetcher = FakeDayFetcher()
+    sut = _create_reader(fetcher)
+
+    # *** ACT ***
+    records = list(
+        sut.get_data(
+            pendulum.datetime(2024, 1, 1, tz="UTC"),
+            pendulum.datetime(2024, 1, 4, tz="UTC"),
+        )
+    )
+
+    # *** ASSERT ***
+    assert [r.imp for r in records] == [1, 1, 2, 2, 3, 3]
+    assert fetcher.max_in_flight == 1
+
+
+def test_get_data_concurrent_preserves_order() -> None:
+    # *** ARRANGE ***
+    fetcher = FakeDayFetcher()
+    sut = _create_reader(fetcher)
+
+    # *** ACT ***
+    records = list(
+        sut.get_data(
+            pendulum.datetime(2024, 1, 1, tz="UTC"),
+            pendulum.datetime(2024, 2, 1, tz="UTC"),
+            workers=4,
+        )
+    )
+
+    # *** ASSERT ***
+    starts = [r.interval_start for r in records]
+    assert len(records) == 62
+    assert starts == sorted(starts)
+    assert 1 < fetcher.max_in_flight <= 4
+
+
+def test_get_data_concurrent_limits_buffered_days() -> None:
+    # *** ARRANGE ***
+    fetcher = FakeDayFetcher()
+    sut = _create_reader(fetcher)
+    records = sut.get_data(
+        pendulum.datetime(2024, 1, 1, tz="UTC"),
+        pendulum.datetime(2024, 2, 1, tz="UTC"),
+        workers=4,
+        max_buffered_days=6,
+    )
+
+    # *** ACT ***
+    first = next(records)
+    time.sleep(0.1)
+    calls = fetcher.calls
+    records.close()
+
+    # *** ASSERT ***
+    assert first.imp == 1
+    assert calls == 7
+
+
+def test_decode_usage_records_matches_record_objects() -> None:
+    # *** ARRANGE ***
+    recs = [
+        {"yr": 2024, "mon": 2, "dom": 29, "v1": 2401, "frq": 5002},
+        {"yr": 2024, "mon": 2, "dom": 29, "hr": 23, "min": 59, "imp": 61234},
+        {
+            "yr": 2023,
+            "mon": 12,
+            "dom": 31,
+            "hr": 7,
+            "min": 30,
+            **{k: i + 1 for (i, k) in enumerate(ZAPPI_USAGE_DTYPE.names[1:])},
+        },
+    ]
+
+    # *** ACT ***
+    arr = decode_usage_records(recs)
+
+    # *** ASSERT ***
+    assert arr.dtype == ZAPPI_USAGE_DTYPE
+    for row, rec in zip(arr, recs, strict=True):
+        expected = _create_usage_record(rec)
+        assert row["interval_start"] == int(expected.interval_start.timestamp())
+        for key in ZAPPI_USAGE_DTYPE.names[1:]:
+            assert row[key] == getattr(expected, key)
+
+
+def test_get_data_array_filters_range() -> None:
+    # *** ARRANGE ***
+    fetcher = FakeDayFetcher()
+    sut = _create_reader(fetcher)
+
+    # *** ACT ***
+    arr = sut.get_data_array(
+        pendulum.datetime(2024, 1, 1, 6, tz="UTC"),
+        pendulum.datetime(2024, 1, 4, 6, tz="UTC"),
+        workers=2,
+    )
+
+    # *** ASSERT ***
+    # Each fake day has records at 00:00 and 12:00; the 00:00 record of 1 January falls before the start
+    assert list(arr["imp"]) == [1, 2, 2, 3, 3, 4]
+    assert list(arr["interval_start"]) == sorted(arr["interval_start"])
+
+
+def test_get_data_frame() -> None:
+    # *** ARRANGE ***
+    fetcher = FakeDayFetcher()
+    sut = _create_reader(fetcher)
+
+    # *** ACT ***
+    usage = sut.get_data_frame(
+        pendulum.datetime(2024, 1, 1, tz="UTC"),
+        pendulum.datetime(2024, 1, 2, tz="UTC"),
+    )
+
+    # *** ASSERT ***
+    assert list(usage["interval_start"].dt.hour) == [0, 12]
+    assert str(usage["interval_start"].dt.tz) == "UTC"
@@ -0,0 +1,149 @@
+import datetime
+from pathlib import Path
+from typing import Optional
+
+import fastparquet
+import numpy as np
+import pytest
+import time_machine
+from octopus_stats.file_storage_manager import FileStorageManager, FileStorageSettings
+from zappi_stats import zappi_exporter
+from zappi_stats.zappi_api_reader import (
+    ZAPPI_USAGE_DTYPE,
+    MyenergiApiConfig,
+)
+from zappi_stats.zappi_exporter import ZappiExporter, ZappiExporterSettings
+
+
+class FakeReader:
+    """Returns one record per hour for each requested day, and records the days requested."""
+
+    is_connected = True
+
+    def __init__(self) -> None:
+        self.days: list[datetime.date] = []
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+    def get_day_array(self, day: datetime.date) -> np.ndarray:
+        self.days.append(day)
+        arr = np.zeros(24, dtype=ZAPPI_USAGE_DTYPE)
+        midnight = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.UTC)
+        arr["interval_start"] = int(midnight.timestamp()) + np.arange(24) * 3600
+        arr["imp"] = day.day
+        return arr
+
+
+def _create_exporter(
+    tmp_path: Path, reader: Optional[FakeReader] = None
+) -> ZappiExporter:
+    storage = FileStorageManager(FileStorageSettings(base_dir=str(tmp_path)))
+    settings = ZappiExporterSettings(
+        storage=storage, start_date=datetime.date(2024, 1, 1), workers=2
+    )
+    config = MyenergiApiConfig(hub_serial_number="12345678", api_key="abcd")
+    return ZappiExporter(config, settings, reader)  # type: ignore[arg-type]
+
+
+def test_first_export_fetches_every_day(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader()
+    sut = _create_exporter(tmp_path, reader)
+
+    # *** ACT ***
+    with time_machine.travel("2024-01-05 12:00 +0000"):
+        days = sut.export()
+
+    # *** ASSERT ***
+    assert days == [datetime.date(2024, 1, d) for d in range(1, 6)]
+    assert sorted(reader.days) == days
+    path = tmp_path / sut.day_path(datetime.date(2024, 1, 3))
+    usage = fastparquet.ParquetFile(str(path)).to_pandas()
+    assert len(usage) == 24
+    assert set(usage["imp"]) == {3}
+
+
+def test_later_export_fetches_only_partial_and_missing_days(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader()
+    sut = _create_exporter(tmp_path, reader)
+    with time_machine.travel("2024-01-05 00:30 +0000"):
+        sut.export()
+    reader.days.clear()
+
+    # *** ACT ***
+    with time_machine.travel("2024-01-06 09:00 +0000"):
+        days = sut.export()
+
+    # *** ASSERT ***
+    # 4 January was fetched less than an hour after it ended, so it may have been incomplete; 5 January was still in
+    # progress, and 6 January is new
+    assert days == [
+        datetime.date(2024, 1, 4),
+        datetime.date(2024, 1, 5),
+        datetime.date(2024, 1, 6),
+    ]
+    manifest = sut._load_manifest()
+    assert manifest.days["2024-01-05"].complete
+    assert not manifest.days["2024-01-06"].complete
+
+
+def test_export_up_to_date_store_fetches_only_today(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader()
+    sut = _create_exporter(tmp_path, reader)
+    with time_machine.travel("2024-01-05 12:00 +0000"):
+        sut.export()
+    reader.days.clear()
+
+    # *** ACT ***
+    with time_machine.travel("2024-01-05 18:00 +0000"):
+        days = sut.export()
+
+    # *** ASSERT ***
+    assert days == [datetime.date(2024, 1, 5)]
+
+
+def test_export_keeps_rollups_up_to_date(tmp_path: Path) -> None:
+    # *** ARRANGE ***
+    reader = FakeReader()
+    sut = _create_exporter(tmp_path, reader)
+    with time_machine.travel("2024-01-03 00:30 +0000"):
+        sut.export()
+
+    # *** ACT ***
+    with time_machine.travel("2024-01-04 09:00 +0000"):
+        sut.export()
+
+    # *** ASSERT ***
+    assert sut.rollups is not None
+    daily = sut.rollups.read("day")
+    assert [d.day for d in daily["period_start"]] == [1, 2, 3, 4]
+    assert list(daily["records"]) == [24, 24, 24, 24]
+    assert list(daily["imp"]) == [24, 48, 72, 96]
+    hourly = sut.rollups.read("hour", start=datetime.date(2024, 1, 2))
+    assert len(hourly) == 3 * 24
+    assert list(sut.rollups.read("month")["imp"]) == [240]
+
+
+def test_export_closes_only_the_reader_it_creates(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # *** ARRANGE ***
+    created = FakeReader()
+    monkeypatch.setattr(zappi_exporter, "ZappiApiReader", lambda *_, **__: created)
+    supplied = FakeReader()
+    for name in ("created", "supplied"):
+        (tmp_path / name).mkdir()
+
+    # *** ACT ***
+    with time_machine.travel("2024-01-02 12:00 +0000"):
+        _create_exporter(tmp_path / "created").export()
+        _create_exporter(tmp_path / "supplied", supplied).export()
+
+    # *** ASSERT ***
+    assert created.days
+    assert created.closed
+    assert not supplied.closed